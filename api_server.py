@@ -0,0 +1,225 @@
+"""
+Headless HTTP API for the GxP Validation Assistant
+
+Serves the RAG engine to QMS tooling and load balancers without the
+Streamlit UI. Every worker process warms up its own vector store, lexical
+index and OpenAI client in the background; /ready reports when it can
+answer. Run with:
+
+    python api_server.py --host 0.0.0.0 --port 8000 --workers 4
+
+Endpoints:
+    GET  /health        liveness (the process is up)
+    GET  /ready         readiness (200 once the knowledge base is loaded, 503 before)
+    GET  /metrics       this worker's stage latencies as Prometheus text
+    POST /search        {"query", "top_k"?, "mode"?} -> retrieved chunks
+    POST /query         {"query", "top_k"?} -> answer with sources
+    POST /query/stream  same body; Server-Sent Events: "token" events, then one "done"
+    GET  /sources       indexed source files with their chunk counts
+
+Every POST body may also restrict retrieval with "sources" (list of file
+names) and "page_start" / "page_end" (inclusive page numbers).
+"""
+import argparse
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional, Tuple
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse, Response, StreamingResponse
+from starlette.routing import Route
+from config_openai import Config
+from latency_metrics import recorder
+from logging_setup import get_logger
+from rag_system import STARTING, RAGSystem
+from search_filter import SearchFilter
+
+logger = get_logger(__name__, 'api_server.log')
+
+MAX_QUERY_CHARS = 4000
+MAX_TOP_K = 50
+RETRIEVAL_MODES = ("vector", "hybrid")
+
+
+class APIError(Exception):
+    """Request that cannot be served; rendered as {"error": message} with `status_code`"""
+    
+    def __init__(self, status_code: int, message: str, headers: Dict[str, str] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.message = message
+        self.headers = headers
+
+
+def _to_builtin(value):
+    # Scores from the NumPy backend are numpy scalars
+    if hasattr(value, "item"):
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _dumps(payload) -> str:
+    return json.dumps(payload, default=_to_builtin, ensure_ascii=False)
+
+
+def json_response(payload, status_code: int = 200, headers: Dict[str, str] = None) -> Response:
+    return Response(_dumps(payload), status_code=status_code, headers=headers, media_type="application/json")
+
+
+async def handle_api_error(request: Request, exc: APIError) -> Response:
+    return json_response({"error": exc.message}, exc.status_code, exc.headers)
+
+
+def get_engine(request: Request):
+    """This worker's AsyncRAGEngine; 503 until the RAG system has warmed up"""
+    system: RAGSystem = request.app.state.rag_system
+    if not system.ready:
+        retry = {"Retry-After": "1"} if system.status == STARTING else None
+        raise APIError(503, f"RAG system is not ready ({system.status})", retry)
+    
+    if request.app.state.engine is None:
+        # Imported once the warm-up thread has already loaded the OpenAI SDK
+        from async_rag_engine import AsyncRAGEngine
+        request.app.state.engine = AsyncRAGEngine(system.rag_engine)
+    return request.app.state.engine
+
+
+def _is_int(value) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def parse_filter(body: Dict) -> Optional[SearchFilter]:
+    """Validate the optional "sources", "page_start" and "page_end" fields"""
+    sources = body.get("sources")
+    if sources is not None and not (isinstance(sources, list) and all(isinstance(s, str) for s in sources)):
+        raise APIError(400, "'sources' must be a list of file names")
+    for field in ("page_start", "page_end"):
+        if body.get(field) is not None and not (_is_int(body[field]) and body[field] >= 1):
+            raise APIError(400, f"'{field}' must be a positive integer")
+    try:
+        return SearchFilter.from_dict(body)
+    except ValueError as e:
+        raise APIError(400, str(e))
+
+
+async def parse_query(request: Request) -> Tuple[str, int, str, Optional[SearchFilter]]:
+    """Validate a JSON body of {"query", "top_k"?, "mode"?} plus optional filter fields"""
+    try:
+        body = await request.json()
+    except ValueError:
+        raise APIError(400, "Request body must be JSON")
+    if not isinstance(body, dict):
+        raise APIError(400, "Request body must be a JSON object")
+    
+    query = body.get("query")
+    if not isinstance(query, str) or not query.strip():
+        raise APIError(400, "'query' must be a non-empty string")
+    if len(query) > MAX_QUERY_CHARS:
+        raise APIError(400, f"'query' is longer than {MAX_QUERY_CHARS} characters")
+    
+    top_k = body.get("top_k")
+    valid_top_k = _is_int(top_k) and 1 <= top_k <= MAX_TOP_K
+    if top_k is not None and not valid_top_k:
+        raise APIError(400, f"'top_k' must be an integer from 1 to {MAX_TOP_K}")
+    
+    mode = body.get("mode")
+    if mode is not None and mode not in RETRIEVAL_MODES:
+        raise APIError(400, f"'mode' must be one of {', '.join(RETRIEVAL_MODES)}")
+    return query.strip(), top_k, mode, parse_filter(body)
+
+
+async def health(request: Request) -> Response:
+    return json_response({"status": "ok"})
+
+
+async def ready(request: Request) -> Response:
+    system: RAGSystem = request.app.state.rag_system
+    if system.ready:
+        return json_response({
+            "status": system.status,
+            "documents": system.doc_count,
+            "startup_seconds": round(system.startup_seconds, 3)
+        })
+    headers = {"Retry-After": "1"} if system.status == STARTING else None
+    return json_response({"status": system.status, "error": system.error}, 503, headers)
+
+
+async def metrics(request: Request) -> Response:
+    return PlainTextResponse(recorder.prometheus_text(), media_type="text/plain; version=0.0.4")
+
+
+async def search(request: Request) -> Response:
+    query, top_k, mode, search_filter = await parse_query(request)
+    results = await get_engine(request).search(query, top_k, mode, search_filter)
+    return json_response({"query": query, "results": results})
+
+
+async def query(request: Request) -> Response:
+    query_text, top_k, _, search_filter = await parse_query(request)
+    return json_response(await get_engine(request).generate_response(query_text, top_k, search_filter))
+
+
+async def sources(request: Request) -> Response:
+    engine = get_engine(request)
+    return json_response({"sources": await asyncio.to_thread(engine.vector_store.list_sources)})
+
+
+async def sse_events(events: AsyncIterator[Dict]) -> AsyncIterator[str]:
+    """Engine stream events as SSE: token text or the final response, JSON-encoded"""
+    async for event in events:
+        data = event["content"] if event["type"] == "token" else event["response"]
+        yield f"event: {event['type']}\ndata: {_dumps(data)}\n\n"
+
+
+async def query_stream(request: Request) -> Response:
+    query_text, top_k, _, search_filter = await parse_query(request)
+    events = get_engine(request).generate_response_stream(query_text, top_k, search_filter)
+    return StreamingResponse(
+        sse_events(events),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}  # no proxy buffering of tokens
+    )
+
+
+@asynccontextmanager
+async def lifespan(app: Starlette):
+    # Runs once per worker process, so each worker keeps its own warm index
+    logger.info("API worker starting; warming up the RAG system")
+    app.state.rag_system = RAGSystem.start()
+    app.state.engine = None
+    yield
+    logger.info("API worker stopped")
+
+
+app = Starlette(
+    routes=[
+        Route("/health", health, methods=["GET"]),
+        Route("/ready", ready, methods=["GET"]),
+        Route("/metrics", metrics, methods=["GET"]),
+        Route("/sources", sources, methods=["GET"]),
+        Route("/search", search, methods=["POST"]),
+        Route("/query", query, methods=["POST"]),
+        Route("/query/stream", query_stream, methods=["POST"])
+    ],
+    exception_handlers={APIError: handle_api_error},
+    lifespan=lifespan
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the GxP Validation Assistant over HTTP")
+    parser.add_argument("--host", default=Config.API_HOST)
+    parser.add_argument("--port", type=int, default=Config.API_PORT)
+    parser.add_argument("--workers", type=int, default=Config.API_WORKERS, help="Worker processes")
+    args = parser.parse_args()
+    
+    import uvicorn
+    
+    # An import string, so uvicorn can start the app in each worker process
+    uvicorn.run("api_server:app", host=args.host, port=args.port, workers=args.workers,
+                app_dir=str(Config.BASE_DIR), log_level="info", access_log=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,24 +4,16 @@ IIT Guwahati Capstone Project 2026
 Version: 1.0.1
 """
 import streamlit as st
-import logging
+import itertools
 from pathlib import Path
 from datetime import datetime
 from config_openai import Config
-from vector_store_openai import VectorStore
-from rag_engine_openai import RAGEngine
+from latency_metrics import recorder
+from logging_setup import get_logger
+from rag_system import CONFIG_ERROR, EMPTY, ERROR, STARTING, RAGSystem
+from search_filter import SearchFilter
 
-# Setup logging
-Config.LOGS_DIR.mkdir(exist_ok=True)  # Create logs directory if it doesn't exist
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(Config.LOGS_DIR / 'app_openai.log'),
-        logging.StreamHandler()
-    ]
-)
-logger = logging.getLogger(__name__)
+logger = get_logger(__name__, 'app_openai.log')
 
 # Page configuration
 st.set_page_config(
@@ -140,30 +132,19 @@ st.markdown("""
 
 
 @st.cache_resource
-def initialize_rag_system():
-    """Initialize the RAG system (cached)"""
-    try:
-        Config.validate()
-        vector_store = VectorStore()
-        rag_engine = RAGEngine(vector_store)
-        
-        # Check if database is initialized
-        doc_count = vector_store.get_collection_count()
-        if doc_count == 0:
-            st.error("⚠️ Vector database is empty! Please run `python initialize_db_openai.py` first.")
-            return None, None, 0
-        
-        logger.info(f"RAG system initialized with {doc_count} documents")
-        return vector_store, rag_engine, doc_count
-    
-    except ValueError as e:
-        st.error(f"⚠️ Configuration Error: {str(e)}")
-        st.info("Please create a `.env` file with your OPENAI_API_KEY")
-        return None, None, 0
-    except Exception as e:
-        st.error(f"⚠️ Error initializing RAG system: {str(e)}")
-        logger.error(f"Initialization error: {str(e)}")
-        return None, None, 0
+def initialize_rag_system() -> RAGSystem:
+    """Start loading the RAG system in the background (cached, so once per server process)"""
+    return RAGSystem.start()
+
+
+def assistant_message_html(content: str) -> str:
+    """HTML for an assistant chat bubble"""
+    return f"""
+        <div class="chat-message assistant-message">
+            <strong>🤖 GxP Assistant:</strong><br>
+            {content}
+        </div>
+        """
 
 
 def display_chat_message(role: str, content: str, sources: list = None):
@@ -176,12 +157,7 @@ def display_chat_message(role: str, content: str, sources: list = None):
         </div>
         """, unsafe_allow_html=True)
     else:
-        st.markdown(f"""
-        <div class="chat-message assistant-message">
-            <strong>🤖 GxP Assistant:</strong><br>
-            {content}
-        </div>
-        """, unsafe_allow_html=True)
+        st.markdown(assistant_message_html(content), unsafe_allow_html=True)
         
         if sources:
             sources_text = "<br>".join([f"• {source}" for source in sources])
@@ -224,25 +200,79 @@ def main():
     </div>
     ''', unsafe_allow_html=True)
     
-    # Initialize RAG system
-    vector_store, rag_engine, doc_count = initialize_rag_system()
+    # Initialize RAG system (loads in the background while the page renders)
+    system = initialize_rag_system()
     
-    if not rag_engine:
+    if system.status == EMPTY:
+        st.error("⚠️ Vector database is empty! Please run `python initialize_db_openai.py` first.")
+        st.stop()
+    if system.status == CONFIG_ERROR:
+        st.error(f"⚠️ Configuration Error: {system.error}")
+        st.info("Please create a `.env` file with your OPENAI_API_KEY")
+        st.stop()
+    if system.status == ERROR:
+        st.error(f"⚠️ Error initializing RAG system: {system.error}")
         st.stop()
     
+    vector_store, rag_engine = system.vector_store, system.rag_engine
+    
     # Sidebar
     with st.sidebar:
         st.markdown("### 📊 System Information")
         
-        st.markdown(f"""
-        <div class="stat-card">
-            <strong>Documents Indexed:</strong> {doc_count}<br>
-            <strong>Model:</strong> {Config.GENERATION_MODEL}<br>
-            <strong>Embeddings:</strong> {Config.EMBEDDING_MODEL}<br>
-            <strong>Retrieval:</strong> RAG with ChromaDB<br>
-            <strong>Temperature:</strong> {Config.TEMPERATURE}
-        </div>
-        """, unsafe_allow_html=True)
+        if system.ready:
+            query_cache = vector_store.query_cache.stats()
+            st.markdown(f"""
+            <div class="stat-card">
+                <strong>Documents Indexed:</strong> {system.doc_count}<br>
+                <strong>Model:</strong> {Config.GENERATION_MODEL}<br>
+                <strong>Embeddings:</strong> {Config.EMBEDDING_MODEL}<br>
+                <strong>Retrieval:</strong> RAG with {vector_store.index.name} index<br>
+                <strong>Temperature:</strong> {Config.TEMPERATURE}<br>
+                <strong>Query Cache:</strong> {query_cache['hit_rate']:.0%} hit rate ({query_cache['hits']}/{query_cache['hits'] + query_cache['misses']})<br>
+                <strong>Startup:</strong> {system.startup_seconds:.1f}s
+            </div>
+            """, unsafe_allow_html=True)
+        else:
+            st.markdown("""
+            <div class="stat-card">
+                ⏳ Loading knowledge base...
+            </div>
+            """, unsafe_allow_html=True)
+        
+        st.markdown("---")
+        st.markdown("### 🔎 Search Scope")
+        search_filter = None
+        if system.ready:
+            # Chunk counts per file; cached by the vector store until the collection changes
+            source_counts = vector_store.list_sources()
+            selected_sources = st.multiselect(
+                "Search only these documents",
+                options=list(source_counts),
+                format_func=lambda source: f"{source} ({source_counts[source]} chunks)",
+                placeholder="All documents",
+                key="selected_sources"
+            )
+            search_filter = SearchFilter(selected_sources) if selected_sources else None
+        else:
+            st.caption("Available once the knowledge base is loaded.")
+        
+        st.markdown("---")
+        st.markdown("### ⏱️ Performance")
+        latency = recorder.summary()
+        stages = ["query_embedding", "index_query", "lexical_search", "rerank", "context_build",
+                  "llm_first_token", "llm_call", "total"]
+        rows = [
+            {"Stage": stage, "Count": latency[stage]["count"],
+             "p50 ms": round(latency[stage]["p50_ms"], 1),
+             "p95 ms": round(latency[stage]["p95_ms"], 1),
+             "p99 ms": round(latency[stage]["p99_ms"], 1)}
+            for stage in stages if stage in latency
+        ]
+        if rows:
+            st.dataframe(rows, hide_index=True, use_container_width=True)
+        else:
+            st.caption("No queries timed yet.")
         
         st.markdown("---")
         st.markdown("### 📖 Knowledge Base")
@@ -274,6 +304,7 @@ def main():
         st.markdown("---")
         if st.button("🗑️ Clear Chat History", use_container_width=True):
             st.session_state.messages = []
+            st.session_state.pop("conversation", None)
             st.rerun()
         
         st.markdown("---")
@@ -297,15 +328,19 @@ def main():
             message.get("sources")
         )
     
-    # Handle example question
-    if "example_question" in st.session_state:
+    if not system.ready:
+        st.info("⏳ Loading the knowledge base... you can type your question as soon as it is ready.")
+    
+    # Handle example question (kept until the system is ready to answer it)
+    if system.ready and "example_question" in st.session_state:
         user_input = st.session_state.example_question
         del st.session_state.example_question
     else:
         user_input = None
     
     # Chat input
-    if prompt := st.chat_input("Ask me anything about GxP validation, compliance, or regulatory guidelines..."):
+    if prompt := st.chat_input("Ask me anything about GxP validation, compliance, or regulatory guidelines...",
+                               disabled=not system.ready):
         user_input = prompt
     
     # Process user input
@@ -319,31 +354,47 @@ def main():
         # Display user message
         display_chat_message("user", user_input)
         
-        # Generate response
-        with st.spinner("🔍 Searching knowledge base and generating response..."):
-            try:
-                response = rag_engine.generate_response(user_input)
-                
-                # Add assistant message to chat history
-                st.session_state.messages.append({
-                    "role": "assistant",
-                    "content": response["answer"],
-                    "sources": response.get("sources", [])
-                })
-                
-                # Display assistant message
-                display_chat_message(
-                    "assistant",
-                    response["answer"],
-                    response.get("sources")
-                )
-                
-                logger.info(f"Query processed successfully: {user_input[:50]}...")
-                
-            except Exception as e:
-                error_msg = f"An error occurred: {str(e)}"
-                st.error(error_msg)
-                logger.error(f"Error processing query: {str(e)}")
+        # Generate response, rendering tokens as they stream in
+        try:
+            # Chunks of the last few turns, so follow-ups are read in context and can skip the search
+            if "conversation" not in st.session_state:
+                st.session_state.conversation = rag_engine.start_conversation()
+            stream = rag_engine.generate_response_stream(user_input, search_filter=search_filter,
+                                                         conversation=st.session_state.conversation)
+            placeholder = st.empty()
+            with st.spinner("🔍 Searching knowledge base and generating response..."):
+                first_event = next(stream)
+            
+            answer = ""
+            response = None
+            for event in itertools.chain([first_event], stream):
+                if event["type"] == "token":
+                    answer += event["content"]
+                    placeholder.markdown(assistant_message_html(answer + " ▌"), unsafe_allow_html=True)
+                elif event["type"] == "done":
+                    response = event["response"]
+            placeholder.empty()
+            
+            # Add assistant message to chat history
+            st.session_state.messages.append({
+                "role": "assistant",
+                "content": response["answer"],
+                "sources": response.get("sources", [])
+            })
+            
+            # Display assistant message
+            display_chat_message(
+                "assistant",
+                response["answer"],
+                response.get("sources")
+            )
+            
+            logger.info(f"Query processed successfully: {user_input[:50]}...")
+            
+        except Exception as e:
+            error_msg = f"An error occurred: {str(e)}"
+            st.error(error_msg)
+            logger.error(f"Error processing query: {str(e)}")
     
     # Footer
     st.markdown("""
@@ -352,6 +403,11 @@ def main():
         Always consult with qualified professionals and refer to official regulatory guidelines for compliance decisions.
     </div>
     """, unsafe_allow_html=True)
+    
+    # The page is already on screen; rerun once warm-up finishes to enable the chat
+    if system.status == STARTING:
+        system.wait(timeout=0.5)
+        st.rerun()
 
 
 if __name__ == "__main__":
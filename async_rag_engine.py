@@ -0,0 +1,207 @@
+"""
+Asyncio front end to the RAG engine for serving many concurrent users
+"""
+import asyncio
+import copy
+import time
+from typing import AsyncIterator, Awaitable, Callable, Dict, Hashable, List
+import httpx
+from openai import AsyncOpenAI
+from config_openai import Config
+from embedding_cache import clean_query, normalize_query
+from latency_metrics import recorder
+from logging_setup import get_logger
+from rag_engine_openai import RAGEngine
+from rate_limiter import async_call_with_retry, retry_policy
+from search_filter import SearchFilter
+from vector_store_openai import count_tokens
+
+logger = get_logger(__name__, 'rag_engine_openai.log')
+
+
+class AsyncRAGEngine:
+    """Async search and generation over a RAGEngine's vector store, caches and prompts
+    
+    OpenAI calls go through AsyncOpenAI, so a request waiting on the model
+    holds no thread. Index lookups run in the default thread pool. Identical
+    requests already in flight share one result, and at most
+    `max_concurrency` requests run at a time; the rest wait their turn.
+    """
+    
+    def __init__(self, rag_engine: RAGEngine, client: AsyncOpenAI = None, max_concurrency: int = None):
+        self.rag_engine = rag_engine
+        self.vector_store = rag_engine.vector_store
+        self.client = client or Config.async_openai_client()
+        # Embedding retries are handled by async_call_with_retry, as in VectorStore
+        self.embedding_client = self.client.with_options(
+            max_retries=0,
+            timeout=httpx.Timeout(Config.EMBEDDING_TIMEOUT, connect=Config.HTTP_CONNECT_TIMEOUT)
+        )
+        self.max_concurrency = max_concurrency or Config.ASYNC_MAX_CONCURRENCY
+        self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._in_flight: Dict[Hashable, asyncio.Task] = {}
+        self.coalesced = 0
+        logger.info(f"Async RAG engine initialized (max {self.max_concurrency} concurrent requests)")
+    
+    async def _coalesce(self, key: Hashable, start: Callable[[], Awaitable]):
+        """Run `start()` once per key at a time; concurrent callers with the same key share its result"""
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            task = asyncio.ensure_future(start())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        # Shielded so one caller giving up does not cancel the work for the others
+        return copy.deepcopy(await asyncio.shield(task))
+    
+    async def embed_query(self, query: str) -> List[float]:
+        """Embedding of a search query; cache misses are fetched without blocking the event loop"""
+        key = normalize_query(query)
+        query = clean_query(query)
+        embedding = self.vector_store.query_cache.get(Config.EMBEDDING_MODEL, key)
+        if embedding is not None:
+            return embedding
+        
+        embedding_cache = self.vector_store.embedding_cache if Config.QUERY_CACHE_PERSIST else None
+        if embedding_cache is not None:
+            # SQLite reads and commits block, so they stay off the event loop
+            embedding = await asyncio.to_thread(embedding_cache.get, Config.EMBEDDING_MODEL, query)
+        if embedding is None:
+            response = await async_call_with_retry(
+                lambda: self.embedding_client.embeddings.create(model=Config.EMBEDDING_MODEL, input=query),
+                self.vector_store.rate_limiter,
+                count_tokens(query),
+                **retry_policy(query=True)
+            )
+            embedding = response.data[0].embedding
+            if embedding_cache is not None:
+                await asyncio.to_thread(embedding_cache.put_many, Config.EMBEDDING_MODEL, [query], [embedding])
+        self.vector_store.query_cache.put(Config.EMBEDDING_MODEL, key, embedding)
+        return embedding
+    
+    async def _search(self, query: str, top_k: int = None, mode: str = None,
+                      query_embedding: List[float] = None, search_filter: SearchFilter = None) -> List[Dict]:
+        try:
+            if query_embedding is None:
+                with recorder.span("query_embedding"):
+                    query_embedding = await self.embed_query(query)
+            return await asyncio.to_thread(self.vector_store.search_by_embedding, query, query_embedding, top_k, mode,
+                                           search_filter)
+        except Exception as e:
+            logger.error(f"Error searching vector store: {str(e)}")
+            return []
+    
+    @staticmethod
+    def _filter_key(search_filter: SearchFilter = None):
+        return search_filter.key() if search_filter else None
+    
+    async def search(self, query: str, top_k: int = None, mode: str = None,
+                     search_filter: SearchFilter = None) -> List[Dict]:
+        """Search for relevant documents (see VectorStore.search)"""
+        return await self._coalesce(("search", normalize_query(query), top_k, mode, self._filter_key(search_filter)),
+                                    lambda: self._search(query, top_k, mode, search_filter=search_filter))
+    
+    async def _prepare(self, query: str, top_k: int = None, search_filter: SearchFilter = None):
+        """Embed, retrieve and check the answer cache: (docs, early response, cache key)"""
+        with recorder.span("query_embedding"):
+            query_embedding = await self.embed_query(query)
+        retrieved_docs = await self._search(query, self.rag_engine.search_depth(top_k), query_embedding=query_embedding,
+                                            search_filter=search_filter)
+        # Reranking, answer cache lookups and the collection count (a blocking call on Chroma) stay off the event loop
+        return await asyncio.to_thread(self.rag_engine._retrieve, query, top_k, retrieved_docs, query_embedding)
+    
+    async def _generate(self, query: str, top_k: int = None, search_filter: SearchFilter = None) -> Dict:
+        async with self.semaphore:
+            start = time.perf_counter()
+            try:
+                logger.info(f"Processing async query: {query[:100]}...")
+                
+                retrieved_docs, early_response, cache_key = await self._prepare(query, top_k, search_filter)
+                if early_response is not None:
+                    return early_response
+                
+                messages, context_stats = await asyncio.to_thread(self.rag_engine._build_messages, query, retrieved_docs)
+                with recorder.span("llm_call"):
+                    response = await self.client.chat.completions.create(
+                        model=Config.GENERATION_MODEL,
+                        messages=messages,
+                        temperature=Config.TEMPERATURE,
+                        max_tokens=Config.MAX_TOKENS
+                    )
+                
+                result = self.rag_engine._build_response(response.choices[0].message.content, retrieved_docs,
+                                                         context_stats)
+                if cache_key is not None:
+                    self.rag_engine.answer_cache.put(*cache_key, result)
+                return result
+            
+            except Exception as e:
+                return self.rag_engine._error_response(e)
+            finally:
+                recorder.record("total", time.perf_counter() - start)
+    
+    async def generate_response(self, query: str, top_k: int = None, search_filter: SearchFilter = None) -> Dict:
+        """Generate a response using RAG (see RAGEngine.generate_response)"""
+        return await self._coalesce(("generate", normalize_query(query), top_k, self._filter_key(search_filter)),
+                                    lambda: self._generate(query, top_k, search_filter))
+    
+    async def generate_response_stream(self, query: str, top_k: int = None,
+                                       search_filter: SearchFilter = None) -> AsyncIterator[Dict]:
+        """Generate a response, yielding events as in RAGEngine.generate_response_stream
+        
+        Streams are not coalesced: each caller gets its own tokens as they arrive.
+        """
+        async with self.semaphore:
+            start = time.perf_counter()
+            try:
+                logger.info(f"Processing async streamed query: {query[:100]}...")
+                
+                retrieved_docs, early_response, cache_key = await self._prepare(query, top_k, search_filter)
+                if early_response is not None:
+                    recorder.record("total", time.perf_counter() - start)
+                    yield {"type": "token", "content": early_response["answer"]}
+                    yield {"type": "done", "response": early_response}
+                    return
+                
+                messages, context_stats = await asyncio.to_thread(self.rag_engine._build_messages, query, retrieved_docs)
+                llm_start = time.perf_counter()
+                stream = await self.client.chat.completions.create(
+                    model=Config.GENERATION_MODEL,
+                    messages=messages,
+                    temperature=Config.TEMPERATURE,
+                    max_tokens=Config.MAX_TOKENS,
+                    stream=True
+                )
+                
+                answer_parts = []
+                async for chunk in stream:
+                    if not chunk.choices:
+                        continue
+                    token = chunk.choices[0].delta.content
+                    if token:
+                        if not answer_parts:
+                            recorder.record("llm_first_token", time.perf_counter() - llm_start)
+                        answer_parts.append(token)
+                        yield {"type": "token", "content": token}
+                recorder.record("llm_call", time.perf_counter() - llm_start)
+                recorder.record("total", time.perf_counter() - start)
+                
+                result = self.rag_engine._build_response("".join(answer_parts), retrieved_docs, context_stats)
+                logger.info("Streamed response generated successfully")
+                
+                if cache_key is not None:
+                    self.rag_engine.answer_cache.put(*cache_key, result)
+            
+            except Exception as e:
+                result = self.rag_engine._error_response(e)
+            
+            yield {"type": "done", "response": result}
+    
+    def stats(self) -> Dict[str, int]:
+        """Distinct requests in flight, the concurrency limit, and requests coalesced so far"""
+        return {
+            "in_flight": len(self._in_flight),
+            "max_concurrency": self.max_concurrency,
+            "coalesced": self.coalesced
+        }
@@ -0,0 +1,3 @@
+"""
+Benchmarks for the GxP Validation Assistant (run from the project root)
+"""
@@ -0,0 +1,128 @@
+"""
+IVF approximate search: p95 latency and recall@k against exact search as the corpus grows
+
+Builds one NumPy index incrementally (upserts of --batch vectors, the way
+add_documents feeds it) up to each --sizes checkpoint, then times held-out
+queries with exact search and with the IVF index at every --nprobe. The
+vectors are synthetic: unit vectors scattered around --topics random topic
+centres, so that near neighbours mean something, unlike the stand-in's
+pseudo-random embeddings. The IVF index trains at the first checkpoint and
+retrains as the corpus grows, as it would in a deployment.
+
+Usage:
+    python -m benchmarks.bench_ann --sizes 10000 30000 100000 --nprobe 4 8 16 32 64
+"""
+import argparse
+import json
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+from config_openai import Config
+
+
+class TopicCorpus:
+    """Unit vectors drawn around fixed topic centres; `spread` is the noise norm relative to the centre"""
+    
+    def __init__(self, dim: int, topics: int, spread: float, seed: int):
+        self.rng = np.random.default_rng(seed)
+        centres = self.rng.normal(size=(topics, dim)).astype(np.float32)
+        self.centres = centres / np.linalg.norm(centres, axis=1, keepdims=True)
+        self.noise = spread / np.sqrt(dim)
+    
+    def sample(self, n: int) -> np.ndarray:
+        vectors = self.centres[self.rng.integers(0, len(self.centres), n)]
+        vectors = vectors + self.rng.normal(scale=self.noise, size=vectors.shape).astype(np.float32)
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def timed_search(index, queries: np.ndarray, k: int):
+    """Top-k ids per query, one query at a time as VectorStore searches, with the p95 latency in ms"""
+    ids, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results = index.query(query.tolist(), k)
+        latencies.append(time.perf_counter() - start)
+        ids.append({result['id'] for result in results})
+    return ids, round(float(np.percentile(latencies, 95)) * 1000, 3)
+
+
+def run(sizes: List[int], nprobes: List[int], k: int, dim: int, topics: int, spread: float,
+        num_queries: int, batch: int, nlist: int, seed: int) -> Dict:
+    from index_backends import NumpyBackend
+    from ivf_index import IVFIndex
+    
+    corpus = TopicCorpus(dim, topics, spread, seed)
+    queries = corpus.sample(num_queries)
+    path = Path(tempfile.mkdtemp(prefix="bench_ann_"))
+    ann = IVFIndex(path, nlist=nlist, min_train_rows=min(sizes))
+    index = NumpyBackend(path, ann)
+    
+    checkpoints = []
+    build_seconds = 0.0
+    for size in sorted(sizes):
+        start = time.perf_counter()
+        while len(index.ids) < size:
+            count = min(batch, size - len(index.ids))
+            first = len(index.ids)
+            index.upsert([f"vec-{row}" for row in range(first, first + count)], corpus.sample(count),
+                         [""] * count, [{}] * count)
+        build_seconds += time.perf_counter() - start
+        
+        # Exact search is what the backend does without an ANN index
+        index.ann = None
+        truth, exact_p95 = timed_search(index, queries, k)
+        index.ann = ann
+        
+        sweep = []
+        for nprobe in nprobes:
+            ann.nprobe = nprobe
+            found, p95 = timed_search(index, queries, k)
+            sweep.append({
+                "nprobe": nprobe,
+                "p95_ms": p95,
+                f"recall@{k}": round(float(np.mean([len(got & exact) / k for got, exact in zip(found, truth)])), 4),
+                "speedup_p95": round(exact_p95 / p95, 2)
+            })
+        checkpoints.append({
+            "vectors": size,
+            "build_seconds": round(build_seconds, 2),
+            "ivf": ann.stats(),
+            "exact_p95_ms": exact_p95,
+            "sweep": sweep
+        })
+    
+    return {
+        "benchmark": "ann",
+        "dim": dim,
+        "topics": topics,
+        "spread": spread,
+        "queries": num_queries,
+        "upsert_batch": batch,
+        "checkpoints": checkpoints
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 30000, 100000],
+                        help="Corpus sizes to measure; the first is where the IVF index trains")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[4, 8, 16, 32, 64], help="Lists searched per query")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--dim", type=int, default=1536, help="Embedding dimensions (text-embedding-3-small: 1536)")
+    parser.add_argument("--topics", type=int, default=1000)
+    parser.add_argument("--spread", type=float, default=1.0, help="Noise norm around a topic centre (centre = 1)")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--batch", type=int, default=1000, help="Vectors per upsert")
+    parser.add_argument("--nlist", type=int, default=Config.IVF_NLIST, help="IVF lists; 0 = 4 * sqrt(vectors)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    print(json.dumps(run(args.sizes, args.nprobe, args.k, args.dim, args.topics, args.spread, args.queries,
+                         args.batch, args.nlist, args.seed), indent=2))
+
+
+if __name__ == "__main__":
+    main()
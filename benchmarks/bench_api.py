@@ -0,0 +1,161 @@
+"""
+Load test of the headless API server, fully offline
+
+Starts the OpenAI stand-in and then `api_server.py` with each --workers
+count, indexes Data/ into a throwaway directory shared by the workers, and
+has concurrent clients POST distinct questions to /query. Also times the
+first token of /query/stream. Reports throughput and latency percentiles
+per worker count.
+
+Usage:
+    python -m benchmarks.bench_api --workers 1 2 4 --users 50 --requests 5
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import httpx
+
+from config_openai import Config
+
+from benchmarks.fake_openai_server import start_server_process
+from benchmarks.stats import latency_stats
+
+
+def free_port() -> int:
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+def wait_until_ready(base_url: str, workers: int, timeout: float = 120) -> float:
+    """Seconds until /ready answers 200 often enough that every worker has likely warmed up"""
+    start = time.perf_counter()
+    streak = 0
+    with httpx.Client(base_url=base_url, timeout=5) as client:
+        while streak < 4 * workers:
+            if time.perf_counter() - start > timeout:
+                raise RuntimeError("API server did not become ready")
+            try:
+                streak = streak + 1 if client.get("/ready").status_code == 200 else 0
+            except httpx.HTTPError:
+                streak = 0
+            time.sleep(0.05 if streak else 0.2)
+    return time.perf_counter() - start
+
+
+async def load(base_url: str, users: int, requests: int, label: str) -> Dict:
+    latencies = []
+    errors = 0
+    
+    async def session(client: httpx.AsyncClient, user: int):
+        nonlocal errors
+        for turn in range(requests):
+            start = time.perf_counter()
+            question = f"{label} user {user} question {turn} on audit trails"
+            response = await client.post("/query", json={"query": question})
+            latencies.append(time.perf_counter() - start)
+            errors += response.status_code != 200
+    
+    limits = httpx.Limits(max_connections=users, max_keepalive_connections=users)
+    async with httpx.AsyncClient(base_url=base_url, timeout=60, limits=limits) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(session(client, user) for user in range(users)))
+        wall = time.perf_counter() - start
+        
+        first_tokens = []
+        for i in range(5):
+            start = time.perf_counter()
+            async with client.stream("POST", "/query/stream", json={"query": f"{label} stream {i}"}) as response:
+                async for line in response.aiter_lines():
+                    if line.startswith("event: token") and len(first_tokens) == i:
+                        first_tokens.append(time.perf_counter() - start)
+    
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "wall_seconds": round(wall, 3),
+        "requests_per_second": round(len(latencies) / wall, 2),
+        "latency": latency_stats(latencies),
+        "stream_first_token": latency_stats(first_tokens)
+    }
+
+
+def run_workers(workers: int, env: Dict[str, str], users: int, requests: int) -> Dict:
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    server = subprocess.Popen([sys.executable, str(Config.BASE_DIR / "api_server.py"), "--port", str(port),
+                               "--workers", str(workers)], env=env, cwd=Config.BASE_DIR,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        ready_seconds = wait_until_ready(base_url, workers)
+        asyncio.run(load(base_url, workers * 2, 2, f"warm-up {workers}"))
+        result = asyncio.run(load(base_url, users, requests, f"workers {workers}"))
+    finally:
+        server.terminate()
+        server.wait()
+    return {"workers": workers, "ready_seconds": round(ready_seconds, 2), **result}
+
+
+def run(worker_counts: List[int], users: int, requests: int, latency: float, chat_latency: float,
+        data_dir: Path) -> Dict:
+    stand_in, base_url = start_server_process(latency=latency, chat_latency=chat_latency)
+    work_dir = Path(tempfile.mkdtemp(prefix="bench_api_"))
+    settings = {
+        "OPENAI_BASE_URL": base_url,
+        "OPENAI_API_KEY": "sk-local-benchmark",
+        "VECTOR_DB_DIR": str(work_dir / "vector_db"),
+        "EMBEDDING_CACHE_PATH": str(work_dir / "embeddings.sqlite"),
+        "ANSWER_CACHE_SIZE": "0",  # distinct questions must reach the model
+        "METRICS_JSONL_ENABLED": "false"
+    }
+    os.environ.update(settings)
+    Config.OPENAI_API_KEY = settings["OPENAI_API_KEY"]
+    Config.VECTOR_DB_DIR = work_dir / "vector_db"
+    Config.EMBEDDING_CACHE_PATH = work_dir / "embeddings.sqlite"
+    Config.DATA_DIR = data_dir
+    
+    from initialize_db_openai import initialize_database
+    from latency_metrics import recorder
+    
+    recorder.jsonl_path = None
+    initialize_database()
+    
+    env = dict(os.environ, PYTHONPATH=str(Config.BASE_DIR))
+    try:
+        results = [run_workers(workers, env, users, requests) for workers in worker_counts]
+    finally:
+        stand_in.terminate()
+    return {
+        "benchmark": "api_server",
+        "users": users,
+        "requests_per_user": requests,
+        "cpus": os.cpu_count(),
+        "stand_in": {"latency_s": latency, "chat_latency_s": chat_latency},
+        "results": results
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2])
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=5, help="Questions per user")
+    parser.add_argument("--latency", type=float, default=0.02, help="Stand-in seconds per embedding request")
+    parser.add_argument("--chat-latency", type=float, default=0.2, help="Stand-in seconds per completion")
+    parser.add_argument("--data-dir", type=Path, default=Config.DATA_DIR)
+    args = parser.parse_args()
+    print(json.dumps(run(args.workers, args.users, args.requests, args.latency, args.chat_latency,
+                         args.data_dir), indent=2))
+
+
+if __name__ == "__main__":
+    main()
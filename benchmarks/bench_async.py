@@ -0,0 +1,132 @@
+"""
+AsyncRAGEngine throughput against the local OpenAI stand-in
+
+Runs the stand-in in its own process so it does not compete with the engine
+for the GIL, indexes Data/ into a throwaway directory, then has N concurrent users each ask
+a series of distinct questions through AsyncRAGEngine.generate_response, for
+each N in --users. Throughput should grow roughly linearly with N until N
+reaches the engine's concurrency limit, then flatten. A final run sends the
+same question from every user at once and reports how many completions
+actually reached the model (1 when coalescing works).
+
+Usage:
+    python -m benchmarks.bench_async --users 1 5 10 25 50 --max-concurrency 20 --chat-latency 0.2
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+from config_openai import Config
+
+from benchmarks.fake_openai_server import start_server_process
+from benchmarks.stats import latency_stats
+
+
+def llm_calls() -> int:
+    from latency_metrics import recorder
+    return recorder.summary().get("llm_call", {}).get("count", 0)
+
+
+async def run_level(engine, users: int, requests: int, label: str) -> Dict:
+    """`users` concurrent sessions, each asking `requests` questions one after another"""
+    latencies = []
+    
+    async def session(user: int):
+        for turn in range(requests):
+            start = time.perf_counter()
+            await engine.generate_response(f"{label} user {user} question {turn} about data integrity")
+            latencies.append(time.perf_counter() - start)
+    
+    start = time.perf_counter()
+    await asyncio.gather(*(session(user) for user in range(users)))
+    wall = time.perf_counter() - start
+    return {
+        "users": users,
+        "requests": len(latencies),
+        "wall_seconds": round(wall, 3),
+        "requests_per_second": round(len(latencies) / wall, 2),
+        "latency": latency_stats(latencies)
+    }
+
+
+async def run_coalescing(engine, users: int) -> Dict:
+    calls_before, coalesced_before = llm_calls(), engine.coalesced
+    start = time.perf_counter()
+    responses = await asyncio.gather(*(engine.generate_response("What does Annex 11 require for audit trails?")
+                                       for _ in range(users)))
+    return {
+        "users": users,
+        "wall_seconds": round(time.perf_counter() - start, 3),
+        "llm_calls": llm_calls() - calls_before,
+        "coalesced": engine.coalesced - coalesced_before,
+        "identical_answers": len({response["answer"] for response in responses}) == 1
+    }
+
+
+async def run_async(rag_engine, user_levels: List[int], requests: int, max_concurrency: int) -> Dict:
+    from async_rag_engine import AsyncRAGEngine
+    
+    engine = AsyncRAGEngine(rag_engine, max_concurrency=max_concurrency)
+    await run_level(engine, 1, 2, "warm-up")  # open connections and load the lexical index
+    
+    levels = [await run_level(engine, users, requests, f"level {users}") for users in user_levels]
+    baseline = levels[0]["requests_per_second"] / levels[0]["users"]
+    for level in levels:
+        ideal = baseline * min(level["users"], max_concurrency)
+        level["scaling_efficiency"] = round(level["requests_per_second"] / ideal, 3)
+    
+    return {"levels": levels, "coalescing": await run_coalescing(engine, max(user_levels))}
+
+
+def run(user_levels: List[int], requests: int, max_concurrency: int, latency: float, chat_latency: float,
+        data_dir: Path) -> Dict:
+    server, base_url = start_server_process(latency=latency, chat_latency=chat_latency)
+    os.environ["OPENAI_BASE_URL"] = base_url
+    Config.OPENAI_API_KEY = "sk-local-benchmark"
+    
+    work_dir = Path(tempfile.mkdtemp(prefix="bench_async_"))
+    Config.VECTOR_DB_DIR = work_dir / "vector_db"
+    Config.EMBEDDING_CACHE_PATH = work_dir / "embeddings.sqlite"
+    Config.DATA_DIR = data_dir
+    Config.ANSWER_CACHE_SIZE = 0  # distinct questions must reach the model; coalescing is measured separately
+    
+    from initialize_db_openai import initialize_database
+    from latency_metrics import recorder
+    from rag_engine_openai import RAGEngine
+    from vector_store_openai import VectorStore
+    
+    recorder.jsonl_path = None
+    initialize_database()
+    rag_engine = RAGEngine(VectorStore())
+    
+    results = asyncio.run(run_async(rag_engine, user_levels, requests, max_concurrency))
+    server.terminate()
+    return {
+        "benchmark": "async_engine",
+        "max_concurrency": max_concurrency,
+        "requests_per_user": requests,
+        "stand_in": {"latency_s": latency, "chat_latency_s": chat_latency},
+        **results
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, nargs="+", default=[1, 5, 10, 25, 50])
+    parser.add_argument("--requests", type=int, default=5, help="Questions per user at each level")
+    parser.add_argument("--max-concurrency", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.02, help="Stand-in seconds per embedding request")
+    parser.add_argument("--chat-latency", type=float, default=0.2, help="Stand-in seconds per completion")
+    parser.add_argument("--data-dir", type=Path, default=Config.DATA_DIR)
+    args = parser.parse_args()
+    print(json.dumps(run(args.users, args.requests, args.max_concurrency, args.latency, args.chat_latency,
+                         args.data_dir), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+Multi-turn chat benchmark: OpenAI round-trips and latency per turn with and without conversation memory
+
+Indexes Data/ against the local OpenAI stand-in, then plays scripted chat
+sessions (opening questions followed by terse follow-ups such as "And
+HAZOP?") through RAGEngine.generate_response twice: every turn as a
+standalone query, and every session with its own ConversationMemory. Counts
+the requests each turn makes to the stand-in (embeddings plus the
+completion), times retrieval and the whole turn, and checks that each turn's
+sources include the document it is about. The stand-in serves random
+vectors, so that check reflects the BM25 half of hybrid search.
+
+Usage:
+    python -m benchmarks.bench_conversation --latency 0.05 --chat-latency 0.3
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+from config_openai import Config
+
+from benchmarks.fake_openai_server import start_server
+
+Q9 = "Q9_Guideline.pdf"
+ANNEX_11 = "annex11_01-2011_en_0.pdf"
+PART_11 = "Part-11--Electronic-Records--Electronic-Signatures---Scope-and-Application-(PDF).pdf"
+
+# (question, document the answer should come from)
+SESSIONS = [
+    [
+        ("What risk management tools does ICH Q9 describe?", Q9),
+        ("What about FMECA?", Q9),
+        ("And HAZOP?", Q9),
+        ("When is it most useful?", Q9),
+        ("How does fault tree analysis evaluate system failures?", Q9),
+        ("What standard describes it?", Q9)
+    ],
+    [
+        ("What does Annex 11 require for accuracy checks of manually entered data?", ANNEX_11),
+        ("And for data migration?", ANNEX_11),
+        ("How should stored data be secured under Annex 11?", ANNEX_11),
+        ("Does this apply to backups too?", ANNEX_11),
+        ("What about incident management?", ANNEX_11)
+    ],
+    [
+        ("How does FDA intend to enforce Part 11 audit trail requirements?", PART_11),
+        ("Does it apply to legacy systems?", PART_11),
+        ("And record retention?", PART_11),
+        ("What about copies of records?", PART_11)
+    ]
+]
+
+
+def play(rag_engine, server, use_memory: bool) -> Dict:
+    """Answer every session turn by turn; per-turn request counts and timings"""
+    from latency_metrics import recorder
+    
+    requests, retrieval, total, hits = [], [], [], []
+    reused = searched = 0
+    for session in SESSIONS:
+        conversation = rag_engine.start_conversation() if use_memory else None
+        for question, source in session:
+            recorder.reset()
+            requests_before = server.request_count
+            start = time.perf_counter()
+            response = rag_engine.generate_response(question, conversation=conversation)
+            total.append(time.perf_counter() - start)
+            requests.append(server.request_count - requests_before)
+            # Everything before the completion: embedding, search, rerank and context assembly
+            stages = recorder.summary()
+            llm_ms = stages["llm_call"]["p50_ms"] if "llm_call" in stages else 0.0
+            retrieval.append(total[-1] - llm_ms / 1000)
+            hits.append(source in response["sources"])
+        if conversation is not None:
+            reused += conversation.stats()["reused"]
+            searched += conversation.stats()["searched"]
+    
+    def ms(samples: List[float], q: float) -> float:
+        return round(float(np.percentile(samples, q)) * 1000, 3)
+    
+    result = {
+        "turns": len(requests),
+        "requests_per_turn": round(sum(requests) / len(requests), 3),
+        "requests_total": sum(requests),
+        "source_hit_rate": round(sum(hits) / len(hits), 3),
+        "retrieval_p50_ms": ms(retrieval, 50),
+        "retrieval_p95_ms": ms(retrieval, 95),
+        "turn_p50_ms": ms(total, 50),
+        "turn_p95_ms": ms(total, 95)
+    }
+    if use_memory:
+        result.update(reused_turns=reused, searched_turns=searched)
+    return result
+
+
+def run(latency: float, chat_latency: float, max_turns: int, memory_kb: float) -> Dict:
+    # Ingest without latency; the timed turns see the configured one
+    server, base_url = start_server(latency=0.0, chat_latency=0.0, token_latency=0.0)
+    os.environ["OPENAI_BASE_URL"] = base_url
+    Config.OPENAI_API_KEY = "sk-local-benchmark"
+    
+    # Everything the run writes lives in a throwaway directory
+    work_dir = Path(tempfile.mkdtemp(prefix="bench_conversation_"))
+    Config.VECTOR_DB_DIR = work_dir / "vector_db"
+    Config.EMBEDDING_CACHE_PATH = work_dir / "embeddings.sqlite"
+    Config.LOGS_DIR.mkdir(exist_ok=True)
+    Config.RETRIEVAL_MODE = "hybrid"  # random stand-in vectors; only BM25 can find the right document
+    Config.ANSWER_CACHE_SIZE = 0  # every turn must reach the model
+    Config.QUERY_CACHE_PERSIST = False  # each pass starts with a cold query cache
+    Config.CONVERSATION_MAX_TURNS = max_turns
+    Config.CONVERSATION_MEMORY_KB = memory_kb
+    
+    from document_processor import DocumentProcessor
+    from latency_metrics import recorder
+    from rag_engine_openai import RAGEngine
+    from vector_store_openai import VectorStore
+    
+    recorder.jsonl_path = None
+    VectorStore().add_documents_stream(DocumentProcessor().iter_documents(sorted(Config.DATA_DIR.glob("*.pdf"))))
+    server.latency = latency
+    server.chat_latency = chat_latency
+    
+    result = {
+        "benchmark": "conversation",
+        "settings": {
+            "latency_s": latency,
+            "chat_latency_s": chat_latency,
+            "retrieval_mode": Config.RETRIEVAL_MODE,
+            "rerank": Config.RERANK_ENABLED,
+            "max_turns": max_turns,
+            "memory_kb": memory_kb,
+            "sessions": len(SESSIONS)
+        }
+    }
+    for name, use_memory in (("standalone", False), ("conversation", True)):
+        # A fresh store per pass, so neither pass finds the other's query embeddings cached
+        vector_store = VectorStore()
+        result[name] = play(RAGEngine(vector_store), server, use_memory)
+    server.shutdown()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds per embedding request")
+    parser.add_argument("--chat-latency", type=float, default=0.3, help="Seconds per completion")
+    parser.add_argument("--max-turns", type=int, default=Config.CONVERSATION_MAX_TURNS,
+                        help="Searched turns a session keeps")
+    parser.add_argument("--memory-kb", type=float, default=Config.CONVERSATION_MEMORY_KB,
+                        help="Per-session memory cap")
+    args = parser.parse_args()
+    print(json.dumps(run(args.latency, args.chat_latency, args.max_turns, args.memory_kb), indent=2))
+
+
+if __name__ == "__main__":
+    main()
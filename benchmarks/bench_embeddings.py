@@ -0,0 +1,105 @@
+"""
+Embedding throughput benchmark: per-chunk requests vs batched vs concurrent batches
+
+Usage:
+    python -m benchmarks.bench_embeddings --limit 500 --latency 0.05 --batch-size 32
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from config_openai import Config
+
+from benchmarks.fake_openai_server import start_server
+
+
+def load_documents(limit: int, pdf: str = None):
+    """Chunk the bundled corpus (or a single PDF) and return up to `limit` chunks"""
+    from document_processor import DocumentProcessor
+    
+    processor = DocumentProcessor()
+    if pdf:
+        documents = processor.process_document(Config.DATA_DIR / pdf)
+    else:
+        documents = processor.process_all_documents(Config.DATA_DIR)
+    return documents[:limit]
+
+
+def run(limit: int, latency: float, batch_size: int, concurrency: int,
+        error_rate: float = 0.0, pdf: str = None) -> dict:
+    Config.LOGS_DIR.mkdir(exist_ok=True)
+    server, base_url = start_server(latency=latency, error_rate=error_rate)
+    os.environ["OPENAI_BASE_URL"] = base_url
+    Config.OPENAI_API_KEY = Config.OPENAI_API_KEY or "sk-local-benchmark"
+    Config.VECTOR_DB_DIR = Path(tempfile.mkdtemp(prefix="bench_vector_db_"))
+    Config.EMBEDDING_BATCH_SIZE = batch_size
+    Config.EMBEDDING_CACHE_ENABLED = False  # measure the API path, not cache reads
+    Config.RETRY_BASE_DELAY = min(Config.RETRY_BASE_DELAY, 0.1)
+    
+    from vector_store_openai import VectorStore
+    
+    documents = load_documents(limit, pdf)
+    texts = [doc["text"] for doc in documents]
+    vector_store = VectorStore()
+    results = {}
+    
+    def record(name, seconds, requests):
+        results[name] = {
+            "seconds": round(seconds, 3),
+            "requests": requests,
+            "chunks_per_s": round(len(texts) / seconds, 2)
+        }
+    
+    # Previous behaviour: one request per chunk plus a fixed pause every 10 chunks
+    requests_before = server.request_count
+    start = time.perf_counter()
+    for i, text in enumerate(texts):
+        vector_store.generate_embedding(text)
+        if (i + 1) % 10 == 0:
+            time.sleep(0.5)
+    record("per_chunk", time.perf_counter() - start, server.request_count - requests_before)
+    
+    # Batched, one request in flight
+    requests_before = server.request_count
+    start = time.perf_counter()
+    for batch_start, batch_end, num_tokens in vector_store.iter_batches(texts):
+        vector_store.generate_embeddings(texts[batch_start:batch_end], num_tokens)
+    record("batched", time.perf_counter() - start, server.request_count - requests_before)
+    
+    # Full ingestion path: concurrent batches under the rate limiter
+    Config.EMBEDDING_CONCURRENCY = concurrency
+    requests_before = server.request_count
+    start = time.perf_counter()
+    vector_store.add_documents(documents)
+    record("concurrent", time.perf_counter() - start, server.request_count - requests_before)
+    
+    server.shutdown()
+    return {
+        "benchmark": "embeddings",
+        "chunks": len(texts),
+        "latency_s": latency,
+        "batch_size": batch_size,
+        "concurrency": concurrency,
+        "error_rate": error_rate,
+        **results
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--limit", type=int, default=500, help="Number of chunks to embed")
+    parser.add_argument("--latency", type=float, default=0.05, help="Stub server latency per request (s)")
+    parser.add_argument("--batch-size", type=int, default=Config.EMBEDDING_BATCH_SIZE, help="Max chunks per request")
+    parser.add_argument("--concurrency", type=int, default=Config.EMBEDDING_CONCURRENCY, help="Batches in flight")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of stub responses that are 429s")
+    parser.add_argument("--pdf", default=None, help="Only chunk this PDF from the Data directory")
+    args = parser.parse_args()
+    print(json.dumps(run(args.limit, args.latency, args.batch_size, args.concurrency,
+                         args.error_rate, args.pdf), indent=2))
+
+
+if __name__ == "__main__":
+    main()
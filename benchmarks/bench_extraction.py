@@ -0,0 +1,51 @@
+"""
+PDF extraction benchmark: in-process vs process-pool extraction of the Data/ corpus
+
+Usage:
+    python -m benchmarks.bench_extraction --workers 4
+"""
+import argparse
+import json
+import os
+import time
+
+from config_openai import Config
+
+
+def run(workers: int, pages_per_task: int) -> dict:
+    from document_processor import DocumentProcessor
+    
+    Config.PAGES_PER_TASK = pages_per_task
+    processor = DocumentProcessor()
+    
+    start = time.perf_counter()
+    serial = processor.process_all_documents(Config.DATA_DIR, workers=1)
+    serial_seconds = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    parallel = processor.process_all_documents(Config.DATA_DIR, workers=workers)
+    parallel_seconds = time.perf_counter() - start
+    
+    return {
+        "benchmark": "extraction",
+        "files": len(list(Config.DATA_DIR.glob("*.pdf"))),
+        "chunks": len(serial),
+        "workers": workers,
+        "pages_per_task": pages_per_task,
+        "serial_s": round(serial_seconds, 3),
+        "parallel_s": round(parallel_seconds, 3),
+        "speedup": round(serial_seconds / parallel_seconds, 2),
+        "identical_chunks": serial == parallel
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes")
+    parser.add_argument("--pages-per-task", type=int, default=Config.PAGES_PER_TASK, help="Pages per work item")
+    args = parser.parse_args()
+    print(json.dumps(run(args.workers, args.pages_per_task), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+HTTP client load test: one OpenAI client per component vs the shared pooled client
+
+Simulates bursts of concurrent chat sessions (one embedding and one completion
+per turn) separated by idle gaps, against the local stand-in with a per-
+connection handshake delay. "per_component" builds a client in VectorStore and
+another in RAGEngine, as before the shared client existed; "shared" uses
+Config.openai_client(). Reports connections opened and turn latency percentiles.
+
+Usage:
+    python -m benchmarks.bench_http_client --users 20 --turns 5 --bursts 3 --gap 6
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List
+
+from config_openai import Config
+
+from benchmarks.fake_openai_server import start_server
+from benchmarks.stats import latency_stats
+
+
+def run_variant(variant: str, server, users: int, turns: int, bursts: int, gap: float) -> Dict:
+    from openai import OpenAI
+    from index_backends import NumpyBackend
+    from rag_engine_openai import RAGEngine
+    from vector_store_openai import VectorStore
+
+    index = NumpyBackend(Path(tempfile.mkdtemp(prefix="bench_http_")))
+    if variant == "per_component":
+        vector_store = VectorStore(index, client=OpenAI(api_key=Config.OPENAI_API_KEY, max_retries=0))
+        rag_engine = RAGEngine(vector_store, client=OpenAI(api_key=Config.OPENAI_API_KEY))
+    else:
+        Config._openai_client = None  # fresh pool for this run
+        vector_store = VectorStore(index)
+        rag_engine = RAGEngine(vector_store)
+
+    def session(user: int, burst: int) -> List[float]:
+        samples = []
+        for turn in range(turns):
+            start = time.perf_counter()
+            vector_store.generate_embedding(f"burst {burst} user {user} question {turn}", persist=False)
+            rag_engine.client.chat.completions.create(
+                model=Config.GENERATION_MODEL,
+                messages=[{"role": "user", "content": "question"}],
+                max_tokens=Config.MAX_TOKENS
+            )
+            samples.append(time.perf_counter() - start)
+        return samples
+
+    connections_before = server.connection_count
+    turn_latencies = []
+    start = time.perf_counter()
+    for burst in range(bursts):
+        if burst:
+            time.sleep(gap)  # idle long enough for short keep-alive expiries to drop connections
+        with ThreadPoolExecutor(max_workers=users) as executor:
+            for samples in executor.map(lambda user: session(user, burst), range(users)):
+                turn_latencies.extend(samples)
+    return {
+        "connections_opened": server.connection_count - connections_before,
+        "turns": len(turn_latencies),
+        "wall_seconds": round(time.perf_counter() - start, 2),
+        "turn_latency": latency_stats(turn_latencies)
+    }
+
+
+def run(users: int, turns: int, bursts: int, gap: float, latency: float, chat_latency: float,
+        connect_latency: float) -> Dict:
+    server, base_url = start_server(latency=latency, chat_latency=chat_latency, connect_latency=connect_latency)
+    os.environ["OPENAI_BASE_URL"] = base_url
+    Config.OPENAI_API_KEY = "sk-local-benchmark"
+    work_dir = Path(tempfile.mkdtemp(prefix="bench_http_client_"))
+    Config.VECTOR_DB_DIR = work_dir
+    Config.EMBEDDING_CACHE_PATH = work_dir / "embeddings.sqlite"
+
+    from latency_metrics import recorder
+    recorder.jsonl_path = None
+
+    results = {variant: run_variant(variant, server, users, turns, bursts, gap)
+               for variant in ("per_component", "shared")}
+    server.shutdown()
+
+    before, after = results["per_component"], results["shared"]
+    return {
+        "benchmark": "http_client",
+        "users": users,
+        "turns_per_user": turns,
+        "bursts": bursts,
+        "gap_s": gap,
+        "stand_in": {"latency_s": latency, "chat_latency_s": chat_latency, "connect_latency_s": connect_latency},
+        "pool": {
+            "max_connections": Config.HTTP_MAX_CONNECTIONS,
+            "max_keepalive": Config.HTTP_MAX_KEEPALIVE,
+            "keepalive_expiry_s": Config.HTTP_KEEPALIVE_EXPIRY
+        },
+        "results": results,
+        "connections_saved": before["connections_opened"] - after["connections_opened"],
+        "p99_speedup": round(before["turn_latency"]["p99_ms"] / after["turn_latency"]["p99_ms"], 2)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=20, help="Concurrent sessions per burst")
+    parser.add_argument("--turns", type=int, default=5, help="Questions per session")
+    parser.add_argument("--bursts", type=int, default=3)
+    parser.add_argument("--gap", type=float, default=6.0, help="Idle seconds between bursts")
+    parser.add_argument("--latency", type=float, default=0.02, help="Stand-in seconds per embedding request")
+    parser.add_argument("--chat-latency", type=float, default=0.05, help="Stand-in seconds per completion")
+    parser.add_argument("--connect-latency", type=float, default=0.05, help="Stand-in seconds per new connection")
+    args = parser.parse_args()
+    print(json.dumps(run(args.users, args.turns, args.bursts, args.gap, args.latency, args.chat_latency,
+                         args.connect_latency), indent=2))
+
+
+if __name__ == "__main__":
+    main()
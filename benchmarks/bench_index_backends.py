@@ -0,0 +1,83 @@
+"""
+Index backend benchmark: load time and query latency of Chroma vs the NumPy index
+
+Uses random unit vectors, so no API calls or PDFs are needed.
+
+Usage:
+    python -m benchmarks.bench_index_backends --vectors 20000 --queries 200
+"""
+import argparse
+import json
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from index_backends import ChromaBackend, NumpyBackend
+
+BACKENDS = {
+    "chroma": ChromaBackend,
+    "numpy": NumpyBackend
+}
+
+
+def percentile_ms(samples, q):
+    return round(float(np.percentile(samples, q)) * 1000, 3)
+
+
+def run(num_vectors: int, num_queries: int, dim: int, top_k: int, batch_size: int = 2000) -> dict:
+    rng = np.random.default_rng(42)
+    vectors = rng.standard_normal((num_vectors, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    queries = rng.standard_normal((num_queries, dim)).astype(np.float32)
+    ids = [f"doc_{i}" for i in range(num_vectors)]
+    
+    results = {}
+    for name, backend_class in BACKENDS.items():
+        path = Path(tempfile.mkdtemp(prefix=f"bench_{name}_"))
+        
+        start = time.perf_counter()
+        backend = backend_class(path)
+        for i in range(0, num_vectors, batch_size):
+            batch = slice(i, i + batch_size)
+            backend.upsert(ids[batch], vectors[batch].tolist(), ids[batch],
+                           [{"source": "bench.pdf", "chunk_id": j} for j in range(i, min(i + batch_size, num_vectors))])
+        build_seconds = time.perf_counter() - start
+        del backend
+        
+        # Load time: open the persisted index and answer the first query
+        start = time.perf_counter()
+        backend = backend_class(path)
+        backend.query(queries[0].tolist(), top_k)
+        load_seconds = time.perf_counter() - start
+        
+        latencies = []
+        for query in queries:
+            query = query.tolist()
+            start = time.perf_counter()
+            backend.query(query, top_k)
+            latencies.append(time.perf_counter() - start)
+        
+        results[name] = {
+            "build_s": round(build_seconds, 3),
+            "load_s": round(load_seconds, 3),
+            "query_p50_ms": percentile_ms(latencies, 50),
+            "query_p95_ms": percentile_ms(latencies, 95)
+        }
+    
+    return {"benchmark": "index_backends", "vectors": num_vectors, "dim": dim, "top_k": top_k, **results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--vectors", type=int, default=20000, help="Corpus size")
+    parser.add_argument("--queries", type=int, default=200, help="Number of timed queries")
+    parser.add_argument("--dim", type=int, default=1536, help="Vector dimension")
+    parser.add_argument("--top-k", type=int, default=5, help="Results per query")
+    args = parser.parse_args()
+    print(json.dumps(run(args.vectors, args.queries, args.dim, args.top_k), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Whole-text vs page-aware extraction: time and peak RSS on one PDF
+
+Each variant runs in a fresh interpreter so peak RSS is not shared.
+
+Usage:
+    python -m benchmarks.bench_page_extraction --pdf d_20170812100731.pdf
+"""
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from config_openai import Config
+
+VARIANTS = ("whole_text", "page_aware")
+
+
+def run_variant(variant: str, pdf_path: Path) -> dict:
+    """Run one extraction variant in this process"""
+    import PyPDF2
+    from document_processor import DocumentProcessor
+    
+    processor = DocumentProcessor()
+    start = time.perf_counter()
+    if variant == "whole_text":
+        # Previous implementation: grow one string page by page, then split it
+        text = ""
+        with open(pdf_path, 'rb') as file:
+            pdf_reader = PyPDF2.PdfReader(file)
+            for page in pdf_reader.pages:
+                text += page.extract_text() + "\n"
+        num_chunks = len(processor.text_splitter.split_text(text))
+    else:
+        num_chunks = len(processor.process_document(pdf_path, workers=1))
+    seconds = time.perf_counter() - start
+    
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        max_rss //= 1024
+    return {"variant": variant, "chunks": num_chunks, "seconds": round(seconds, 3),
+            "peak_rss_mb": round(max_rss / 1024, 1)}
+
+
+def largest_pdf() -> Path:
+    return max(Config.DATA_DIR.glob("*.pdf"), key=lambda path: path.stat().st_size)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pdf", default=None, help="PDF in the Data directory (default: the largest)")
+    parser.add_argument("--variant", choices=VARIANTS, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    pdf_path = Config.DATA_DIR / args.pdf if args.pdf else largest_pdf()
+    
+    if args.variant:
+        print(json.dumps(run_variant(args.variant, pdf_path)))
+        return
+    
+    results = []
+    for variant in VARIANTS:
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_page_extraction", "--pdf", pdf_path.name, "--variant", variant],
+            check=True, capture_output=True, text=True
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    print(json.dumps({"benchmark": "page_extraction", "pdf": pdf_path.name, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+End-to-end pipeline benchmark against the local OpenAI stand-in
+
+Measures ingestion throughput (initialize_database on Data/), VectorStore.search
+latency with a cold and a warm query cache, and generate_response latency,
+then prints one JSON document. Save runs and diff them between commits with
+benchmarks.compare.
+
+Usage:
+    python -m benchmarks.bench_pipeline --latency 0.05 --chat-latency 0.5 --output before.json
+    python -m benchmarks.bench_pipeline --backend numpy --repeats 5
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from config_openai import Config
+
+from benchmarks.fake_openai_server import start_server
+from benchmarks.stats import latency_stats
+
+QUESTIONS_PATH = Path(__file__).parent / "questions.json"
+
+
+def timed(func: Callable, items: List) -> List[float]:
+    samples = []
+    for item in items:
+        start = time.perf_counter()
+        func(item)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=Config.BASE_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+def run(latency: float, chat_latency: float, backend: str, repeats: int, data_dir: Path) -> Dict:
+    server, base_url = start_server(latency=latency, chat_latency=chat_latency)
+    os.environ["OPENAI_BASE_URL"] = base_url
+    Config.OPENAI_API_KEY = "sk-local-benchmark"
+    
+    # Everything the run writes lives in a throwaway directory
+    work_dir = Path(tempfile.mkdtemp(prefix="bench_pipeline_"))
+    Config.VECTOR_DB_DIR = work_dir / "vector_db"
+    Config.EMBEDDING_CACHE_PATH = work_dir / "embeddings.sqlite"
+    Config.DATA_DIR = data_dir
+    Config.INDEX_BACKEND = backend
+    Config.ANSWER_CACHE_SIZE = 0  # every generate_response call must reach the model
+    
+    from initialize_db_openai import initialize_database
+    from latency_metrics import recorder
+    from rag_engine_openai import RAGEngine
+    from vector_store_openai import VectorStore
+    
+    recorder.jsonl_path = None
+    pdf_files = sorted(data_dir.glob("*.pdf"))
+    
+    # Ingestion: extraction, chunking, embedding and upserts from an empty index
+    requests_before = server.request_count
+    start = time.perf_counter()
+    initialize_database()
+    ingest_seconds = time.perf_counter() - start
+    ingest_requests = server.request_count - requests_before
+    ingest_stages = recorder.summary()
+    
+    vector_store = VectorStore()
+    rag_engine = RAGEngine(vector_store)
+    chunks = vector_store.get_collection_count()
+    
+    questions = [item["question"] for item in json.loads(QUESTIONS_PATH.read_text(encoding="utf-8"))]
+    
+    # Search: the first pass embeds every question, later passes hit the query cache
+    cold = timed(vector_store.search, questions)
+    warm = timed(vector_store.search, questions * repeats)
+    
+    # End to end: retrieval, context assembly and one completion per question
+    recorder.reset()
+    generate = timed(rag_engine.generate_response, questions)
+    generate_stages = recorder.summary()
+    
+    def round_stages(stages: Dict) -> Dict:
+        return {stage: {key: round(value, 3) for key, value in stats.items()} for stage, stats in stages.items()}
+    
+    server.shutdown()
+    return {
+        "benchmark": "pipeline",
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "settings": {
+            "latency_s": latency,
+            "chat_latency_s": chat_latency,
+            "backend": backend,
+            "retrieval_mode": Config.RETRIEVAL_MODE,
+            "top_k": Config.TOP_K,
+            "embedding_batch_size": Config.EMBEDDING_BATCH_SIZE,
+            "embedding_concurrency": Config.EMBEDDING_CONCURRENCY,
+            "questions": len(questions),
+            "repeats": repeats
+        },
+        "ingestion": {
+            "pdfs": len(pdf_files),
+            "bytes": sum(pdf_file.stat().st_size for pdf_file in pdf_files),
+            "chunks": chunks,
+            "seconds": round(ingest_seconds, 3),
+            "chunks_per_second": round(chunks / ingest_seconds, 1) if ingest_seconds else 0.0,
+            "api_requests": ingest_requests,
+            "stages": round_stages(ingest_stages)
+        },
+        "search": {
+            "cold": latency_stats(cold),
+            "warm": latency_stats(warm)
+        },
+        "generate_response": dict(latency_stats(generate), stages=round_stages(generate_stages))
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.05, help="Stand-in seconds per embedding request")
+    parser.add_argument("--chat-latency", type=float, default=0.5, help="Stand-in seconds per completion")
+    parser.add_argument("--backend", default=Config.INDEX_BACKEND, choices=["chroma", "numpy"])
+    parser.add_argument("--repeats", type=int, default=3, help="Warm search passes over the questions")
+    parser.add_argument("--data-dir", type=Path, default=Config.DATA_DIR, help="Directory of PDFs to ingest")
+    parser.add_argument("--output", type=Path, help="Also write the JSON result to this file")
+    args = parser.parse_args()
+    
+    result = run(args.latency, args.chat_latency, args.backend, args.repeats, args.data_dir)
+    text = json.dumps(result, indent=2)
+    if args.output:
+        args.output.write_text(text + "\n", encoding="utf-8")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""
+Quantized vector storage: memory, recall@k and latency against float32
+
+Indexes Data/ with the NumPy backend (embeddings from the local stand-in),
+copies its vectors into float16 and int8 indexes with and without the
+full-precision rerank, and compares each with exact float32 search.
+Two query sets:
+  questions       - benchmarks/questions.json, embedded like user questions
+  near_duplicate  - stored vectors plus Gaussian noise, so each query has a
+                    clear neighbourhood as real paraphrases do
+The stand-in's embeddings are pseudo-random, so "questions" is the hard case:
+its nearest neighbours are separated by tiny score gaps. --scale adds
+jittered copies of the corpus to measure larger indexes.
+
+Usage:
+    python -m benchmarks.bench_quantization --k 5 10 --rerank-factor 4 --scale 10
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from config_openai import Config
+
+from benchmarks.fake_openai_server import start_server
+
+QUESTIONS_PATH = Path(__file__).parent / "questions.json"
+VARIANTS = [
+    ("float32", None, False),
+    ("float16", "float16", False),
+    ("float16+rerank", "float16", True),
+    ("int8", "int8", False),
+    ("int8+rerank", "int8", True)
+]
+
+
+def recall_at_k(results: List[List[str]], truth: List[List[str]], k: int) -> float:
+    return round(float(np.mean([len(set(got[:k]) & set(exact[:k])) / k for got, exact in zip(results, truth)])), 4)
+
+
+def search_ids(index, queries: np.ndarray, k: int) -> Tuple[List[List[str]], List[float]]:
+    """Top-k ids per query, searched one query at a time as VectorStore does, with per-query latency"""
+    ids, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results = index.query(query.tolist(), k)
+        latencies.append(time.perf_counter() - start)
+        ids.append([result['id'] for result in results])
+    return ids, latencies
+
+
+def build_corpus(scale: int, noise: float, seed: int):
+    """Index Data/ and return (ids, unit vectors, texts, metadatas, question embeddings)"""
+    from initialize_db_openai import initialize_database
+    from vector_store_openai import VectorStore
+    
+    initialize_database()
+    vector_store = VectorStore()
+    index = vector_store.index
+    rows = sorted(index.id_to_row.values())
+    vectors = np.asarray(index.vectors[rows])
+    ids = [index.ids[row] for row in rows]
+    texts = [index.texts[row] for row in rows]
+    metadatas = [index.metadatas[row] for row in rows]
+    
+    rng = np.random.default_rng(seed)
+    copies = [vectors]
+    for copy in range(1, scale):
+        jittered = vectors + rng.normal(scale=noise, size=vectors.shape).astype(np.float32)
+        copies.append(jittered / np.linalg.norm(jittered, axis=1, keepdims=True))
+        ids.extend(f"{doc_id}#copy{copy}" for doc_id in ids[:len(rows)])
+    vectors = np.vstack(copies)
+    texts, metadatas = texts * scale, metadatas * scale
+    
+    questions = [item["question"] for item in json.loads(QUESTIONS_PATH.read_text(encoding="utf-8"))]
+    question_vectors = np.asarray([vector_store.embed_query(question) for question in questions], dtype=np.float32)
+    return ids, vectors, texts, metadatas, question_vectors
+
+
+def run(ks: List[int], rerank_factor: int, scale: int, num_queries: int, noise: float, seed: int) -> Dict:
+    from index_backends import NumpyBackend, QuantizedNumpyBackend
+    from latency_metrics import recorder
+    
+    server, base_url = start_server(latency=0.0)
+    os.environ["OPENAI_BASE_URL"] = base_url
+    Config.OPENAI_API_KEY = "sk-local-benchmark"
+    work_dir = Path(tempfile.mkdtemp(prefix="bench_quantization_"))
+    Config.VECTOR_DB_DIR = work_dir / "vector_db"
+    Config.EMBEDDING_CACHE_PATH = work_dir / "embeddings.sqlite"
+    Config.INDEX_BACKEND = "numpy"
+    Config.INDEX_QUANTIZATION = "none"
+    recorder.jsonl_path = None
+    
+    ids, vectors, texts, metadatas, question_vectors = build_corpus(scale, noise, seed)
+    server.shutdown()
+    
+    rng = np.random.default_rng(seed)
+    picked = vectors[rng.integers(0, len(vectors), num_queries)]
+    near_duplicates = picked + rng.normal(scale=noise, size=picked.shape).astype(np.float32)
+    query_sets = {"questions": question_vectors, "near_duplicate": near_duplicates}
+    max_k = max(ks)
+    
+    indexes = {}
+    for name, quantization, rerank in VARIANTS:
+        path = work_dir / "variants" / name
+        if quantization is None:
+            index = NumpyBackend(path)
+        else:
+            index = QuantizedNumpyBackend(path, quantization, rerank, rerank_factor)
+        index.upsert(ids, vectors, texts, metadatas)
+        indexes[name] = index
+    
+    truth = {query_set: search_ids(indexes["float32"], queries, max_k)[0] for query_set, queries in query_sets.items()}
+    baseline = indexes["float32"].memory_stats()
+    
+    variants = {}
+    for name, index in indexes.items():
+        stats = index.memory_stats()
+        result = {
+            "scan_bytes_per_vector": round(stats["scan_bytes"] / stats["rows"], 1),
+            "scan_memory_saving": round(1 - stats["scan_bytes"] / baseline["scan_bytes"], 3),
+            "disk_bytes": stats["disk_bytes"],
+            "disk_saving": round(1 - stats["disk_bytes"] / baseline["disk_bytes"], 3)
+        }
+        for query_set, queries in query_sets.items():
+            found, latencies = search_ids(index, queries, max_k)
+            result[query_set] = {
+                **{f"recall@{k}": recall_at_k(found, truth[query_set], k) for k in ks},
+                "mean_query_ms": round(float(np.mean(latencies)) * 1000, 3),
+                "p95_query_ms": round(float(np.percentile(latencies, 95)) * 1000, 3)
+            }
+        variants[name] = result
+    
+    return {
+        "benchmark": "quantization",
+        "vectors": len(ids),
+        "dim": int(vectors.shape[1]),
+        "scale": scale,
+        "rerank_factor": rerank_factor,
+        "queries": {query_set: len(queries) for query_set, queries in query_sets.items()},
+        "near_duplicate_noise": noise,
+        "variants": variants
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--k", type=int, nargs="+", default=[5, 10], help="Recall cut-offs")
+    parser.add_argument("--rerank-factor", type=int, default=Config.QUANTIZATION_RERANK_FACTOR,
+                        help="Quantized candidates re-scored at full precision per result slot")
+    parser.add_argument("--scale", type=int, default=1, help="Copies of the corpus (jittered) in the index")
+    parser.add_argument("--queries", type=int, default=200, help="Near-duplicate queries")
+    parser.add_argument("--noise", type=float, default=0.02, help="Per-dimension noise of near-duplicate queries")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    print(json.dumps(run(args.k, args.rerank_factor, args.scale, args.queries, args.noise, args.seed), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Two-stage retrieval benchmark: recall, rerank latency and prompt tokens against plain top-k search
+
+Indexes Data/ and answers the labelled questions (benchmarks/questions.json)
+two ways: plain hybrid search for --k chunks, and search for --candidates
+chunks reranked down to --top-n under each --budget-ms. Reports recall and
+MRR of the chunks that would reach the prompt, the reranker's latency, and
+the context tokens they add to the prompt (which is what generation time
+scales with). Dense retrieval needs real embeddings; with --offline the
+local stand-in serves random vectors and only the BM25 half of hybrid
+search carries signal.
+
+Usage:
+    python -m benchmarks.bench_rerank --offline --candidates 10 20 40 --top-n 3 5
+"""
+import argparse
+import json
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from config_openai import Config
+
+from benchmarks.bench_retrieval import QUESTIONS_PATH, build_store, is_relevant
+
+
+def quality(ranked: List[List[Dict]], questions: List[Dict]) -> Dict:
+    """recall (any relevant chunk kept) and MRR of the first relevant chunk"""
+    ranks = [next((rank for rank, doc in enumerate(docs, 1) if is_relevant(doc, item)), None)
+             for docs, item in zip(ranked, questions)]
+    return {
+        "recall": round(sum(rank is not None for rank in ranks) / len(ranks), 3),
+        "mrr": round(sum(1 / rank for rank in ranks if rank) / len(ranks), 3)
+    }
+
+
+def context_tokens(ranked: List[List[Dict]]) -> float:
+    from context_builder import assemble_context
+    return round(float(np.mean([assemble_context(docs)[1]["context_tokens"] for docs in ranked])), 1)
+
+
+def ms(samples: List[float], q: float) -> float:
+    return round(float(np.percentile(samples, q)) * 1000, 3)
+
+
+def run(k: int, candidates: List[int], top_ns: List[int], budgets: List[float], offline: bool) -> Dict:
+    from reranker import Reranker
+    
+    questions = json.loads(QUESTIONS_PATH.read_text(encoding="utf-8"))
+    vector_store = build_store(offline)
+    vector_store._ensure_lexical_index()
+    
+    baseline = [vector_store.search(item["question"], k, "hybrid") for item in questions]
+    result = {
+        "benchmark": "rerank",
+        "questions": len(questions),
+        "chunks": vector_store.get_collection_count(),
+        "offline": offline,
+        "baseline": {"k": k, **quality(baseline, questions), "context_tokens": context_tokens(baseline)},
+        "reranked": []
+    }
+    
+    for num_candidates in candidates:
+        fetched = [vector_store.search(item["question"], num_candidates, "hybrid") for item in questions]
+        for budget_ms in budgets:
+            for top_n in top_ns:
+                reranker = Reranker(vector_store.lexical_index, budget_ms)
+                latencies, ranked = [], []
+                for item, docs in zip(questions, fetched):
+                    start = time.perf_counter()
+                    ranked.append(reranker.rerank(item["question"], [dict(doc) for doc in docs], top_n))
+                    latencies.append(time.perf_counter() - start)
+                # Same candidates cut to top_n without reranking: what reranking adds over a shorter list
+                unranked = [docs[:top_n] for docs in fetched]
+                result["reranked"].append({
+                    "candidates": num_candidates,
+                    "budget_ms": budget_ms,
+                    "top_n": top_n,
+                    **quality(ranked, questions),
+                    "without_rerank": quality(unranked, questions),
+                    "context_tokens": context_tokens(ranked),
+                    "rerank_p50_ms": ms(latencies, 50),
+                    "rerank_p95_ms": ms(latencies, 95),
+                    "over_budget": reranker.stats()["over_budget"]
+                })
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--k", type=int, default=Config.TOP_K, help="Chunks sent by plain search")
+    parser.add_argument("--candidates", type=int, nargs="+", default=[10, 20, 40], help="Chunks fetched for reranking")
+    parser.add_argument("--top-n", type=int, nargs="+", default=[3, 5], help="Chunks kept after reranking")
+    parser.add_argument("--budget-ms", type=float, nargs="+", default=[Config.RERANK_BUDGET_MS, 1.0],
+                        help="Per-query rerank budgets")
+    parser.add_argument("--offline", action="store_true", help="Use the local OpenAI stand-in")
+    args = parser.parse_args()
+    print(json.dumps(run(args.k, args.candidates, args.top_n, args.budget_ms, args.offline), indent=2))
+
+
+if __name__ == "__main__":
+    main()
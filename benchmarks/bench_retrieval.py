@@ -0,0 +1,102 @@
+"""
+Retrieval quality benchmark: recall@k of vector, BM25 and hybrid search on labelled questions
+
+A question counts as recalled when a top-k chunk comes from its labelled
+source and contains its labelled phrase (benchmarks/questions.json).
+Dense retrieval needs real embeddings; with --offline the local stand-in
+serves random vectors, so only the lexical numbers are meaningful.
+
+Usage:
+    python -m benchmarks.bench_retrieval --k 5
+    python -m benchmarks.bench_retrieval --k 5 --offline
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from config_openai import Config
+
+QUESTIONS_PATH = Path(__file__).parent / "questions.json"
+
+
+def normalize(text: str) -> str:
+    return " ".join(text.split()).lower()
+
+
+def is_relevant(doc: dict, item: dict) -> bool:
+    return (doc["metadata"].get("source") == item["source"]
+            and normalize(item["phrase"]) in normalize(doc["text"]))
+
+
+def build_store(offline: bool):
+    """Index the Data/ corpus into a throwaway vector store"""
+    if offline:
+        from benchmarks.fake_openai_server import start_server
+        server, base_url = start_server(latency=0.0)
+        os.environ["OPENAI_BASE_URL"] = base_url
+        Config.OPENAI_API_KEY = Config.OPENAI_API_KEY or "sk-local-benchmark"
+    Config.LOGS_DIR.mkdir(exist_ok=True)
+    Config.VECTOR_DB_DIR = Path(tempfile.mkdtemp(prefix="bench_retrieval_"))
+    if offline:
+        # Stand-in vectors must never land in the real embedding cache
+        Config.EMBEDDING_CACHE_PATH = Config.VECTOR_DB_DIR / "embeddings.sqlite"
+    
+    from document_processor import DocumentProcessor
+    from vector_store_openai import VectorStore
+    
+    vector_store = VectorStore()
+    vector_store.add_documents_stream(DocumentProcessor().iter_documents(sorted(Config.DATA_DIR.glob("*.pdf"))))
+    return vector_store
+
+
+def run(k: int, offline: bool) -> dict:
+    questions = json.loads(QUESTIONS_PATH.read_text(encoding="utf-8"))
+    vector_store = build_store(offline)
+    
+    recall = {}
+    for mode in ("vector", "hybrid"):
+        hits = 0
+        for item in questions:
+            results = vector_store.search(item["question"], top_k=k, mode=mode)
+            hits += any(is_relevant(doc, item) for doc in results)
+        recall[mode] = round(hits / len(questions), 3)
+    
+    # Lexical only: rank by BM25 and time the lookups
+    vector_store._ensure_lexical_index()
+    hits = 0
+    latencies = []
+    for item in questions:
+        start = time.perf_counter()
+        lexical = vector_store.lexical_index.search(item["question"], k)
+        latencies.append(time.perf_counter() - start)
+        docs = vector_store.index.get([doc_id for doc_id, _ in lexical])
+        hits += any(is_relevant(doc, item) for doc in docs)
+    recall["bm25"] = round(hits / len(questions), 3)
+    
+    return {
+        "benchmark": "retrieval",
+        "questions": len(questions),
+        "chunks": vector_store.get_collection_count(),
+        "k": k,
+        "offline": offline,
+        "recall_at_k": recall,
+        "bm25_lookup_p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 3),
+        "bm25_lookup_max_ms": round(max(latencies) * 1000, 3)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--k", type=int, default=Config.TOP_K, help="Results per question")
+    parser.add_argument("--offline", action="store_true", help="Use the local OpenAI stand-in")
+    args = parser.parse_args()
+    print(json.dumps(run(args.k, args.offline), indent=2))
+
+
+if __name__ == "__main__":
+    main()
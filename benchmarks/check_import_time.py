@@ -0,0 +1,82 @@
+"""
+Import-time budget check for the Streamlit app
+
+Runs `python -X importtime -c "import app_openai"` in a fresh interpreter,
+reports the cumulative import time and the slowest modules, and exits with
+status 1 if the budget is exceeded or a deferred heavy dependency (OpenAI
+client, ChromaDB, tiktoken, PDF and text-splitting libraries) is imported
+before the UI renders. Runs are repeated and the fastest is kept, to
+filter out noise from a cold disk cache.
+
+Usage:
+    python -m benchmarks.check_import_time --budget-ms 600
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from typing import Dict, List
+
+from config_openai import Config
+
+# Loaded on the warm-up thread, never at import
+DEFERRED_MODULES = ["openai", "chromadb", "tiktoken", "PyPDF2", "langchain_text_splitters", "numpy"]
+
+
+def measure(module: str) -> Dict[str, int]:
+    """Cumulative import time in microseconds of every module imported by `import module`"""
+    env = dict(os.environ, PYTHONPATH=str(Config.BASE_DIR))
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                               cwd=Config.BASE_DIR, env=env, capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{completed.stderr[-2000:]}")
+
+    cumulative = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, total, name = line.split("|")
+        try:
+            cumulative[name.strip()] = int(total)
+        except ValueError:
+            continue  # header line
+    return cumulative
+
+
+def run(module: str, budget_ms: float, runs: int, top: int) -> Dict:
+    best = min((measure(module) for _ in range(runs)), key=lambda times: times.get(module, 0))
+    total_ms = best.get(module, 0) / 1000
+    deferred = [name for name in DEFERRED_MODULES if name in best]
+    slowest: List[Dict] = [
+        {"module": name, "cumulative_ms": round(us / 1000, 1)}
+        for name, us in sorted(best.items(), key=lambda item: item[1], reverse=True)
+        if "." not in name and name != module
+    ][:top]
+    return {
+        "benchmark": "import_time",
+        "module": module,
+        "import_ms": round(total_ms, 1),
+        "budget_ms": budget_ms,
+        "within_budget": total_ms <= budget_ms,
+        "deferred_modules_imported": deferred,
+        "slowest_top_level": slowest,
+        "passed": total_ms <= budget_ms and not deferred
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--module", default="app_openai")
+    parser.add_argument("--budget-ms", type=float, default=600.0)
+    parser.add_argument("--runs", type=int, default=3, help="Fresh interpreters; the fastest run counts")
+    parser.add_argument("--top", type=int, default=10, help="Slowest top-level imports to list")
+    args = parser.parse_args()
+
+    result = run(args.module, args.budget_ms, args.runs, args.top)
+    print(json.dumps(result, indent=2))
+    sys.exit(0 if result["passed"] else 1)
+
+
+if __name__ == "__main__":
+    main()
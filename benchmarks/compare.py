@@ -0,0 +1,77 @@
+"""
+Compare two benchmark JSON results and flag regressions
+
+Every numeric field present in both files is compared. Fields ending in
+"_ms" or "seconds" are better when lower, fields ending in "per_second" or
+"speedup" are better when higher; anything else is shown for context only.
+Exits with status 1 when a metric regresses by more than --threshold.
+
+Usage:
+    python -m benchmarks.compare before.json after.json --threshold 0.10
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+from typing import Dict, Optional
+
+
+def flatten(data, prefix: str = "") -> Dict[str, float]:
+    """Map dotted paths to the numeric leaves of a JSON document"""
+    flat = {}
+    if isinstance(data, dict):
+        for key, value in data.items():
+            flat.update(flatten(value, f"{prefix}{key}."))
+    elif isinstance(data, (int, float)) and not isinstance(data, bool):
+        flat[prefix[:-1]] = float(data)
+    return flat
+
+
+def direction(metric: str) -> Optional[int]:
+    """+1 if higher is better, -1 if lower is better, None if neutral"""
+    name = metric.rsplit(".", 1)[-1]
+    if name.endswith("per_second") or name.endswith("speedup"):
+        return 1
+    if name.endswith("_ms") or name.endswith("seconds"):
+        return -1
+    return None
+
+
+def compare(before: Dict, after: Dict, threshold: float) -> Dict:
+    old, new = flatten(before), flatten(after)
+    rows = []
+    regressions = []
+    for metric in sorted(old.keys() & new.keys()):
+        better = direction(metric)
+        change = (new[metric] - old[metric]) / old[metric] if old[metric] else 0.0
+        regressed = better is not None and -better * change > threshold
+        rows.append({"metric": metric, "before": old[metric], "after": new[metric],
+                     "change": round(change, 4), "regressed": regressed})
+        if regressed:
+            regressions.append(metric)
+    return {"threshold": threshold, "metrics": rows, "regressions": regressions}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("before", type=Path)
+    parser.add_argument("after", type=Path)
+    parser.add_argument("--threshold", type=float, default=0.10, help="Relative change counted as a regression")
+    parser.add_argument("--json", action="store_true", help="Print the comparison as JSON")
+    args = parser.parse_args()
+    
+    result = compare(json.loads(args.before.read_text(encoding="utf-8")),
+                     json.loads(args.after.read_text(encoding="utf-8")),
+                     args.threshold)
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        for row in result["metrics"]:
+            flag = "  REGRESSION" if row["regressed"] else ""
+            print(f"{row['metric']:<60} {row['before']:>12.3f} {row['after']:>12.3f} {row['change']:>+8.1%}{flag}")
+        print(f"{len(result['regressions'])} regression(s) above {args.threshold:.0%}")
+    sys.exit(1 if result["regressions"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+"""
+Local OpenAI-compatible stand-in for benchmarks
+
+Serves deterministic embeddings and completions with a configurable
+per-request latency so benchmarks never need a real API key. Also runs
+standalone for manual testing:
+
+    python -m benchmarks.fake_openai_server --port 8765
+"""
+import argparse
+import base64
+import hashlib
+import json
+import random
+import socket
+import struct
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Tuple
+
+EMBEDDING_DIM = 1536
+ANSWER = "This is a local benchmark answer."
+
+
+def fake_embedding(text: str, dim: int = EMBEDDING_DIM) -> List[float]:
+    """Deterministic pseudo-random unit vector derived from the text"""
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "big")
+    rng = random.Random(seed)
+    vector = [rng.gauss(0.0, 1.0) for _ in range(dim)]
+    norm = sum(v * v for v in vector) ** 0.5
+    return [v / norm for v in vector]
+
+
+def encode_embedding(vector: List[float], encoding_format: str = "float"):
+    """Embedding as the API returns it: a float list, or little-endian float32 in base64"""
+    if encoding_format == "base64":
+        return base64.b64encode(struct.pack(f"<{len(vector)}f", *vector)).decode("ascii")
+    return vector
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    """Handles /v1/embeddings and /v1/chat/completions"""
+    
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True  # headers and body are separate writes; avoid delayed-ACK stalls
+    
+    def setup(self):
+        """Count each new TCP connection and charge it a handshake delay"""
+        super().setup()
+        with self.server.stats_lock:
+            self.server.connection_count += 1
+        time.sleep(self.server.connect_latency)
+    
+    def log_message(self, format, *args):
+        pass
+    
+    def _send_json(self, payload: dict, status: int = 200):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def _send_stream(self, request: dict):
+        """Stream the answer word by word as server-sent events (chunked encoding)"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        
+        def write_event(data: str):
+            payload = f"data: {data}\n\n".encode("utf-8")
+            self.wfile.write(f"{len(payload):x}\r\n".encode("ascii") + payload + b"\r\n")
+            self.wfile.flush()
+        
+        words = ANSWER.split(" ")
+        for i, word in enumerate(words):
+            if i:
+                time.sleep(self.server.token_latency)
+            write_event(json.dumps({
+                "id": "chatcmpl-local",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": request.get("model"),
+                "choices": [{
+                    "index": 0,
+                    "delta": {"content": word if i == 0 else " " + word},
+                    "finish_reason": "stop" if i == len(words) - 1 else None
+                }]
+            }))
+        write_event("[DONE]")
+        self.wfile.write(b"0\r\n\r\n")
+    
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        self.server.request_count += 1
+        if self.path.endswith("/chat/completions"):
+            time.sleep(self.server.chat_latency)
+        else:
+            time.sleep(self.server.latency)
+        
+        if self.server.error_rate and random.random() < self.server.error_rate:
+            self._send_json({"error": {"message": "Rate limit reached", "type": "rate_limit_exceeded"}}, status=429)
+            return
+        
+        if self.path.endswith("/embeddings"):
+            inputs = request.get("input", [])
+            if isinstance(inputs, str):
+                inputs = [inputs]
+            encoding = request.get("encoding_format", "float")
+            self._send_json({
+                "object": "list",
+                "model": request.get("model"),
+                "data": [
+                    {"object": "embedding", "index": i, "embedding": encode_embedding(fake_embedding(text), encoding)}
+                    for i, text in enumerate(inputs)
+                ],
+                "usage": {"prompt_tokens": 0, "total_tokens": 0}
+            })
+        elif self.path.endswith("/chat/completions") and request.get("stream"):
+            self._send_stream(request)
+        elif self.path.endswith("/chat/completions"):
+            self._send_json({
+                "id": "chatcmpl-local",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": request.get("model"),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": ANSWER},
+                    "finish_reason": "stop"
+                }],
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+            })
+        else:
+            self._send_json({"error": {"message": f"Unknown path {self.path}"}}, status=404)
+
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128  # the default backlog of 5 drops connection bursts and adds 1s SYN retries
+
+
+def start_server(latency: float = 0.05, error_rate: float = 0.0, token_latency: float = 0.01,
+                 host: str = "127.0.0.1", port: int = 0, chat_latency: float = None,
+                 connect_latency: float = 0.0) -> Tuple[FakeOpenAIServer, str]:
+    """Start the stand-in server in a background thread and return (server, base_url)
+
+    `latency` delays every response, `chat_latency` overrides it for chat
+    completions (time to first token for streams), `token_latency` spaces
+    streamed tokens and `error_rate` is the fraction of requests answered
+    with HTTP 429. `connect_latency` delays every new connection, standing
+    in for a TLS handshake; `server.connection_count` counts connections.
+    """
+    server = FakeOpenAIServer((host, port), FakeOpenAIHandler)
+    server.latency = latency
+    server.chat_latency = latency if chat_latency is None else chat_latency
+    server.error_rate = error_rate
+    server.token_latency = token_latency
+    server.request_count = 0
+    server.connect_latency = connect_latency
+    server.connection_count = 0
+    server.stats_lock = threading.Lock()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+
+def start_server_process(latency: float = 0.05, chat_latency: float = None, token_latency: float = 0.01,
+                         host: str = "127.0.0.1") -> Tuple[subprocess.Popen, str]:
+    """Run the stand-in in a separate interpreter and return (process, base_url)
+
+    For concurrency benchmarks: an in-process server shares the GIL with the
+    client under test, so its JSON encoding shows up as client latency.
+    """
+    with socket.socket() as probe:
+        probe.bind((host, 0))
+        port = probe.getsockname()[1]
+    command = [sys.executable, "-m", "benchmarks.fake_openai_server", "--host", host, "--port", str(port),
+               "--latency", str(latency), "--token-latency", str(token_latency)]
+    if chat_latency is not None:
+        command += ["--chat-latency", str(chat_latency)]
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+    
+    deadline = time.monotonic() + 10
+    while True:
+        try:
+            socket.create_connection((host, port), timeout=1).close()
+            return process, f"http://{host}:{port}/v1"
+        except OSError:
+            if process.poll() is not None or time.monotonic() > deadline:
+                process.kill()
+                raise RuntimeError("Local OpenAI stand-in failed to start")
+            time.sleep(0.05)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the local OpenAI stand-in in the foreground")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds per response")
+    parser.add_argument("--chat-latency", type=float, default=None, help="Seconds per chat completion")
+    parser.add_argument("--token-latency", type=float, default=0.01, help="Seconds between streamed tokens")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 429")
+    args = parser.parse_args()
+    
+    server, base_url = start_server(args.latency, args.error_rate, args.token_latency, args.host, args.port,
+                                    args.chat_latency)
+    print(f"Serving on {base_url}; set OPENAI_BASE_URL={base_url} and any OPENAI_API_KEY")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
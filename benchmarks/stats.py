@@ -0,0 +1,19 @@
+"""
+Summary statistics shared by the benchmarks
+"""
+from typing import Dict, List
+
+import numpy as np
+
+
+def latency_stats(samples: List[float]) -> Dict:
+    """Summary of a list of durations in seconds, reported in milliseconds"""
+    values = np.array(samples) * 1000
+    return {
+        "n": len(samples),
+        "mean_ms": round(float(values.mean()), 3),
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p95_ms": round(float(np.percentile(values, 95)), 3),
+        "p99_ms": round(float(np.percentile(values, 99)), 3),
+        "max_ms": round(float(values.max()), 3)
+    }
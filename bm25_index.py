@@ -0,0 +1,211 @@
+"""
+Persisted BM25 inverted index for lexical retrieval
+"""
+import math
+import pickle
+import re
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+import numpy as np
+from logging_setup import get_logger
+
+logger = get_logger(__name__, 'vector_store_openai.log')
+
+# Keeps regulatory references intact: "11.10(e)", "820.30(g)", "§4.8", "q9", "iso/iec"
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[./\-][a-z0-9]+)*(?:\([a-z0-9]{1,4}\))*")
+_PARENTHETICAL = re.compile(r"\([a-z0-9]{1,4}\)")
+
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have how in is it its of on or that the this to was "
+    "what when which who why will with does do should can about between".split()
+)
+
+_FORMAT_VERSION = 1
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase terms; compound references also emit their base ("11.10(e)" -> "11.10(e)", "11.10")"""
+    tokens = []
+    for token in _TOKEN_PATTERN.findall(text.lower()):
+        if token in _STOPWORDS:
+            continue
+        tokens.append(token)
+        base = _PARENTHETICAL.sub("", token)
+        if base != token:
+            tokens.append(base)
+        # "iso/iec" and "27001-2013" should also match text written as "ISO IEC" or "27001:2013"
+        if "/" in base or "-" in base:
+            tokens.extend(part for part in re.split(r"[/\-]", base) if part and part not in _STOPWORDS)
+    return tokens
+
+
+class BM25Index:
+    """Okapi BM25 over chunk texts, keyed by chunk id
+    
+    Postings are kept as term -> {row: term frequency} for cheap updates and
+    compiled into per-term NumPy arrays on first query after a write, so a
+    lookup is a handful of vectorised operations.
+    """
+    
+    def __init__(self, path: Path, k1: float = 1.5, b: float = 0.75):
+        self.path = Path(path)
+        self.k1 = k1
+        self.b = b
+        self.lock = threading.RLock()
+        self.ids: List[str] = []
+        self.doc_lengths: List[int] = []
+        self.id_to_row: Dict[str, int] = {}
+        self.postings: Dict[str, Dict[int, int]] = {}
+        self._compiled = None
+        self.dirty = False  # changed since the last save
+        self.loaded = self._load()
+    
+    def _load(self) -> bool:
+        if not self.path.exists():
+            return False
+        try:
+            with open(self.path, "rb") as file:
+                state = pickle.load(file)
+            if state.get("version") != _FORMAT_VERSION:
+                return False
+            self.ids = state["ids"]
+            self.doc_lengths = state["doc_lengths"]
+            self.id_to_row = state["id_to_row"]
+            self.postings = state["postings"]
+            return True
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable BM25 index {self.path}: {str(e)}")
+            return False
+    
+    def save(self):
+        with self.lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(".tmp")
+            with open(tmp_path, "wb") as file:
+                pickle.dump({
+                    "version": _FORMAT_VERSION,
+                    "ids": self.ids,
+                    "doc_lengths": self.doc_lengths,
+                    "id_to_row": self.id_to_row,
+                    "postings": self.postings
+                }, file, protocol=pickle.HIGHEST_PROTOCOL)
+            tmp_path.replace(self.path)
+            self.dirty = False
+    
+    def count(self) -> int:
+        return len(self.id_to_row)
+    
+    def idf(self, term: str) -> float:
+        """Inverse document frequency of an already tokenized term, as BM25 weighs it"""
+        with self.lock:
+            document_frequency = len(self.postings.get(term, ()))
+            return math.log(1 + (self.count() - document_frequency + 0.5) / (document_frequency + 0.5))
+    
+    def add(self, ids: Iterable[str], texts: Iterable[str]):
+        """Index chunks, replacing any previous version of the same ids"""
+        with self.lock:
+            ids = list(ids)
+            self.delete(ids)
+            for doc_id, text in zip(ids, texts):
+                row = len(self.ids)
+                terms = Counter(tokenize(text))
+                self.ids.append(doc_id)
+                self.doc_lengths.append(sum(terms.values()))
+                self.id_to_row[doc_id] = row
+                for term, frequency in terms.items():
+                    self.postings.setdefault(term, {})[row] = frequency
+            self._compiled = None
+            self.dirty = True
+    
+    def delete(self, ids: Iterable[str]):
+        with self.lock:
+            rows = [self.id_to_row.pop(doc_id) for doc_id in ids if doc_id in self.id_to_row]
+            if not rows:
+                return
+            # Rows stay allocated; live rows are tracked by id_to_row
+            dead = set(rows)
+            for term in list(self.postings):
+                posting = self.postings[term]
+                for row in dead.intersection(posting):
+                    del posting[row]
+                if not posting:
+                    del self.postings[term]
+            self._compiled = None
+            self.dirty = True
+            if len(self.ids) > 2 * max(self.count(), 1):
+                self._compact()
+    
+    def clear(self):
+        with self.lock:
+            self.ids, self.doc_lengths, self.id_to_row, self.postings = [], [], {}, {}
+            self._compiled = None
+            self.dirty = True
+    
+    def _compact(self):
+        """Renumber live rows after many deletions"""
+        order = sorted(self.id_to_row.values())
+        new_row = {old: new for new, old in enumerate(order)}
+        self.ids = [self.ids[old] for old in order]
+        self.doc_lengths = [self.doc_lengths[old] for old in order]
+        self.id_to_row = {doc_id: new for new, doc_id in enumerate(self.ids)}
+        self.postings = {
+            term: {new_row[row]: frequency for row, frequency in posting.items()}
+            for term, posting in self.postings.items()
+        }
+    
+    def _compile(self):
+        num_docs = self.count()
+        lengths = np.asarray(self.doc_lengths, dtype=np.float32)
+        live_rows = list(self.id_to_row.values())
+        avg_length = float(lengths[live_rows].mean()) if live_rows else 1.0
+        # Per-row length normalisation folded into one array: k1 * (1 - b + b * dl / avgdl)
+        norms = self.k1 * (1 - self.b + self.b * lengths / max(avg_length, 1e-9))
+        compiled_postings = {}
+        for term, posting in self.postings.items():
+            rows = np.fromiter(posting.keys(), dtype=np.int64, count=len(posting))
+            frequencies = np.fromiter(posting.values(), dtype=np.float32, count=len(posting))
+            idf = math.log(1 + (num_docs - len(posting) + 0.5) / (len(posting) + 0.5))
+            compiled_postings[term] = (rows, idf * frequencies * (self.k1 + 1), frequencies + norms[rows])
+        self._compiled = (compiled_postings, len(self.ids))
+    
+    def search(self, query: str, top_k: int, allowed_ids: Iterable[str] = None) -> List[Tuple[str, float]]:
+        """Return (chunk id, BM25 score) pairs, best first, optionally among `allowed_ids` only"""
+        with self.lock:
+            if self._compiled is None:
+                self._compile()
+            compiled_postings, num_rows = self._compiled
+            ids = self.ids
+            allowed_rows = None
+            if allowed_ids is not None:
+                allowed_rows = [row for row in map(self.id_to_row.get, allowed_ids) if row is not None]
+        
+        terms = [term for term in set(tokenize(query)) if term in compiled_postings]
+        if not terms or top_k <= 0:
+            return []
+        scores = np.zeros(num_rows, dtype=np.float32)
+        for term in terms:
+            rows, numerators, denominators = compiled_postings[term]
+            scores[rows] += numerators / denominators
+        if allowed_rows is not None:
+            allowed = np.zeros(num_rows, dtype=bool)
+            allowed[[row for row in allowed_rows if row < num_rows]] = True
+            scores[~allowed] = 0.0
+        
+        candidates = np.flatnonzero(scores)
+        if not len(candidates):
+            return []
+        k = min(top_k, len(candidates))
+        top = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        top = top[np.argsort(-scores[top])]
+        return [(ids[row], float(scores[row])) for row in top]
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """Fuse several ranked id lists: score(id) = sum over lists of 1 / (k + rank)"""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, 1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
@@ -1,7 +1,9 @@
 """
 Configuration for GxP Validation Assistant
 """
+import importlib.util
 import os
+import threading
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -14,30 +16,169 @@ class Config:
     # Base paths
     BASE_DIR = Path(__file__).parent
     DATA_DIR = BASE_DIR / "Data"
-    VECTOR_DB_DIR = BASE_DIR / "vector_db_openai"
+    VECTOR_DB_DIR = Path(os.getenv("VECTOR_DB_DIR", BASE_DIR / "vector_db_openai"))
+    MANIFEST_FILE = "index_manifest.json"  # stored inside VECTOR_DB_DIR
     LOGS_DIR = BASE_DIR / "logs"
+    CACHE_DIR = BASE_DIR / "cache"
     
     # API Configuration
     OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
     
+    # OpenAI HTTP client (one connection pool shared by the vector store and the RAG engine)
+    HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", 100))
+    HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", 50))
+    HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", 60))  # seconds an idle connection stays open
+    HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "true").lower() == "true"  # used when the h2 package is installed
+    HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", 5))
+    EMBEDDING_TIMEOUT = float(os.getenv("EMBEDDING_TIMEOUT", 30))
+    GENERATION_TIMEOUT = float(os.getenv("GENERATION_TIMEOUT", 120))
+    GENERATION_MAX_RETRIES = int(os.getenv("GENERATION_MAX_RETRIES", 2))  # embeddings retry via MAX_RETRIES
+    ASYNC_MAX_CONCURRENCY = int(os.getenv("ASYNC_MAX_CONCURRENCY", 32))  # requests AsyncRAGEngine runs at once
+    
     # Model Configuration
     EMBEDDING_MODEL = "text-embedding-ada-002"
     GENERATION_MODEL = "gpt-3.5-turbo"  # or "gpt-4" for better quality
     
+    # Embedding requests while indexing
+    EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", 256))  # API cap is 2048 inputs
+    EMBEDDING_BATCH_TOKENS = int(os.getenv("EMBEDDING_BATCH_TOKENS", 100000))  # API cap is 300k tokens
+    EMBEDDING_CONCURRENCY = int(os.getenv("EMBEDDING_CONCURRENCY", 4))
+    INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", 1024))  # chunks held in memory while indexing
+    
+    # Rate limits (match your OpenAI account tier) and retry policy
+    EMBEDDING_RPM = int(os.getenv("EMBEDDING_RPM", 3000))
+    EMBEDDING_TPM = int(os.getenv("EMBEDDING_TPM", 1000000))
+    MAX_RETRIES = int(os.getenv("MAX_RETRIES", 6))
+    RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", 1.0))
+    RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", 60.0))
+    # Query embeddings keep a user waiting, so they give up much sooner than ingestion
+    QUERY_MAX_RETRIES = int(os.getenv("QUERY_MAX_RETRIES", 2))
+    QUERY_RETRY_MAX_DELAY = float(os.getenv("QUERY_RETRY_MAX_DELAY", 2.0))
+    
+    # Embedding cache (reused across rebuilds so unchanged chunks are never re-embedded)
+    EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+    EMBEDDING_CACHE_PATH = Path(os.getenv("EMBEDDING_CACHE_PATH", CACHE_DIR / "embeddings.sqlite"))
+    
+    # Query embedding cache (in-process LRU; PERSIST also stores queries in the embedding cache)
+    QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", 1024))
+    QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", 3600))  # seconds, 0 = never expire
+    QUERY_CACHE_PERSIST = os.getenv("QUERY_CACHE_PERSIST", "true").lower() == "true"
+    
+    # Semantic answer cache (cosine similarity between query embeddings)
+    ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", 256))  # 0 disables the cache
+    ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", 0.95))
+    
+    # Vector index backend: "chroma" (persistent ChromaDB) or "numpy" (memory-mapped matrix)
+    INDEX_BACKEND = os.getenv("INDEX_BACKEND", "chroma")
+    # Compact numpy index: "none" (float32), "float16" or "int8" (per-vector scale)
+    INDEX_QUANTIZATION = os.getenv("INDEX_QUANTIZATION", "none").lower()
+    QUANTIZATION_RERANK = os.getenv("QUANTIZATION_RERANK", "true").lower() == "true"  # float32 kept on disk
+    QUANTIZATION_RERANK_FACTOR = int(os.getenv("QUANTIZATION_RERANK_FACTOR", 4))  # candidates per result slot
+    # Approximate search for the numpy backend: "none" (exact) or "ivf" (k-means inverted lists)
+    INDEX_ANN = os.getenv("INDEX_ANN", "none").lower()
+    IVF_NLIST = int(os.getenv("IVF_NLIST", 0))  # lists; 0 = 4 * sqrt(vectors) at each (re)training
+    IVF_NPROBE = int(os.getenv("IVF_NPROBE", 16))  # lists searched per query: higher is slower, better recall
+    IVF_MIN_TRAIN_ROWS = int(os.getenv("IVF_MIN_TRAIN_ROWS", 10000))  # exact search below this many vectors
+    
     # RAG Configuration
     CHUNK_SIZE = 1000
     CHUNK_OVERLAP = 200
     TOP_K = int(os.getenv("TOP_K", 5))
+    RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "vector")  # "vector" or "hybrid" (vector + BM25)
+    HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", 4))  # dense/lexical candidates per result slot
+    RRF_K = int(os.getenv("RRF_K", 60))
+    # Two-stage retrieval: over-fetch candidates, rerank them locally, keep the best few for the prompt
+    RERANK_ENABLED = os.getenv("RERANK_ENABLED", "false").lower() == "true"
+    RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", 20))  # chunks fetched from search for reranking
+    RERANK_TOP_N = int(os.getenv("RERANK_TOP_N", 3))  # chunks kept when no top_k is given
+    RERANK_BUDGET_MS = float(os.getenv("RERANK_BUDGET_MS", 30))  # per query; unscored candidates keep their rank
+    RERANK_CROSS_ENCODER = os.getenv("RERANK_CROSS_ENCODER", "")  # optional model, needs sentence-transformers
+    CONVERSATION_MAX_TURNS = int(os.getenv("CONVERSATION_MAX_TURNS", 3))  # searched chat turns a session keeps
+    CONVERSATION_POOL = int(os.getenv("CONVERSATION_POOL", 20))  # chunks kept per searched turn for follow-ups
+    CONVERSATION_MEMORY_KB = float(os.getenv("CONVERSATION_MEMORY_KB", 256))  # per-session cap on cached chunk text
+    # Share of a follow-up's terms one cached chunk must hold for the turn to skip search
+    CONVERSATION_REUSE_COVERAGE = float(os.getenv("CONVERSATION_REUSE_COVERAGE", 0.8))
     MAX_TOKENS = int(os.getenv("MAX_TOKENS", 2048))
+    MODEL_CONTEXT_WINDOW = int(os.getenv("MODEL_CONTEXT_WINDOW", 16385))  # gpt-3.5-turbo; 8192 for gpt-4
+    CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 0))  # 0 = whatever the window leaves for context
+    CONTEXT_DEDUP_THRESHOLD = float(os.getenv("CONTEXT_DEDUP_THRESHOLD", 0.8))  # shingle overlap that counts as duplicate
     TEMPERATURE = float(os.getenv("TEMPERATURE", 0.3))
+    GENERATION_CONCURRENCY = int(os.getenv("GENERATION_CONCURRENCY", 8))  # completions in flight in generate_batch
+    
+    # Latency metrics (per-stage spans, logged as JSONL and optionally served as Prometheus text)
+    METRICS_WINDOW = int(os.getenv("METRICS_WINDOW", 1000))  # recent samples per stage behind the percentiles
+    METRICS_JSONL_ENABLED = os.getenv("METRICS_JSONL_ENABLED", "true").lower() == "true"
+    METRICS_JSONL_PATH = Path(os.getenv("METRICS_JSONL_PATH", LOGS_DIR / "metrics.jsonl"))
+    METRICS_JSONL_MAX_MB = float(os.getenv("METRICS_JSONL_MAX_MB", 20))  # rolled over to <path>.1; 0 = no cap
+    METRICS_PORT = int(os.getenv("METRICS_PORT", 0))  # 0 = no /metrics endpoint
+    
+    # Headless API server (api_server.py); each worker process loads its own index
+    API_HOST = os.getenv("API_HOST", "127.0.0.1")
+    API_PORT = int(os.getenv("API_PORT", 8000))
+    API_WORKERS = int(os.getenv("API_WORKERS", 1))
     
     # Application Settings
     APP_TITLE = os.getenv("APP_TITLE", "GxP Validation Assistant")
     APP_ICON = os.getenv("APP_ICON", "🏥")
     
+    # PDF extraction (0 = one worker per CPU, 1 = extract in-process)
+    EXTRACTION_WORKERS = int(os.getenv("EXTRACTION_WORKERS", 0))
+    PAGES_PER_TASK = int(os.getenv("PAGES_PER_TASK", 25))
+    
     # Supported file types
     SUPPORTED_EXTENSIONS = [".pdf"]
     
+    _openai_client = None
+    _async_openai_client = None
+    _openai_client_lock = threading.Lock()
+    
+    @classmethod
+    def _openai_client_options(cls, http_client_class) -> dict:
+        """Constructor arguments shared by the sync and async OpenAI clients"""
+        # Imported here so loading the configuration stays cheap
+        import httpx
+        
+        http_client = http_client_class(
+            http2=cls.HTTP2_ENABLED and importlib.util.find_spec("h2") is not None,
+            limits=httpx.Limits(
+                max_connections=cls.HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=cls.HTTP_MAX_KEEPALIVE,
+                keepalive_expiry=cls.HTTP_KEEPALIVE_EXPIRY
+            )
+        )
+        return {
+            "api_key": cls.OPENAI_API_KEY,
+            "http_client": http_client,
+            "timeout": httpx.Timeout(cls.GENERATION_TIMEOUT, connect=cls.HTTP_CONNECT_TIMEOUT),
+            "max_retries": cls.GENERATION_MAX_RETRIES
+        }
+    
+    @classmethod
+    def openai_client(cls):
+        """Process-wide OpenAI client over one tuned connection pool, created on first use
+        
+        Callers needing other timeouts or retries derive a view with
+        `client.with_options(...)`, which keeps the same connection pool.
+        """
+        with cls._openai_client_lock:
+            if cls._openai_client is None:
+                from openai import DefaultHttpxClient, OpenAI
+                cls._openai_client = OpenAI(**cls._openai_client_options(DefaultHttpxClient))
+            return cls._openai_client
+    
+    @classmethod
+    def async_openai_client(cls):
+        """Process-wide AsyncOpenAI client with the same pool settings
+        
+        Its connections belong to the event loop that first uses it, so a
+        process should drive it from a single long-lived loop.
+        """
+        with cls._openai_client_lock:
+            if cls._async_openai_client is None:
+                from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+                cls._async_openai_client = AsyncOpenAI(**cls._openai_client_options(DefaultAsyncHttpxClient))
+            return cls._async_openai_client
+    
     @classmethod
     def validate(cls):
         """Validate configuration"""
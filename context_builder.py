@@ -0,0 +1,172 @@
+"""
+Context assembly: merge neighbouring chunks, drop duplicates and pack under a token budget
+"""
+import re
+from typing import Dict, List, Optional, Set, Tuple
+from config_openai import Config
+from vector_store_openai import count_tokens
+
+_WORD = re.compile(r"\w+")
+
+# Word n-gram size used to compare chunk texts
+_SHINGLE_SIZE = 5
+
+
+class Passage:
+    """A run of consecutive chunks from one source"""
+    
+    def __init__(self, doc: Dict):
+        metadata = doc['metadata']
+        self.source = metadata.get('source', 'Unknown')
+        self.first_chunk = metadata.get('chunk_id')
+        self.last_chunk = self.first_chunk
+        self.page_start = metadata.get('page_start')
+        self.page_end = metadata.get('page_end')
+        self.text = doc['text']
+    
+    def label(self, number: int) -> str:
+        source = self.source
+        if self.page_start is not None:
+            pages = f"p. {self.page_start}" if self.page_start == self.page_end else f"pp. {self.page_start}-{self.page_end}"
+            source = f"{source}, {pages}"
+        return f"[Source {number}: {source}]"
+    
+    def format(self, number: int) -> str:
+        return f"{self.label(number)}\n{self.text}\n"
+    
+    def adjacent(self, other: "Passage") -> bool:
+        return (self.source == other.source and self.first_chunk is not None and other.first_chunk is not None
+                and other.first_chunk <= self.last_chunk + 1 and self.first_chunk <= other.last_chunk + 1)
+    
+    def merge(self, other: "Passage"):
+        """Absorb a neighbouring passage, keeping document order and dropping the shared overlap"""
+        if other.first_chunk >= self.first_chunk:
+            if other.last_chunk > self.last_chunk:
+                self.text = join_overlapping(self.text, other.text)
+        else:
+            self.text = join_overlapping(other.text, self.text)
+        self.first_chunk = min(self.first_chunk, other.first_chunk)
+        self.last_chunk = max(self.last_chunk, other.last_chunk)
+        pages = [page for page in (self.page_start, self.page_end, other.page_start, other.page_end) if page is not None]
+        if pages:
+            self.page_start, self.page_end = min(pages), max(pages)
+
+
+def join_overlapping(head: str, tail: str) -> str:
+    """Concatenate two consecutive chunks, writing text they share only once"""
+    # The splitter repeats up to CHUNK_OVERLAP characters, trimmed at whitespace
+    longest = min(len(head), len(tail), Config.CHUNK_OVERLAP + 1)
+    for size in range(longest, 0, -1):
+        if head.endswith(tail[:size]):
+            return head + tail[size:]
+    return f"{head}\n{tail}"
+
+
+def shingles(text: str) -> Set[Tuple[str, ...]]:
+    words = _WORD.findall(text.lower())
+    if len(words) < _SHINGLE_SIZE:
+        return {tuple(words)}
+    return {tuple(words[i:i + _SHINGLE_SIZE]) for i in range(len(words) - _SHINGLE_SIZE + 1)}
+
+
+def merge_adjacent(retrieved_docs: List[Dict]) -> List[Passage]:
+    """Fold chunks that are neighbours in the same source into one passage
+    
+    Passages keep the rank of their best chunk, so relevance order survives.
+    """
+    passages: List[Passage] = []
+    for doc in retrieved_docs:
+        passage = Passage(doc)
+        # A chunk can bridge two earlier passages; absorb every one it touches
+        touching = [existing for existing in passages if existing.adjacent(passage)]
+        if not touching:
+            passages.append(passage)
+            continue
+        target = touching[0]
+        target.merge(passage)
+        for other in touching[1:]:
+            target.merge(other)
+            passages.remove(other)
+    return passages
+
+
+def drop_near_duplicates(passages: List[Passage], threshold: float = None) -> List[Passage]:
+    """Drop passages whose text mostly repeats a higher-ranked passage"""
+    if threshold is None:
+        threshold = Config.CONTEXT_DEDUP_THRESHOLD
+    kept: List[Passage] = []
+    kept_shingles: List[Set[Tuple[str, ...]]] = []
+    for passage in passages:
+        current = shingles(passage.text)
+        duplicate = False
+        for previous in kept_shingles:
+            # Containment rather than Jaccard, so a chunk repeated inside a longer passage counts too
+            overlap = len(current & previous) / max(min(len(current), len(previous)), 1)
+            if overlap >= threshold:
+                duplicate = True
+                break
+        if not duplicate:
+            kept.append(passage)
+            kept_shingles.append(current)
+    return kept
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut text so it fits in max_tokens"""
+    if max_tokens <= 0:
+        return ""
+    while text:
+        tokens = count_tokens(text, Config.GENERATION_MODEL)
+        if tokens <= max_tokens:
+            break
+        text = text[:int(len(text) * max_tokens / tokens * 0.95)]
+    return text
+
+
+def assemble_context(retrieved_docs: List[Dict], budget: Optional[int] = None) -> Tuple[str, Dict]:
+    """Build the prompt context from ranked chunks
+    
+    Returns (context, stats). Neighbouring chunks are merged, near-duplicates
+    dropped, and passages packed in rank order while they fit in `budget`
+    tokens (None = no limit). Stats report the tokens used and the tokens
+    saved relative to concatenating every chunk verbatim.
+    """
+    if not retrieved_docs:
+        return "No relevant context found.", {
+            "context_tokens": 0, "tokens_saved": 0, "passages": 0, "duplicates_dropped": 0, "over_budget_dropped": 0
+        }
+    
+    model = Config.GENERATION_MODEL
+    verbatim = "\n".join(Passage(doc).format(i) for i, doc in enumerate(retrieved_docs, 1))
+    verbatim_tokens = count_tokens(verbatim, model)
+    
+    merged = merge_adjacent(retrieved_docs)
+    passages = drop_near_duplicates(merged)
+    
+    # Greedy packing: take passages in rank order, skipping any that no longer fit
+    context_parts = []
+    used = 0
+    for passage in passages:
+        part = passage.format(len(context_parts) + 1)
+        tokens = count_tokens(part, model) + 1  # joining newline
+        if budget is not None and used + tokens > budget:
+            if context_parts:
+                continue
+            # Never send an empty context: trim the best passage to the budget
+            label = passage.label(1)
+            passage.text = truncate_to_tokens(passage.text, budget - count_tokens(label, model) - 2)
+            part = passage.format(1)
+            tokens = count_tokens(part, model) + 1
+        context_parts.append(part)
+        used += tokens
+    
+    context = "\n".join(context_parts)
+    context_tokens = count_tokens(context, model)
+    stats = {
+        "context_tokens": context_tokens,
+        "tokens_saved": max(verbatim_tokens - context_tokens, 0),
+        "passages": len(context_parts),
+        "duplicates_dropped": len(merged) - len(passages),
+        "over_budget_dropped": len(passages) - len(context_parts)
+    }
+    return context, stats
@@ -0,0 +1,142 @@
+"""
+Session-scoped retrieval state for multi-turn chat: follow-up condensing and chunk reuse
+"""
+import json
+import re
+from collections import deque
+from typing import Deque, Dict, FrozenSet, Hashable, List, Optional, Set
+from bm25_index import BM25Index, tokenize
+from config_openai import Config
+from logging_setup import get_logger
+
+logger = get_logger(__name__, 'rag_engine_openai.log')
+
+# Openings and pronouns that make a question lean on the one before it ("and for Category 5?")
+_OPENER = re.compile(r"^\s*(?:and|also|but|what about|how about|what of|same for)\b", re.IGNORECASE)
+_ANAPHORA = frozenset("it its they them their these those this such same".split())
+_WORD = re.compile(r"[a-z]+")
+# Question words that say nothing about the topic, left out when checking what the cached chunks cover
+_FILLER = frozenset(
+    "apply applies applicable also too more most else explain describe describes described mean means "
+    "say says tell use used useful work works example examples".split()
+)
+
+SHORT_QUERY_TERMS = 2  # questions this terse continue the thread when the cached chunks hold their terms
+ANAPHORA_MAX_TERMS = 3  # a pronoun marks a follow-up only in a question with this few terms of its own
+
+
+class ConversationMemory:
+    """Chunks retrieved in the last few turns of one chat, for follow-up questions
+    
+    A follow-up is condensed into a standalone search query by appending
+    the question that opened its thread (and the previous one), so "and for
+    Category 5?" is searched in context. When one cached chunk
+    already holds the follow-up's own terms (IDF-weighted share of at least
+    `reuse_coverage`), the cached chunks are ranked again instead of calling
+    the embedding API and searching the index. The oldest turns are dropped
+    to stay within `max_turns` and `max_kb` of chunk text and metadata.
+    """
+    
+    def __init__(self, lexical_index: Optional[BM25Index] = None, max_turns: int = None, max_kb: float = None,
+                 reuse_coverage: float = None):
+        self.lexical_index = lexical_index
+        self.max_turns = Config.CONVERSATION_MAX_TURNS if max_turns is None else max_turns
+        self.max_bytes = int((Config.CONVERSATION_MEMORY_KB if max_kb is None else max_kb) * 1024)
+        self.reuse_coverage = Config.CONVERSATION_REUSE_COVERAGE if reuse_coverage is None else reuse_coverage
+        self.turns: Deque[Dict] = deque()
+        self.size_bytes = 0
+        self.reused = 0
+        self.searched = 0
+    
+    def _idf(self, term: str) -> float:
+        if self.lexical_index is None or not self.lexical_index.count():
+            return 1.0
+        return self.lexical_index.idf(term)
+    
+    def _coverage(self, terms: Set[str], scope: Hashable = None) -> float:
+        """Best IDF-weighted share of `terms` held by a single cached chunk (of turns in `scope`, if given)"""
+        if not terms:
+            return 1.0
+        weights = {term: self._idf(term) for term in terms}
+        total_weight = sum(weights.values()) or 1.0
+        best = 0.0
+        for turn in self.turns:
+            if scope is not None and turn["scope"] != scope:
+                continue
+            for chunk_terms in turn["terms"]:
+                best = max(best, sum(weight for term, weight in weights.items() if term in chunk_terms) / total_weight)
+        return best
+    
+    @staticmethod
+    def _terms(query: str) -> Set[str]:
+        return set(tokenize(query)) - _FILLER
+    
+    def is_follow_up(self, query: str) -> bool:
+        """Whether `query` continues the previous turn rather than opening a new topic"""
+        if not self.turns:
+            return False
+        if _OPENER.match(query):
+            return True
+        terms = self._terms(query)
+        # "how is this audited" inside a full question refers to its own subject, not the previous turn
+        if set(_WORD.findall(query.lower())) & _ANAPHORA and len(terms) <= ANAPHORA_MAX_TERMS:
+            return True
+        return 0 < len(terms) <= SHORT_QUERY_TERMS and self._coverage(terms) >= 1.0
+    
+    def condense(self, query: str) -> str:
+        """Standalone search query for `query`: a follow-up carries the questions it refers back to"""
+        if not self.is_follow_up(query):
+            return query
+        previous = self.turns[-1]
+        context = previous["topic"] if previous["topic"] == previous["query"] else \
+            f"{previous['topic']} / {previous['query']}"
+        return f"{query} (follow-up to: {context})"
+    
+    def reusable(self, query: str, scope: Hashable) -> Optional[List[Dict]]:
+        """Copies of the cached chunks a follow-up can be answered from, most recent turn first
+        
+        None when `query` needs a fresh search: it opens a new topic, no
+        turn was retrieved under the same `scope` (filter and index
+        version), or no cached chunk covers its terms.
+        """
+        if not self.is_follow_up(query) or self._coverage(self._terms(query), scope) < self.reuse_coverage:
+            self.searched += 1
+            return None
+        docs, seen = [], set()
+        for turn in reversed(self.turns):
+            if turn["scope"] != scope:
+                continue
+            for doc in turn["docs"]:
+                if doc['id'] not in seen:
+                    seen.add(doc['id'])
+                    docs.append(dict(doc))
+        if not docs:
+            self.searched += 1
+            return None
+        self.reused += 1
+        logger.info(f"Follow-up answered from {len(docs)} cached chunks without a new search")
+        return docs
+    
+    def record(self, query: str, docs: List[Dict], scope: Hashable):
+        """Remember the chunks searched for `query` (call after condense and reusable, before the next turn)"""
+        topic = self.turns[-1]["topic"] if self.is_follow_up(query) else query
+        docs = [{'id': doc['id'], 'text': doc['text'], 'metadata': doc['metadata']} for doc in docs]
+        sizes = [len(doc['text'].encode("utf-8")) + len(json.dumps(doc['metadata'])) for doc in docs]
+        # A single turn larger than the cap keeps its best chunks
+        while docs and sum(sizes) > self.max_bytes:
+            docs.pop()
+            sizes.pop()
+        terms: List[FrozenSet[str]] = [frozenset(tokenize(doc['text'])) for doc in docs]
+        self.turns.append({"query": query, "topic": topic, "scope": scope, "docs": docs, "terms": terms,
+                           "size": sum(sizes)})
+        self.size_bytes += sum(sizes)
+        while len(self.turns) > self.max_turns or self.size_bytes > self.max_bytes:
+            self.size_bytes -= self.turns.popleft()["size"]
+    
+    def clear(self):
+        self.turns.clear()
+        self.size_bytes = 0
+    
+    def stats(self) -> Dict[str, int]:
+        return {"turns": len(self.turns), "size_bytes": self.size_bytes,
+                "reused": self.reused, "searched": self.searched}
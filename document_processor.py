@@ -1,23 +1,48 @@
 """
 Document processing for PDF extraction and chunking
 """
-import logging
+import bisect
+import hashlib
+import os
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
 from pathlib import Path
-from typing import List, Dict
+from typing import Deque, Dict, Iterable, Iterator, List, Optional, Tuple
 import PyPDF2
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from config_openai import Config
+from logging_setup import get_logger
 
-# Setup logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(Config.LOGS_DIR / 'document_processor.log'),
-        logging.StreamHandler()
-    ]
-)
-logger = logging.getLogger(__name__)
+logger = get_logger(__name__, 'document_processor.log')
+
+
+# Bump when chunk boundaries or chunk metadata change, so existing indexes are rebuilt
+CHUNKER_VERSION = 2
+
+# Pages are buffered until this many chunks' worth of text is pending before splitting
+_FLUSH_CHUNKS = 8
+
+PageStream = Iterator[Tuple[int, str]]
+
+
+def _extract_page_range(pdf_path: str, start: int, end: int) -> Optional[List[str]]:
+    """Extract the text of pages [start, end) of a PDF; runs in a worker process"""
+    try:
+        with open(pdf_path, 'rb') as file:
+            pdf_reader = PyPDF2.PdfReader(file)
+            return [pdf_reader.pages[i].extract_text() for i in range(start, end)]
+    except Exception as e:
+        logger.error(f"Error extracting pages {start}-{end - 1} from {pdf_path}: {str(e)}")
+        return None
+
+
+def _count_pages(pdf_path: Path) -> int:
+    try:
+        with open(pdf_path, 'rb') as file:
+            return len(PyPDF2.PdfReader(file).pages)
+    except Exception as e:
+        logger.error(f"Error extracting text from {pdf_path}: {str(e)}")
+        return 0
 
 
 class DocumentProcessor:
@@ -31,60 +56,167 @@ class DocumentProcessor:
             separators=["\n\n", "\n", ". ", " ", ""]
         )
     
+    def fingerprint(self) -> str:
+        """Identify the chunking parameters; chunks built with another fingerprint are stale"""
+        params = f"{CHUNKER_VERSION}:{Config.CHUNK_SIZE}:{Config.CHUNK_OVERLAP}:{Config.EMBEDDING_MODEL}"
+        return hashlib.sha256(params.encode("utf-8")).hexdigest()[:16]
+    
+    def iter_pages(self, pdf_path: Path) -> PageStream:
+        """Yield (page_number, text) for each page of a PDF, numbering from 1"""
+        with open(pdf_path, 'rb') as file:
+            pdf_reader = PyPDF2.PdfReader(file)
+            num_pages = len(pdf_reader.pages)
+            
+            logger.info(f"Processing {pdf_path.name} ({num_pages} pages)")
+            
+            for page_num in range(num_pages):
+                yield page_num + 1, pdf_reader.pages[page_num].extract_text()
+    
     def extract_text_from_pdf(self, pdf_path: Path) -> str:
         """Extract text from a PDF file"""
         try:
-            text = ""
-            with open(pdf_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                num_pages = len(pdf_reader.pages)
-                
-                logger.info(f"Processing {pdf_path.name} ({num_pages} pages)")
-                
-                for page_num in range(num_pages):
-                    page = pdf_reader.pages[page_num]
-                    text += page.extract_text() + "\n"
-            
-            return text
+            return "".join(text + "\n" for _, text in self.iter_pages(pdf_path))
         except Exception as e:
             logger.error(f"Error extracting text from {pdf_path}: {str(e)}")
             return ""
     
-    def process_document(self, pdf_path: Path) -> List[Dict[str, str]]:
-        """Process a single document and return chunks with metadata"""
-        text = self.extract_text_from_pdf(pdf_path)
+    def iter_page_streams(self, pdf_paths: Iterable[Path], workers: int = None) -> Iterator[Tuple[Path, PageStream]]:
+        """Yield (path, pages) per PDF, extracting page ranges across processes
         
-        if not text:
-            return []
+        Files are yielded in input order and each page stream must be consumed
+        before the next file is requested. At most `workers` files are in flight
+        ahead of the consumer, so memory does not grow with the corpus. A page
+        stream raises if any part of its file could not be extracted.
+        """
+        if workers is None:
+            workers = Config.EXTRACTION_WORKERS or os.cpu_count() or 1
+        if workers <= 1:
+            for pdf_path in pdf_paths:
+                yield pdf_path, self.iter_pages(pdf_path)
+            return
+        
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            pending: Deque[Tuple[Path, List[Tuple[int, Future]]]] = deque()
+            
+            def submit(pdf_path: Path):
+                num_pages = _count_pages(pdf_path)
+                logger.info(f"Processing {pdf_path.name} ({num_pages} pages)")
+                futures = [
+                    (start, executor.submit(_extract_page_range, str(pdf_path), start,
+                                            min(start + Config.PAGES_PER_TASK, num_pages)))
+                    for start in range(0, num_pages, Config.PAGES_PER_TASK)
+                ]
+                if not futures:
+                    futures = [(0, None)]  # unreadable file
+                pending.append((pdf_path, futures))
+            
+            def collect(pdf_path: Path, futures: List[Tuple[int, Future]]) -> PageStream:
+                # Page ranges are read in submission order, so output is deterministic
+                for start, future in futures:
+                    pages = future.result() if future is not None else None
+                    if pages is None:
+                        raise RuntimeError(f"could not extract {pdf_path.name}")
+                    for offset, text in enumerate(pages):
+                        yield start + offset + 1, text
+            
+            for pdf_path in pdf_paths:
+                submit(pdf_path)
+                if len(pending) > workers:
+                    done_path, futures = pending.popleft()
+                    yield done_path, collect(done_path, futures)
+            while pending:
+                done_path, futures = pending.popleft()
+                yield done_path, collect(done_path, futures)
+    
+    def chunk_pages(self, pages: PageStream, pdf_path: Path) -> List[Dict[str, str]]:
+        """Split a page stream into chunks with source and page-range metadata
         
-        # Split text into chunks
-        chunks = self.text_splitter.split_text(text)
+        Text is split incrementally from a bounded buffer, so chunks cross page
+        boundaries without concatenating the whole document. The file's chunks
+        are returned together because `total_chunks` is only known at the end;
+        a file that fails mid-extraction yields no chunks.
+        """
+        chunks: List[Tuple[str, int, int]] = []
+        page_offsets: List[int] = []  # document offset where each page starts
+        page_numbers: List[int] = []
+        buffer = ""
+        buffer_offset = 0  # document offset of buffer[0]
+        flush_size = Config.CHUNK_SIZE * _FLUSH_CHUNKS
+        
+        def page_at(offset: int) -> int:
+            return page_numbers[max(bisect.bisect_right(page_offsets, offset) - 1, 0)]
+        
+        def split(final: bool):
+            nonlocal buffer, buffer_offset
+            pieces = self.text_splitter.split_text(buffer)
+            # Unless this is the end of the document, the last piece may continue on the
+            # next page: keep it (it already starts with the splitter's overlap) and re-split
+            emit = pieces if final else pieces[:-1]
+            search_from = 0
+            for piece in emit:
+                position = buffer.find(piece, search_from)
+                if position < 0:
+                    position = search_from
+                search_from = position + 1
+                start = buffer_offset + position
+                chunks.append((piece, page_at(start), page_at(start + len(piece) - 1)))
+            if not final and emit:
+                keep_from = buffer.find(pieces[-1], search_from)
+                if keep_from < 0:
+                    keep_from = max(search_from - 1 + len(emit[-1]) - Config.CHUNK_OVERLAP, search_from)
+                buffer = buffer[keep_from:]
+                buffer_offset += keep_from
+        
+        try:
+            for page_number, text in pages:
+                page_offsets.append(buffer_offset + len(buffer))
+                page_numbers.append(page_number)
+                buffer += text + "\n"
+                if len(buffer) >= flush_size:
+                    split(final=False)
+        except Exception as e:
+            logger.error(f"Error extracting text from {pdf_path}: {str(e)}")
+            return []
+        if buffer.strip():
+            split(final=True)
         
         # Create documents with metadata
         documents = []
-        for i, chunk in enumerate(chunks):
+        for i, (chunk, page_start, page_end) in enumerate(chunks):
             documents.append({
                 "text": chunk,
                 "metadata": {
                     "source": pdf_path.name,
                     "chunk_id": i,
-                    "total_chunks": len(chunks)
+                    "total_chunks": len(chunks),
+                    "page_start": page_start,
+                    "page_end": page_end
                 }
             })
         
         logger.info(f"Created {len(documents)} chunks from {pdf_path.name}")
         return documents
     
-    def process_all_documents(self, data_dir: Path) -> List[Dict[str, str]]:
+    def process_document(self, pdf_path: Path, workers: int = None) -> List[Dict[str, str]]:
+        """Process a single document and return chunks with metadata"""
+        return self.process_documents([pdf_path], workers)
+    
+    def iter_documents(self, pdf_paths: Iterable[Path], workers: int = None) -> Iterator[Dict[str, str]]:
+        """Yield chunks file by file without holding the whole corpus in memory"""
+        for pdf_path, pages in self.iter_page_streams(pdf_paths, workers):
+            yield from self.chunk_pages(pages, pdf_path)
+    
+    def process_documents(self, pdf_paths: List[Path], workers: int = None) -> List[Dict[str, str]]:
+        """Process several documents, returning chunks in file order"""
+        return list(self.iter_documents(pdf_paths, workers))
+    
+    def process_all_documents(self, data_dir: Path, workers: int = None) -> List[Dict[str, str]]:
         """Process all PDF documents in the data directory"""
-        all_documents = []
-        
-        pdf_files = list(data_dir.glob("*.pdf"))
+        # Sorted so chunk order (and ids) don't depend on filesystem listing order
+        pdf_files = sorted(data_dir.glob("*.pdf"))
         logger.info(f"Found {len(pdf_files)} PDF files to process")
         
-        for pdf_file in pdf_files:
-            documents = self.process_document(pdf_file)
-            all_documents.extend(documents)
+        all_documents = self.process_documents(pdf_files, workers)
         
         logger.info(f"Total chunks created: {len(all_documents)}")
         return all_documents
@@ -0,0 +1,151 @@
+"""
+Persistent, content-addressed cache of OpenAI embeddings
+"""
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from logging_setup import get_logger
+
+logger = get_logger(__name__, 'vector_store_openai.log')
+
+# SQLite's default limit on bound parameters is 999 on older builds
+_LOOKUP_CHUNK = 500
+
+
+def embedding_key(model: str, text: str) -> str:
+    """Cache key for a text embedded with a given model"""
+    return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """SQLite store of float32 embeddings keyed by hash(model + text)"""
+    
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, model TEXT NOT NULL, dim INTEGER NOT NULL, vector BLOB NOT NULL)"
+        )
+        self.conn.commit()
+        self.hits = 0
+        self.misses = 0
+    
+    def get_many(self, model: str, texts: List[str]) -> List[Optional[List[float]]]:
+        """Look up embeddings for texts, returning None for each miss"""
+        keys = [embedding_key(model, text) for text in texts]
+        found: Dict[str, List[float]] = {}
+        unique_keys = list(dict.fromkeys(keys))
+        with self.lock:
+            for i in range(0, len(unique_keys), _LOOKUP_CHUNK):
+                chunk = unique_keys[i:i + _LOOKUP_CHUNK]
+                rows = self.conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})",
+                    chunk
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+            
+            results = [found.get(key) for key in keys]
+            hits = sum(1 for vector in results if vector is not None)
+            self.hits += hits
+            self.misses += len(results) - hits
+        return results
+    
+    def get(self, model: str, text: str) -> Optional[List[float]]:
+        """Look up a single embedding"""
+        return self.get_many(model, [text])[0]
+    
+    def put_many(self, model: str, texts: List[str], embeddings: List[List[float]]):
+        """Store embeddings for texts (existing entries are kept)"""
+        rows = []
+        for text, embedding in zip(texts, embeddings):
+            vector = np.asarray(embedding, dtype=np.float32)
+            rows.append((embedding_key(model, text), model, int(vector.shape[0]), vector.tobytes()))
+        with self.lock:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (key, model, dim, vector) VALUES (?, ?, ?, ?)",
+                rows
+            )
+            self.conn.commit()
+    
+    def stats(self) -> Dict[str, float]:
+        """Hit/miss counters since this cache was opened"""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0
+        }
+    
+    def count(self) -> int:
+        """Number of stored embeddings"""
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+    
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+def clean_query(query: str) -> str:
+    """Query text as it is embedded: whitespace collapsed, case kept ("GAMP 5", "21 CFR Part 11")"""
+    return " ".join(query.split())
+
+
+def normalize_query(query: str) -> str:
+    """Cache key of a query so trivially different spellings share an embedding"""
+    return clean_query(query).lower()
+
+
+class QueryEmbeddingCache:
+    """In-process LRU cache of query embeddings with optional time-to-live"""
+    
+    def __init__(self, max_size: int, ttl: float = 0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries: "OrderedDict[Tuple[str, str], Tuple[float, List[float]]]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, model: str, query: str) -> Optional[List[float]]:
+        key = (model, query)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and self.ttl and time.monotonic() - entry[0] > self.ttl:
+                del self.entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+    
+    def put(self, model: str, query: str, embedding: List[float]):
+        if self.max_size <= 0:
+            return
+        with self.lock:
+            self.entries[(model, query)] = (time.monotonic(), embedding)
+            self.entries.move_to_end((model, query))
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+    
+    def stats(self) -> Dict[str, float]:
+        """Hit/miss counters and current size"""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "size": len(self.entries)
+        }
@@ -0,0 +1,738 @@
+"""
+Vector index backends behind VectorStore
+"""
+import json
+import math
+import shutil
+import threading
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+import numpy as np
+from config_openai import Config
+from ivf_index import IVFIndex
+from logging_setup import get_logger
+from search_filter import SearchFilter
+
+logger = get_logger(__name__, 'vector_store_openai.log')
+
+_NO_PAGE_START = np.iinfo(np.int32).max
+
+
+class IndexBackend:
+    """Storage and nearest-neighbour search over chunk embeddings
+    
+    Results are dicts with 'id', 'text', 'metadata' and 'distance'
+    (smaller is closer), best match first. A `search_filter` limits a query
+    to matching chunks.
+    """
+    
+    name = "base"
+    
+    def upsert(self, ids: List[str], embeddings: List[List[float]], texts: List[str], metadatas: List[Dict]):
+        raise NotImplementedError
+    
+    def query(self, embedding: List[float], top_k: int, search_filter: SearchFilter = None) -> List[Dict]:
+        raise NotImplementedError
+    
+    def query_batch(self, embeddings: List[List[float]], top_k: int,
+                    search_filter: SearchFilter = None) -> List[List[Dict]]:
+        """Results for several query embeddings, in input order"""
+        return [self.query(embedding, top_k, search_filter) for embedding in embeddings]
+    
+    def ids_matching(self, search_filter: SearchFilter) -> List[str]:
+        """Ids of every stored chunk the filter admits"""
+        raise NotImplementedError
+    
+    def sources(self) -> Dict[str, int]:
+        """Chunk count per source file"""
+        raise NotImplementedError
+    
+    def get(self, ids: List[str]) -> List[Dict]:
+        """Stored chunks for the given ids (distance None), skipping unknown ids"""
+        raise NotImplementedError
+    
+    def iter_documents(self, batch_size: int = 1000) -> Iterator[Tuple[List[str], List[str]]]:
+        """Yield (ids, texts) batches covering every stored chunk"""
+        raise NotImplementedError
+    
+    def delete(self, ids: List[str]):
+        raise NotImplementedError
+    
+    def delete_source(self, source: str) -> List[str]:
+        """Delete every chunk of a source file and return the deleted ids"""
+        raise NotImplementedError
+    
+    def count(self) -> int:
+        raise NotImplementedError
+    
+    def clear(self):
+        raise NotImplementedError
+
+
+class ChromaBackend(IndexBackend):
+    """ChromaDB persistent collection"""
+    
+    name = "chroma"
+    
+    def __init__(self, path: Path, collection_name: str = "gxp_documents_openai"):
+        import chromadb
+        from chromadb.config import Settings
+        
+        self.chroma_client = chromadb.PersistentClient(
+            path=str(path),
+            settings=Settings(anonymized_telemetry=False)
+        )
+        
+        # Get or create collection
+        self.collection_name = collection_name
+        try:
+            self.collection = self.chroma_client.get_collection(name=self.collection_name)
+            logger.info(f"Loaded existing collection: {self.collection_name}")
+        except Exception:
+            self.collection = self._create_collection()
+            logger.info(f"Created new collection: {self.collection_name}")
+    
+    def _create_collection(self):
+        return self.chroma_client.create_collection(
+            name=self.collection_name,
+            metadata={"description": "GxP Validation Guidelines (OpenAI)"}
+        )
+    
+    def upsert(self, ids, embeddings, texts, metadatas):
+        self.collection.upsert(ids=ids, embeddings=embeddings, documents=texts, metadatas=metadatas)
+    
+    def query(self, embedding, top_k, search_filter=None):
+        return self.query_batch([embedding], top_k, search_filter)[0]
+    
+    def query_batch(self, embeddings, top_k, search_filter=None):
+        results = self.collection.query(query_embeddings=embeddings, n_results=top_k,
+                                        where=self._where(search_filter))
+        
+        batch_results = []
+        for q in range(len(embeddings)):
+            formatted_results = []
+            if results['documents'] and results['documents'][q]:
+                for i in range(len(results['documents'][q])):
+                    formatted_results.append({
+                        'id': results['ids'][q][i],
+                        'text': results['documents'][q][i],
+                        'metadata': results['metadatas'][q][i],
+                        'distance': results['distances'][q][i] if results.get('distances') else None
+                    })
+            batch_results.append(formatted_results)
+        return batch_results
+    
+    @staticmethod
+    def _where(search_filter: Optional[SearchFilter]) -> Optional[Dict]:
+        """Chroma metadata filter; Chroma narrows the search with its metadata index"""
+        if not search_filter:
+            return None
+        conditions = []
+        if search_filter.sources:
+            conditions.append({"source": {"$in": sorted(search_filter.sources)}})
+        if search_filter.page_start is not None:
+            conditions.append({"page_end": {"$gte": search_filter.page_start}})
+        if search_filter.page_end is not None:
+            conditions.append({"page_start": {"$lte": search_filter.page_end}})
+        return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+    
+    def ids_matching(self, search_filter):
+        return self.collection.get(where=self._where(search_filter), include=[])['ids']
+    
+    def sources(self):
+        counts: Dict[str, int] = {}
+        offset = 0
+        while True:
+            results = self.collection.get(limit=1000, offset=offset, include=["metadatas"])
+            if not results['ids']:
+                return counts
+            for metadata in results['metadatas']:
+                source = metadata.get('source', 'Unknown')
+                counts[source] = counts.get(source, 0) + 1
+            offset += len(results['ids'])
+    
+    def get(self, ids):
+        if not ids:
+            return []
+        results = self.collection.get(ids=ids, include=["documents", "metadatas"])
+        found = {
+            doc_id: {'id': doc_id, 'text': text, 'metadata': metadata, 'distance': None}
+            for doc_id, text, metadata in zip(results['ids'], results['documents'], results['metadatas'])
+        }
+        return [found[doc_id] for doc_id in ids if doc_id in found]
+    
+    def iter_documents(self, batch_size=1000):
+        offset = 0
+        while True:
+            results = self.collection.get(limit=batch_size, offset=offset, include=["documents"])
+            if not results['ids']:
+                return
+            yield results['ids'], results['documents']
+            offset += len(results['ids'])
+    
+    def delete(self, ids):
+        self.collection.delete(ids=ids)
+    
+    def delete_source(self, source):
+        ids = self.collection.get(where={"source": source}, include=[])['ids']
+        if ids:
+            self.collection.delete(ids=ids)
+        return ids
+    
+    def count(self):
+        return self.collection.count()
+    
+    def clear(self):
+        self.chroma_client.delete_collection(name=self.collection_name)
+        self.collection = self._create_collection()
+
+
+class NumpyBackend(IndexBackend):
+    """Exact search over a memory-mapped, pre-normalised float32 matrix
+    
+    Layout in `path`:
+      vectors.f32    - row-major float32 unit vectors, append-only
+      records.jsonl  - one line per add (row, id, text, metadata) or delete (id)
+      meta.json      - vector dimension
+      compact.json   - present only while a compaction swaps files in
+    Deleted and replaced rows are masked until dead rows outnumber live ones,
+    then the files are compacted. A write cut short by a crash is trimmed on
+    load (unterminated record line, vectors without records) and a compaction
+    that was interrupted after compact.json was written is finished. Distances are squared L2 between unit vectors
+    (2 - 2cos), matching Chroma's default space. With an `ann` index, queries
+    score only the rows it proposes instead of the whole matrix.
+    
+    Rows are partitioned by source file in memory (with page ranges kept as
+    arrays), so a filtered query scores only the rows of its sources.
+    """
+    
+    name = "numpy"
+    
+    def __init__(self, path: Path, ann: IVFIndex = None):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.vectors_path = self.path / "vectors.f32"
+        self.records_path = self.path / "records.jsonl"
+        self.meta_path = self.path / "meta.json"
+        self.compact_path = self.path / "compact.json"
+        self.ann = ann
+        self.lock = threading.RLock()
+        self._load()
+    
+    def _load(self):
+        self.dim: Optional[int] = None
+        if self.meta_path.exists():
+            self.dim = json.loads(self.meta_path.read_text(encoding="utf-8"))["dim"]
+        self.ids: List[str] = []
+        self.texts: List[str] = []
+        self.metadatas: List[Dict] = []
+        self.id_to_row: Dict[str, int] = {}
+        
+        self._finish_compaction()
+        if self.records_path.exists():
+            complete_bytes = 0
+            with open(self.records_path, "rb") as records:
+                for line in records:
+                    if not line.endswith(b"\n"):
+                        # The last line was cut short by a crash; its vectors are trimmed with the rest below
+                        logger.warning(f"Dropping an incomplete record at the end of {self.records_path}")
+                        break
+                    complete_bytes += len(line)
+                    record = json.loads(line)
+                    if record["op"] == "add":
+                        self.id_to_row[record["id"]] = len(self.ids)
+                        self.ids.append(record["id"])
+                        self.texts.append(record["text"])
+                        self.metadatas.append(record["metadata"])
+                    else:
+                        self.id_to_row.pop(record["id"], None)
+            self._truncate(self.records_path, complete_bytes)
+        
+        self.alive = np.zeros(len(self.ids), dtype=bool)
+        self.alive[list(self.id_to_row.values())] = True
+        self.source_rows: Dict[str, np.ndarray] = {}
+        self.page_starts = np.zeros(0, dtype=np.int32)
+        self.page_ends = np.zeros(0, dtype=np.int32)
+        self._index_metadata(0)
+        self._map_vectors()
+        if self.ann is not None:
+            self.ann.load(len(self.ids), self._decode)
+        logger.info(f"Loaded NumPy index with {self.count()} vectors from {self.path}")
+    
+    def _index_metadata(self, first_row: int):
+        """Add rows from `first_row` on to the source partition and page arrays"""
+        new_rows: Dict[str, List[int]] = {}
+        for row in range(first_row, len(self.ids)):
+            new_rows.setdefault(self.metadatas[row].get("source"), []).append(row)
+        for source, rows in new_rows.items():
+            rows = np.asarray(rows, dtype=np.int64)
+            self.source_rows[source] = (np.concatenate([self.source_rows[source], rows])
+                                        if source in self.source_rows else rows)
+        # Chunks without pages get an empty range that overlaps nothing
+        metadatas = self.metadatas[first_row:]
+        page_starts = [metadata.get("page_start", _NO_PAGE_START) for metadata in metadatas]
+        page_ends = [metadata.get("page_end", -1) for metadata in metadatas]
+        self.page_starts = np.concatenate([self.page_starts, np.asarray(page_starts, dtype=np.int32)])
+        self.page_ends = np.concatenate([self.page_ends, np.asarray(page_ends, dtype=np.int32)])
+    
+    @staticmethod
+    def _truncate(path: Path, size: int):
+        # Drop bytes left behind by a write that crashed part way (vectors before their records, a partial line)
+        if path.exists() and path.stat().st_size > size:
+            with open(path, "r+b") as vectors:
+                vectors.truncate(size)
+    
+    def _map_vectors(self):
+        rows = len(self.ids)
+        if self.dim:
+            self._truncate(self.vectors_path, rows * self.dim * 4)
+        if rows and self.dim:
+            if not self.vectors_path.exists() or self.vectors_path.stat().st_size < rows * self.dim * 4:
+                raise ValueError(f"{self.path} has no float32 vectors for all {rows} rows (the full-precision "
+                                 f"vectors were dropped from a quantized index); rebuild the index")
+            self.vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dim))
+        else:
+            self.vectors = np.zeros((0, self.dim or 0), dtype=np.float32)
+    
+    @staticmethod
+    def _normalize(matrix: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+    
+    def upsert(self, ids, embeddings, texts, metadatas):
+        matrix = self._normalize(np.asarray(embeddings, dtype=np.float32))
+        with self.lock:
+            if self.dim is None:
+                self.dim = int(matrix.shape[1])
+                self.meta_path.write_text(json.dumps({"dim": self.dim}), encoding="utf-8")
+            elif matrix.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension {matrix.shape[1]} does not match index dimension {self.dim}")
+            
+            # Vectors are written before the records that reference them
+            self._append_vectors(matrix)
+            if self.ann is not None:
+                self.ann.add(matrix)
+            with open(self.records_path, "a", encoding="utf-8") as records:
+                for doc_id, text, metadata in zip(ids, texts, metadatas):
+                    records.write(json.dumps({"op": "add", "id": doc_id, "text": text, "metadata": metadata}) + "\n")
+            
+            replaced = [self.id_to_row[doc_id] for doc_id in ids if doc_id in self.id_to_row]
+            first_row = len(self.ids)
+            for offset, (doc_id, text, metadata) in enumerate(zip(ids, texts, metadatas)):
+                self.id_to_row[doc_id] = first_row + offset
+            self.ids.extend(ids)
+            self.texts.extend(texts)
+            self.metadatas.extend(metadatas)
+            self.alive = np.concatenate([self.alive, np.ones(len(ids), dtype=bool)])
+            self.alive[replaced] = False
+            self._index_metadata(first_row)
+            self._map_vectors()
+            self._maybe_compact()
+            if self.ann is not None:
+                self.ann.maybe_train(self.alive, self._decode)
+    
+    def _append_vectors(self, matrix: np.ndarray):
+        with open(self.vectors_path, "ab") as vectors:
+            vectors.write(np.ascontiguousarray(matrix).tobytes())
+    
+    def _decode(self, rows) -> np.ndarray:
+        """float32 unit vectors of a slice or array of rows"""
+        return np.asarray(self.vectors[rows])
+    
+    def _scores(self, queries: np.ndarray, rows: np.ndarray = None) -> np.ndarray:
+        """(rows x queries) cosine similarities over every row, or only `rows`"""
+        # One product serves every query in the batch
+        return (self.vectors if rows is None else self.vectors[rows]) @ queries.T
+    
+    def _select(self, column: np.ndarray, query: np.ndarray, k: int,
+                rows: np.ndarray = None) -> Tuple[np.ndarray, np.ndarray]:
+        """The `k` best rows for one query and their similarities, best first
+        
+        `column` scores every row, or the rows listed in `rows` when given.
+        """
+        best = np.argpartition(-column, k - 1)[:k]
+        best = best[np.argsort(-column[best])]
+        return (best if rows is None else rows[best]), column[best]
+    
+    def _results(self, rows: np.ndarray, similarities: np.ndarray) -> List[Dict]:
+        return [{
+            'id': self.ids[row],
+            'text': self.texts[row],
+            'metadata': self.metadatas[row],
+            'distance': float(2.0 - 2.0 * similarity)
+        } for row, similarity in zip(rows, similarities)]
+    
+    def query(self, embedding, top_k, search_filter=None):
+        return self.query_batch([embedding], top_k, search_filter)[0]
+    
+    def query_batch(self, embeddings, top_k, search_filter=None):
+        queries = self._normalize(np.asarray(embeddings, dtype=np.float32).reshape(len(embeddings), -1))
+        with self.lock:
+            if search_filter:
+                return self._filtered_query(queries, top_k, self._filter_rows(search_filter))
+            alive = self.alive
+            num_alive = int(alive.sum())
+            if num_alive == 0 or top_k <= 0:
+                return [[] for _ in embeddings]
+            if self.ann is not None and self.ann.trained:
+                return [self._ann_query(query, top_k) for query in queries]
+            
+            scores = self._scores(queries)
+            if num_alive < len(scores):
+                scores[~alive] = -np.inf
+            k = min(top_k, num_alive)
+            return [self._results(*self._select(scores[:, q], queries[q], k)) for q in range(len(embeddings))]
+    
+    def _filter_rows(self, search_filter: SearchFilter) -> np.ndarray:
+        """Sorted live rows the filter admits, gathered from the source partition"""
+        if search_filter.sources:
+            parts = [self.source_rows[source] for source in search_filter.sources if source in self.source_rows]
+            rows = np.sort(np.concatenate(parts)) if parts else np.zeros(0, dtype=np.int64)
+        else:
+            rows = np.arange(len(self.ids))
+        rows = rows[self.alive[rows]]
+        if search_filter.page_start is not None:
+            rows = rows[self.page_ends[rows] >= search_filter.page_start]
+        if search_filter.page_end is not None:
+            rows = rows[self.page_starts[rows] <= search_filter.page_end]
+        return rows
+    
+    def _filtered_query(self, queries: np.ndarray, top_k: int, rows: np.ndarray) -> List[List[Dict]]:
+        """Search only `rows`: every one of them, or the ANN candidates among them"""
+        if not len(rows) or top_k <= 0:
+            return [[] for _ in queries]
+        if self.ann is not None and self.ann.trained:
+            # Probe more lists for a narrow filter, so as many candidates pass it as in an unfiltered query;
+            # when that means probing every list, scanning the rows directly is cheaper
+            nprobe = math.ceil(self.ann.nprobe * self.count() / len(rows))
+            if nprobe < self.ann.nlist:
+                allowed = np.zeros(len(self.ids), dtype=bool)
+                allowed[rows] = True
+                return [self._ann_query(query, top_k, allowed, nprobe) for query in queries]
+        
+        scores = self._scores(queries, rows)
+        k = min(top_k, len(rows))
+        return [self._results(*self._select(scores[:, q], queries[q], k, rows)) for q in range(len(queries))]
+    
+    def _ann_query(self, query: np.ndarray, top_k: int, allowed: np.ndarray = None,
+                   nprobe: int = None) -> List[Dict]:
+        """Score only the live (or `allowed`) rows in the ANN index's closest lists"""
+        rows = self.ann.candidates(query, nprobe)
+        rows = rows[(self.alive if allowed is None else allowed)[rows]]
+        if not len(rows):
+            return []
+        column = self._scores(query[None, :], rows)[:, 0]
+        return self._results(*self._select(column, query, min(top_k, len(rows)), rows))
+    
+    def delete(self, ids):
+        with self.lock:
+            removed = [doc_id for doc_id in ids if doc_id in self.id_to_row]
+            if not removed:
+                return
+            with open(self.records_path, "a", encoding="utf-8") as records:
+                for doc_id in removed:
+                    records.write(json.dumps({"op": "delete", "id": doc_id}) + "\n")
+                    self.alive[self.id_to_row.pop(doc_id)] = False
+            self._maybe_compact()
+    
+    def get(self, ids):
+        with self.lock:
+            return [{
+                'id': doc_id,
+                'text': self.texts[self.id_to_row[doc_id]],
+                'metadata': self.metadatas[self.id_to_row[doc_id]],
+                'distance': None
+            } for doc_id in ids if doc_id in self.id_to_row]
+    
+    def iter_documents(self, batch_size=1000):
+        with self.lock:
+            items = [(doc_id, self.texts[row]) for doc_id, row in self.id_to_row.items()]
+        for i in range(0, len(items), batch_size):
+            batch = items[i:i + batch_size]
+            yield [doc_id for doc_id, _ in batch], [text for _, text in batch]
+    
+    def ids_matching(self, search_filter):
+        with self.lock:
+            return [self.ids[row] for row in self._filter_rows(search_filter)]
+    
+    def delete_source(self, source):
+        with self.lock:
+            rows = self.source_rows.get(source, np.zeros(0, dtype=np.int64))
+            ids = [self.ids[row] for row in rows[self.alive[rows]]]
+        self.delete(ids)
+        return ids
+    
+    def sources(self):
+        with self.lock:
+            counts = {source: int(self.alive[rows].sum()) for source, rows in self.source_rows.items()}
+        return {source: count for source, count in counts.items() if count}
+    
+    def count(self):
+        return len(self.id_to_row)
+    
+    def memory_stats(self) -> Dict[str, int]:
+        """Bytes scanned per query, full-precision bytes kept for reranking, and vector bytes on disk"""
+        with self.lock:
+            return {
+                "rows": len(self.ids),
+                "scan_bytes": int(self.vectors.nbytes),
+                "full_precision_bytes": 0,
+                "disk_bytes": self._disk_bytes([self.vectors_path])
+            }
+    
+    @staticmethod
+    def _disk_bytes(paths: List[Path]) -> int:
+        return sum(path.stat().st_size for path in paths if path.exists())
+    
+    def clear(self):
+        with self.lock:
+            shutil.rmtree(self.path, ignore_errors=True)
+            self.path.mkdir(parents=True, exist_ok=True)
+            self._load()
+    
+    def _maybe_compact(self):
+        dead = len(self.ids) - self.count()
+        if dead and dead >= self.count():
+            self.compact()
+    
+    def compact(self):
+        """Rewrite the files with live rows only
+        
+        The rewritten files are swapped in only after compact.json lists
+        them, so a crash part way through is finished on the next load
+        instead of leaving records that do not match the vectors.
+        """
+        with self.lock:
+            rows = sorted(self.id_to_row.values())
+            replacements = self._compact_vectors(rows)
+            tmp_records = self.records_path.with_suffix(".tmp")
+            with open(tmp_records, "w", encoding="utf-8") as records:
+                for row in rows:
+                    records.write(json.dumps({"op": "add", "id": self.ids[row], "text": self.texts[row],
+                                              "metadata": self.metadatas[row]}) + "\n")
+            replacements.append((tmp_records, self.records_path))
+            # Drop the memory maps before replacing the files they point at
+            self._unmap_vectors()
+            if self.ann is not None:
+                self.ann.invalidate()  # rows are renumbered; reassigned on load
+            tmp_marker = self.compact_path.with_suffix(".tmp")
+            tmp_marker.write_text(json.dumps([[tmp_path.name, path.name] for tmp_path, path in replacements]),
+                                  encoding="utf-8")
+            tmp_marker.replace(self.compact_path)
+            self._load()  # swaps the files in
+    
+    def _finish_compaction(self):
+        """Swap in the files of a compaction whose compact.json was written (a no-op otherwise)"""
+        if not self.compact_path.exists():
+            return
+        for tmp_name, name in json.loads(self.compact_path.read_text(encoding="utf-8")):
+            # Files swapped in before a crash no longer have a temporary copy
+            if (self.path / tmp_name).exists():
+                (self.path / tmp_name).replace(self.path / name)
+        self.compact_path.unlink()
+    
+    @staticmethod
+    def _write_rows(path: Path, matrix: np.ndarray, rows: List[int]) -> Tuple[Path, Path]:
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "wb") as out:
+            if rows:
+                out.write(np.ascontiguousarray(matrix[rows]).tobytes())
+        return tmp_path, path
+    
+    def _compact_vectors(self, rows: List[int]) -> List[Tuple[Path, Path]]:
+        """Write the vectors of `rows` to temporary files; returns (temporary, final) path pairs"""
+        return [self._write_rows(self.vectors_path, self.vectors, rows)]
+    
+    def _unmap_vectors(self):
+        self.vectors = None
+
+
+# Storage type of each quantized code
+CODE_DTYPES = {"float16": np.float16, "int8": np.int8}
+SCAN_BLOCK_ROWS = 256  # rows widened to float32 at a time; small enough to stay in cache while scored
+
+
+class QuantizedNumpyBackend(NumpyBackend):
+    """NumpyBackend that scans float16 or int8 codes instead of float32 vectors
+    
+    int8 codes carry one float32 scale per vector (max |x| / 127). Every row
+    is scored on its codes, then the best `rerank_factor * top_k` candidates
+    are re-scored against the float32 vectors, which stay on disk and are
+    paged in only for those rows. With `rerank` off results use approximate
+    distances; an existing float32 file is still kept up to date, so rerank
+    (or the plain NumpyBackend) can be switched back on. `drop_full_precision`
+    deletes it for the smallest footprint, after which rows added later have
+    no float32 vectors and reranking needs a rebuild.
+    
+    Extra files in `path`:
+      codes.float16 / codes.int8  - row-major codes, append-only
+      scales.f32                  - per-row scales (int8 only)
+    Codes missing for existing rows (e.g. when switching an index from
+    float32) are built from vectors.f32 on load. vectors.f32 may cover only
+    the first rows; it is never removed on load.
+    """
+    
+    def __init__(self, path: Path, quantization: str = "int8", rerank: bool = True, rerank_factor: int = 4,
+                 ann: IVFIndex = None):
+        if quantization not in CODE_DTYPES:
+            raise ValueError(f"Unknown INDEX_QUANTIZATION: {quantization}")
+        self.quantization = quantization
+        self.code_dtype = np.dtype(CODE_DTYPES[quantization])
+        self.rerank = rerank
+        self.rerank_factor = max(1, rerank_factor)
+        self.codes_path = Path(path) / f"codes.{quantization}"
+        self.scales_path = Path(path) / "scales.f32"
+        super().__init__(path, ann)
+    
+    def _encode(self, matrix: np.ndarray) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        if self.quantization == "float16":
+            return matrix.astype(np.float16), None
+        scales = np.abs(matrix).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        codes = np.rint(matrix / scales[:, None]).astype(np.int8)
+        return codes, scales.astype(np.float32)
+    
+    def _append_vectors(self, matrix):
+        codes, scales = self._encode(matrix)
+        if self.keep_full_precision:
+            super()._append_vectors(matrix)
+        with open(self.codes_path, "ab") as out:
+            out.write(np.ascontiguousarray(codes).tobytes())
+        if scales is not None:
+            with open(self.scales_path, "ab") as out:
+                out.write(scales.tobytes())
+    
+    def _file_rows(self, path: Path, itemsize: int) -> int:
+        return path.stat().st_size // (self.dim * itemsize) if path.exists() and self.dim else 0
+    
+    def _encode_missing(self, rows: int):
+        """Append codes for rows that only have float32 vectors"""
+        first = self._file_rows(self.codes_path, self.code_dtype.itemsize)
+        if self._file_rows(self.vectors_path, 4) < rows:
+            raise ValueError(f"{self.path} has no vectors to build {self.quantization} codes from; rebuild the index")
+        logger.info(f"Building {self.quantization} codes for {rows - first} vectors")
+        full = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dim))
+        for start in range(first, rows, SCAN_BLOCK_ROWS):
+            codes, scales = self._encode(np.asarray(full[start:min(start + SCAN_BLOCK_ROWS, rows)]))
+            with open(self.codes_path, "ab") as out:
+                out.write(codes.tobytes())
+            if scales is not None:
+                with open(self.scales_path, "ab") as out:
+                    out.write(scales.tobytes())
+        del full
+    
+    def _map_vectors(self):
+        rows = len(self.ids)
+        if self.dim:
+            self._truncate(self.vectors_path, rows * self.dim * 4)
+            self._truncate(self.codes_path, rows * self.dim * self.code_dtype.itemsize)
+            self._truncate(self.scales_path, rows * 4)
+            if self._file_rows(self.codes_path, self.code_dtype.itemsize) < rows:
+                self._encode_missing(rows)
+        
+        # Appending to a float32 file that lacks earlier rows would misalign it, so only a complete one is kept
+        complete = self._file_rows(self.vectors_path, 4) >= rows
+        self.keep_full_precision = complete and (self.rerank or self.vectors_path.exists())
+        if self.rerank and complete:
+            super()._map_vectors()
+        else:
+            if self.rerank:
+                logger.warning(f"{self.path} has no full-precision vectors; rebuild the index to rerank")
+            self.vectors = None
+        
+        if rows and self.dim:
+            self.codes = np.memmap(self.codes_path, dtype=self.code_dtype, mode="r", shape=(rows, self.dim))
+            self.scales = (np.memmap(self.scales_path, dtype=np.float32, mode="r", shape=(rows,))
+                           if self.quantization == "int8" else None)
+        else:
+            self.codes = np.zeros((0, self.dim or 0), dtype=self.code_dtype)
+            self.scales = np.zeros(0, dtype=np.float32) if self.quantization == "int8" else None
+    
+    def _decode(self, rows):
+        if self.vectors is not None:
+            return super()._decode(rows)
+        vectors = np.asarray(self.codes[rows], dtype=np.float32)
+        return vectors * np.asarray(self.scales[rows])[:, None] if self.scales is not None else vectors
+    
+    def _scores(self, queries, rows=None):
+        num_rows = len(self.codes) if rows is None else len(rows)
+        scores = np.empty((num_rows, len(queries)), dtype=np.float32)
+        for start in range(0, num_rows, SCAN_BLOCK_ROWS):
+            block = slice(start, start + SCAN_BLOCK_ROWS) if rows is None else rows[start:start + SCAN_BLOCK_ROWS]
+            scores[start:start + SCAN_BLOCK_ROWS] = np.asarray(self.codes[block], dtype=np.float32) @ queries.T
+        if self.scales is not None:
+            scores *= np.asarray(self.scales if rows is None else self.scales[rows])[:, None]
+        return scores
+    
+    def _select(self, column, query, k, rows=None):
+        if self.vectors is None:
+            return super()._select(column, query, k, rows)
+        num_candidates = min(k * self.rerank_factor, int(np.isfinite(column).sum()))
+        candidates = np.argpartition(-column, num_candidates - 1)[:num_candidates]
+        if rows is not None:
+            candidates = rows[candidates]
+        candidates = np.sort(candidates)
+        exact = np.asarray(self.vectors[candidates]) @ query
+        best = np.argsort(-exact)[:k]
+        return candidates[best], exact[best]
+    
+    def memory_stats(self):
+        with self.lock:
+            scales_bytes = int(self.scales.nbytes) if self.scales is not None else 0
+            return {
+                "rows": len(self.ids),
+                "scan_bytes": int(self.codes.nbytes) + scales_bytes,
+                "full_precision_bytes": int(self.vectors.nbytes) if self.vectors is not None else 0,
+                "disk_bytes": self._disk_bytes([self.vectors_path, self.codes_path, self.scales_path])
+            }
+    
+    def _compact_vectors(self, rows):
+        replacements = [self._write_rows(self.codes_path, self.codes, rows)]
+        if self.scales is not None:
+            replacements.append(self._write_rows(self.scales_path, self.scales, rows))
+        full_rows = self._file_rows(self.vectors_path, 4)
+        if full_rows:
+            # Rows are sorted, so the ones the float32 file covers stay a prefix of the compacted index
+            covered = [row for row in rows if row < full_rows]
+            full = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(full_rows, self.dim))
+            replacements.append(self._write_rows(self.vectors_path, full, covered))
+            del full
+        return replacements
+    
+    def drop_full_precision(self):
+        """Delete the float32 vectors to keep only the codes; the index cannot rerank until rebuilt"""
+        with self.lock:
+            if self.rerank:
+                raise ValueError("Set QUANTIZATION_RERANK=false before dropping the full-precision vectors")
+            freed = self._disk_bytes([self.vectors_path])
+            self._unmap_vectors()
+            self.vectors_path.unlink(missing_ok=True)
+            self._map_vectors()
+            logger.info(f"Removed {freed} bytes of full-precision vectors from {self.path}")
+    
+    def _unmap_vectors(self):
+        super()._unmap_vectors()
+        self.codes = None
+        self.scales = None
+
+
+def create_backend(name: str = None) -> IndexBackend:
+    """Instantiate the configured index backend"""
+    name = (name or Config.INDEX_BACKEND).lower()
+    if name == "chroma":
+        if Config.INDEX_QUANTIZATION != "none" or Config.INDEX_ANN != "none":
+            logger.warning("INDEX_QUANTIZATION and INDEX_ANN apply to the numpy backend only")
+        return ChromaBackend(Config.VECTOR_DB_DIR)
+    if name == "numpy":
+        path = Config.VECTOR_DB_DIR / "numpy_index"
+        ann = None
+        if Config.INDEX_ANN == "ivf":
+            ann = IVFIndex(path, Config.IVF_NLIST, Config.IVF_NPROBE, Config.IVF_MIN_TRAIN_ROWS)
+        elif Config.INDEX_ANN != "none":
+            raise ValueError(f"Unknown INDEX_ANN: {Config.INDEX_ANN}")
+        if Config.INDEX_QUANTIZATION != "none":
+            return QuantizedNumpyBackend(path, Config.INDEX_QUANTIZATION, Config.QUANTIZATION_RERANK,
+                                         Config.QUANTIZATION_RERANK_FACTOR, ann)
+        return NumpyBackend(path, ann)
+    raise ValueError(f"Unknown INDEX_BACKEND: {name}")
@@ -0,0 +1,81 @@
+"""
+Manifest of indexed PDFs for incremental re-indexing
+"""
+import hashlib
+import json
+from pathlib import Path
+from typing import Dict, List
+from logging_setup import get_logger
+
+logger = get_logger(__name__, 'vector_store_openai.log')
+
+
+def file_sha256(path: Path) -> str:
+    """Content hash of a file, read in 1 MB blocks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class IndexManifest:
+    """Tracks size, mtime, content hash, chunking fingerprint and chunk ids per indexed file"""
+    
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.files: Dict[str, Dict] = {}
+        if self.path.exists():
+            try:
+                self.files = json.loads(self.path.read_text(encoding="utf-8")).get("files", {})
+            except (OSError, ValueError) as e:
+                logger.warning(f"Ignoring unreadable manifest {self.path}: {str(e)}")
+    
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps({"files": self.files}, indent=2), encoding="utf-8")
+        tmp_path.replace(self.path)
+    
+    def diff(self, pdf_files: List[Path], fingerprint: str) -> Dict[str, List]:
+        """Classify files as added, changed, unchanged or removed relative to the manifest"""
+        result = {"added": [], "changed": [], "unchanged": [], "removed": []}
+        current = {pdf_file.name: pdf_file for pdf_file in pdf_files}
+        
+        for name, pdf_file in current.items():
+            entry = self.files.get(name)
+            if entry is None:
+                result["added"].append(pdf_file)
+                continue
+            if entry.get("fingerprint") != fingerprint:
+                result["changed"].append(pdf_file)
+                continue
+            stat = pdf_file.stat()
+            if stat.st_size == entry.get("size") and stat.st_mtime_ns == entry.get("mtime_ns"):
+                result["unchanged"].append(pdf_file)
+                continue
+            # Size or mtime moved: only the content hash decides (e.g. a fresh checkout)
+            if file_sha256(pdf_file) == entry.get("sha256"):
+                entry["size"] = stat.st_size
+                entry["mtime_ns"] = stat.st_mtime_ns
+                result["unchanged"].append(pdf_file)
+            else:
+                result["changed"].append(pdf_file)
+        
+        result["removed"] = [name for name in self.files if name not in current]
+        return result
+    
+    def record(self, pdf_file: Path, fingerprint: str, chunk_ids: List[str]):
+        """Record the indexed state of a file"""
+        stat = pdf_file.stat()
+        self.files[pdf_file.name] = {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "sha256": file_sha256(pdf_file),
+            "fingerprint": fingerprint,
+            "chunk_ids": chunk_ids
+        }
+    
+    def remove(self, name: str) -> List[str]:
+        """Forget a file and return the chunk ids it owned"""
+        return self.files.pop(name, {}).get("chunk_ids", [])
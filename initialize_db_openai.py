@@ -1,18 +1,46 @@
 """
 Initialize vector database with GxP documents
 """
-import logging
+import argparse
+import time
 from pathlib import Path
+from typing import List
 from config_openai import Config
 from document_processor import DocumentProcessor
+from index_backends import QuantizedNumpyBackend
+from index_manifest import IndexManifest
+from latency_metrics import recorder
+from logging_setup import get_logger
 from vector_store_openai import VectorStore
 
-# Setup logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
-logger = logging.getLogger(__name__)
+logger = get_logger(__name__)
+
+
+def index_files(doc_processor: DocumentProcessor, vector_store: VectorStore, manifest: IndexManifest,
+                pdf_files: List[Path], fingerprint: str) -> int:
+    """Stream PDFs into the vector store, checkpointing each fully indexed file in the manifest
+    
+    If the run is interrupted, `--sync` resumes with the files that were not checkpointed.
+    """
+    paths_by_name = {pdf_file.name: pdf_file for pdf_file in pdf_files}
+    
+    def checkpoint(source: str, chunk_ids: List[str]):
+        manifest.record(paths_by_name[source], fingerprint, chunk_ids)
+        manifest.save()
+        logger.info(f"Indexed {source} ({len(chunk_ids)} chunks)")
+    
+    added = vector_store.add_documents_stream(
+        doc_processor.iter_documents(pdf_files),
+        on_source_complete=checkpoint
+    )
+    
+    summary = recorder.summary()
+    for stage in ("ingest_batch", "embedding_batch", "index_upsert"):
+        if stage in summary:
+            stats = summary[stage]
+            logger.info(f"{stage}: {stats['count']} spans, p50 {stats['p50_ms']:.0f} ms, "
+                        f"p95 {stats['p95_ms']:.0f} ms, p99 {stats['p99_ms']:.0f} ms")
+    return added
 
 
 def initialize_database():
@@ -41,19 +69,23 @@ def initialize_database():
                 logger.info("Keeping existing documents")
                 return
         
-        # Process documents
+        # Start a fresh manifest; each file is checkpointed as soon as it is stored
+        manifest = IndexManifest(Config.VECTOR_DB_DIR / Config.MANIFEST_FILE)
+        manifest.files = {}
+        manifest.save()
+        
+        # Process documents and add them to the vector store in bounded batches
         logger.info(f"Processing documents from {Config.DATA_DIR}...")
-        documents = doc_processor.process_all_documents(Config.DATA_DIR)
+        logger.info("Adding documents to vector store (this will take several minutes)...")
+        logger.info("Using OpenAI embeddings - this is more reliable than Gemini free tier")
+        logger.info("If interrupted, resume with: python initialize_db_openai.py --sync")
+        pdf_files = sorted(Config.DATA_DIR.glob("*.pdf"))
+        added = index_files(doc_processor, vector_store, manifest, pdf_files, doc_processor.fingerprint())
         
-        if not documents:
+        if not added:
             logger.error("No documents were processed!")
             return
         
-        # Add to vector store
-        logger.info("Adding documents to vector store (this will take several minutes)...")
-        logger.info("Using OpenAI embeddings - this is more reliable than Gemini free tier")
-        vector_store.add_documents(documents)
-        
         # Verify
         final_count = vector_store.get_collection_count()
         logger.info(f"✓ Database initialized successfully with {final_count} document chunks")
@@ -64,5 +96,67 @@ def initialize_database():
         raise
 
 
+def sync_database():
+    """Re-index only PDFs that were added, changed or removed since the last run"""
+    try:
+        logger.info("Validating configuration...")
+        Config.validate()
+        
+        start = time.perf_counter()
+        doc_processor = DocumentProcessor()
+        vector_store = VectorStore()
+        manifest = IndexManifest(Config.VECTOR_DB_DIR / Config.MANIFEST_FILE)
+        fingerprint = doc_processor.fingerprint()
+        
+        pdf_files = sorted(Config.DATA_DIR.glob("*.pdf"))
+        diff = manifest.diff(pdf_files, fingerprint)
+        logger.info(
+            f"Sync plan: {len(diff['added'])} added, {len(diff['changed'])} changed, "
+            f"{len(diff['removed'])} removed, {len(diff['unchanged'])} unchanged"
+        )
+        
+        # Drop chunks of removed files
+        for name in diff['removed']:
+            vector_store.delete_documents(manifest.remove(name), persist=False)
+        
+        # Re-extract, re-chunk and re-embed new and modified files
+        to_index = diff['added'] + diff['changed']
+        for pdf_file in to_index:
+            # Old chunks go first: a shorter new version must not leave stale tail chunks behind
+            vector_store.delete_documents(manifest.remove(pdf_file.name), persist=False)
+            vector_store.delete_source(pdf_file.name, persist=False)
+        
+        manifest.save()
+        # Saves the BM25 index, deletions included, once the new files are in
+        index_files(doc_processor, vector_store, manifest, to_index, fingerprint)
+        
+        final_count = vector_store.get_collection_count()
+        logger.info(f"✓ Sync finished in {time.perf_counter() - start:.1f}s; collection has {final_count} document chunks")
+        
+    except Exception as e:
+        logger.error(f"Error syncing database: {str(e)}")
+        raise
+
+
+def drop_full_precision():
+    """Delete the float32 vectors of a quantized index that no longer reranks"""
+    vector_store = VectorStore()
+    if not isinstance(vector_store.index, QuantizedNumpyBackend):
+        raise ValueError("--drop-full-precision needs INDEX_BACKEND=numpy with INDEX_QUANTIZATION set")
+    vector_store.index.drop_full_precision()
+
+
 if __name__ == "__main__":
-    initialize_database()
+    parser = argparse.ArgumentParser(description="Initialize the GxP vector database")
+    parser.add_argument("--sync", action="store_true",
+                        help="Only re-index PDFs that were added, changed or removed since the last run")
+    parser.add_argument("--drop-full-precision", action="store_true",
+                        help="Delete the float32 vectors of a quantized index run with QUANTIZATION_RERANK=false")
+    args = parser.parse_args()
+    
+    if args.drop_full_precision:
+        drop_full_precision()
+    elif args.sync:
+        sync_database()
+    else:
+        initialize_database()
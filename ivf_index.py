@@ -0,0 +1,196 @@
+"""
+Inverted-file (IVF) approximate nearest-neighbour index for the NumPy backend
+"""
+import json
+import math
+from pathlib import Path
+from typing import Callable, Optional, Union
+import numpy as np
+from logging_setup import get_logger
+
+logger = get_logger(__name__, 'vector_store_openai.log')
+
+# Reads float32 unit vectors for a slice or an array of backend rows
+Decoder = Callable[[Union[slice, np.ndarray]], np.ndarray]
+
+KMEANS_ITERATIONS = 10
+TRAIN_SAMPLE_PER_LIST = 32  # training vectors per list; fewer leaves centroids noisy
+TRAIN_SAMPLE_MAX = 65536  # bounds training memory (~400 MB at 1536 dims)
+ASSIGN_BLOCK_ROWS = 8192
+RETRAIN_GROWTH = 4.0  # retrain once the index holds this many times the vectors it was trained on
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def nearest_centroids(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Index of the most similar centroid for each vector"""
+    return np.argmax(vectors @ centroids.T, axis=1).astype(np.int32)
+
+
+def spherical_kmeans(vectors: np.ndarray, nlist: int, iterations: int = KMEANS_ITERATIONS,
+                     seed: int = 0) -> np.ndarray:
+    """Unit-length centroids that maximise cosine similarity to their members"""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assign = nearest_centroids(vectors, centroids)
+        order = np.argsort(assign, kind="stable")
+        counts = np.bincount(assign, minlength=nlist)
+        used = np.flatnonzero(counts)
+        sums = np.zeros_like(centroids)
+        sums[used] = np.add.reduceat(vectors[order], np.concatenate([[0], np.cumsum(counts)[:-1]])[used])
+        # Lists that attracted nothing restart from random vectors
+        empty = np.flatnonzero(counts == 0)
+        sums[empty] = vectors[rng.choice(len(vectors), len(empty), replace=False)]
+        centroids = _normalize(sums)
+    return centroids.astype(np.float32)
+
+
+class IVFIndex:
+    """k-means centroids over a backend's rows, with one inverted list per centroid
+    
+    A query scores the centroids, then only the rows in its `nprobe` closest
+    lists. Rows are assigned to a list as they are added; nothing is trained
+    until `min_train_rows` vectors are live (search stays exact until then),
+    and the centroids are retrained as the index grows `RETRAIN_GROWTH`-fold.
+    
+    Files in `path`, next to the backend's:
+      ivf.json                   - generation, nlist, vectors trained on
+      ivf_centroids.<gen>.f32    - nlist x dim float32
+      ivf_assign.<gen>.i32       - list of every backend row, append-only
+    A retrain writes a new generation and switches to it by replacing ivf.json.
+    """
+    
+    def __init__(self, path: Path, nlist: int = 0, nprobe: int = 16, min_train_rows: int = 10000):
+        self.path = Path(path)
+        self.meta_path = self.path / "ivf.json"
+        self.nlist_setting = nlist
+        self.nprobe = nprobe
+        self.min_train_rows = min_train_rows
+        self._reset()
+    
+    def _reset(self):
+        self.generation = 0
+        self.trained_rows = 0
+        self.centroids: Optional[np.ndarray] = None
+        self.assign = np.zeros(0, dtype=np.int32)
+        self._lists = None
+    
+    @property
+    def trained(self) -> bool:
+        return self.centroids is not None
+    
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids) if self.trained else 0
+    
+    def _centroids_path(self, generation: int) -> Path:
+        return self.path / f"ivf_centroids.{generation}.f32"
+    
+    def _assign_path(self, generation: int) -> Path:
+        return self.path / f"ivf_assign.{generation}.i32"
+    
+    def load(self, rows: int, decode: Decoder):
+        """Read the persisted index and assign any backend rows it has not seen"""
+        self._reset()
+        if not self.meta_path.exists():
+            return
+        meta = json.loads(self.meta_path.read_text(encoding="utf-8"))
+        self.generation = meta["generation"]
+        self.trained_rows = meta["trained_rows"]
+        self.centroids = np.fromfile(self._centroids_path(self.generation), dtype=np.float32).reshape(meta["nlist"], -1)
+        
+        assign_path = self._assign_path(self.generation)
+        if assign_path.exists() and assign_path.stat().st_size > rows * 4:
+            # Assignments written for rows whose records never made it to disk
+            with open(assign_path, "r+b") as out:
+                out.truncate(rows * 4)
+        self.assign = np.fromfile(assign_path, dtype=np.int32) if assign_path.exists() else self.assign
+        if len(self.assign) < rows:
+            logger.info(f"Assigning {rows - len(self.assign)} vectors to {self.nlist} IVF lists")
+            with open(assign_path, "ab") as out:
+                for start in range(len(self.assign), rows, ASSIGN_BLOCK_ROWS):
+                    out.write(nearest_centroids(decode(slice(start, min(start + ASSIGN_BLOCK_ROWS, rows))),
+                                                self.centroids).tobytes())
+            self.assign = np.fromfile(assign_path, dtype=np.int32)
+    
+    def add(self, matrix: np.ndarray):
+        """Assign newly appended rows to their lists (a no-op until trained)"""
+        if not self.trained:
+            return
+        assign = nearest_centroids(matrix, self.centroids)
+        with open(self._assign_path(self.generation), "ab") as out:
+            out.write(assign.tobytes())
+        self.assign = np.concatenate([self.assign, assign])
+        self._lists = None
+    
+    def maybe_train(self, alive: np.ndarray, decode: Decoder):
+        """Train on first reaching `min_train_rows` live vectors, retrain after enough growth"""
+        live = int(alive.sum())
+        if self.trained and live < self.trained_rows * RETRAIN_GROWTH:
+            return
+        if live < max(self.min_train_rows, 1):
+            return
+        self.train(alive, decode)
+    
+    def train(self, alive: np.ndarray, decode: Decoder):
+        """Fit centroids on a sample of live rows and reassign every row"""
+        live_rows = np.flatnonzero(alive)
+        nlist = self.nlist_setting or int(4 * math.sqrt(len(live_rows)))
+        nlist = max(1, min(nlist, len(live_rows)))
+        sample_size = min(len(live_rows), max(nlist * TRAIN_SAMPLE_PER_LIST, nlist), TRAIN_SAMPLE_MAX)
+        rng = np.random.default_rng(len(live_rows))
+        sample = np.sort(rng.choice(live_rows, sample_size, replace=False))
+        logger.info(f"Training IVF index: {nlist} lists from {sample_size} of {len(live_rows)} vectors")
+        centroids = spherical_kmeans(decode(sample), nlist)
+        
+        generation = self.generation + 1
+        with open(self._assign_path(generation), "wb") as out:
+            for start in range(0, len(alive), ASSIGN_BLOCK_ROWS):
+                out.write(nearest_centroids(decode(slice(start, min(start + ASSIGN_BLOCK_ROWS, len(alive)))),
+                                            centroids).tobytes())
+        centroids.tofile(self._centroids_path(generation))
+        tmp_meta = self.meta_path.with_suffix(".tmp")
+        tmp_meta.write_text(json.dumps({"generation": generation, "nlist": nlist, "trained_rows": len(live_rows)}),
+                            encoding="utf-8")
+        tmp_meta.replace(self.meta_path)
+        
+        for path in (self._assign_path(self.generation), self._centroids_path(self.generation)):
+            path.unlink(missing_ok=True)
+        self.generation = generation
+        self.trained_rows = len(live_rows)
+        self.centroids = centroids
+        self.assign = np.fromfile(self._assign_path(generation), dtype=np.int32)
+        self._lists = None
+    
+    def invalidate(self):
+        """Forget row assignments (the backend is renumbering rows); they are rebuilt on load"""
+        if self.trained:
+            self._assign_path(self.generation).write_bytes(b"")
+            self.assign = np.zeros(0, dtype=np.int32)
+            self._lists = None
+    
+    def candidates(self, query: np.ndarray, nprobe: int = None) -> np.ndarray:
+        """Sorted backend rows in the `nprobe` lists closest to a unit query vector"""
+        if self._lists is None:
+            order = np.argsort(self.assign, kind="stable").astype(np.int64)
+            offsets = np.searchsorted(self.assign[order], np.arange(self.nlist + 1))
+            self._lists = (order, offsets)
+        order, offsets = self._lists
+        nprobe = max(1, min(nprobe or self.nprobe, self.nlist))
+        probe = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        return np.sort(np.concatenate([order[offsets[list_id]:offsets[list_id + 1]] for list_id in probe]))
+    
+    def stats(self) -> dict:
+        sizes = np.bincount(self.assign, minlength=self.nlist) if self.trained else np.zeros(0)
+        return {
+            "trained": self.trained,
+            "nlist": self.nlist,
+            "nprobe": self.nprobe,
+            "trained_rows": self.trained_rows,
+            "largest_list": int(sizes.max()) if len(sizes) else 0
+        }
@@ -0,0 +1,207 @@
+"""
+Latency instrumentation: per-stage timing spans with percentile summaries
+
+Spans are recorded by the process-wide `recorder`, appended to a JSONL log
+and summarised as p50/p95/p99 over a sliding window of recent samples. The
+summary can be served as Prometheus text (METRICS_PORT) or rebuilt offline
+from the JSONL log:
+
+    python latency_metrics.py [--format prometheus|json]
+"""
+import argparse
+import json
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Deque, Dict, Iterator, Optional
+from config_openai import Config
+from logging_setup import get_logger
+
+logger = get_logger(__name__, 'rag_engine_openai.log')
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def percentile(sorted_samples: list, quantile: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_samples:
+        return 0.0
+    rank = max(math.ceil(quantile * len(sorted_samples)) - 1, 0)
+    return sorted_samples[rank]
+
+
+def backup_path(path: Path) -> Path:
+    """Where a full metrics log is rolled over to"""
+    return path.with_name(path.name + ".1")
+
+
+class LatencyRecorder:
+    """Thread-safe store of stage durations
+    
+    With a `jsonl_path`, every sample is also appended there. Once the file
+    would pass `jsonl_max_bytes` it replaces the previous backup (<path>.1)
+    and a new file is started, so at most twice the cap stays on disk.
+    """
+    
+    def __init__(self, window: int = 1000, jsonl_path: Optional[Path] = None, jsonl_max_bytes: int = 0):
+        self.window = window
+        self.jsonl_path = jsonl_path
+        self.jsonl_max_bytes = jsonl_max_bytes
+        self._samples: Dict[str, Deque[float]] = {}
+        self._counts: Dict[str, int] = {}
+        self._sums: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._jsonl = None
+        self._jsonl_bytes = 0
+    
+    def record(self, stage: str, seconds: float, log: bool = True):
+        with self._lock:
+            if stage not in self._samples:
+                self._samples[stage] = deque(maxlen=self.window)
+                self._counts[stage] = 0
+                self._sums[stage] = 0.0
+            self._samples[stage].append(seconds)
+            self._counts[stage] += 1
+            self._sums[stage] += seconds
+            if log and self.jsonl_path is not None:
+                self._write({"ts": time.time(), "stage": stage, "seconds": round(seconds, 6)})
+    
+    def _write(self, entry: Dict):
+        try:
+            line = json.dumps(entry) + "\n"
+            full = self.jsonl_max_bytes and self._jsonl_bytes + len(line) > self.jsonl_max_bytes
+            if self._jsonl is not None and full:
+                self._jsonl.close()
+                self._jsonl = None
+                self.jsonl_path.replace(backup_path(self.jsonl_path))
+            if self._jsonl is None:
+                self.jsonl_path.parent.mkdir(parents=True, exist_ok=True)
+                self._jsonl = open(self.jsonl_path, "a", encoding="utf-8", buffering=1)
+                self._jsonl_bytes = self._jsonl.tell()
+            self._jsonl.write(line)
+            self._jsonl_bytes += len(line)
+        except OSError as e:
+            # Metrics must never break a request
+            logger.warning(f"Disabling metrics log {self.jsonl_path}: {str(e)}")
+            self.jsonl_path = None
+    
+    @contextmanager
+    def span(self, stage: str) -> Iterator[None]:
+        """Time the enclosed block as one sample of `stage`"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+    
+    def summary(self) -> Dict[str, Dict]:
+        """Per-stage count, mean and percentiles (in milliseconds) over the recent window"""
+        with self._lock:
+            snapshot = {stage: (sorted(samples), self._counts[stage], self._sums[stage])
+                        for stage, samples in self._samples.items()}
+        result = {}
+        for stage, (samples, count, total) in snapshot.items():
+            result[stage] = {
+                "count": count,
+                "mean_ms": total / count * 1000 if count else 0.0,
+                **{f"p{round(q * 100)}_ms": percentile(samples, q) * 1000 for q in QUANTILES}
+            }
+        return result
+    
+    def prometheus_text(self) -> str:
+        """Render all stages in the Prometheus text exposition format"""
+        with self._lock:
+            snapshot = {stage: (sorted(samples), self._counts[stage], self._sums[stage])
+                        for stage, samples in self._samples.items()}
+        lines = [
+            "# HELP gxp_stage_latency_seconds Latency of RAG pipeline stages",
+            "# TYPE gxp_stage_latency_seconds summary"
+        ]
+        for stage, (samples, count, total) in sorted(snapshot.items()):
+            for q in QUANTILES:
+                lines.append(f'gxp_stage_latency_seconds{{stage="{stage}",quantile="{q}"}} {percentile(samples, q):.6f}')
+            lines.append(f'gxp_stage_latency_seconds_sum{{stage="{stage}"}} {total:.6f}')
+            lines.append(f'gxp_stage_latency_seconds_count{{stage="{stage}"}} {count}')
+        return "\n".join(lines) + "\n"
+    
+    def load_jsonl(self, path: Path):
+        """Replay a JSONL metrics log into this recorder"""
+        with open(path, encoding="utf-8") as file:
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                    self.record(entry["stage"], entry["seconds"], log=False)
+                except (ValueError, KeyError):
+                    continue
+    
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+            self._counts.clear()
+            self._sums.clear()
+
+
+recorder = LatencyRecorder(
+    Config.METRICS_WINDOW,
+    Config.METRICS_JSONL_PATH if Config.METRICS_JSONL_ENABLED else None,
+    int(Config.METRICS_JSONL_MAX_MB * 1024 * 1024)
+)
+
+_server: Optional[ThreadingHTTPServer] = None
+
+
+def serve_metrics(port: int = None, host: str = "127.0.0.1") -> Optional[ThreadingHTTPServer]:
+    """Serve `recorder` as Prometheus text on /metrics from a daemon thread (once per process)"""
+    global _server
+    if port is None:
+        port = Config.METRICS_PORT
+    if _server is not None or not port:
+        return _server
+    
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != "/metrics":
+                self.send_error(404)
+                return
+            body = recorder.prometheus_text().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        
+        def log_message(self, format, *args):
+            pass
+    
+    try:
+        _server = ThreadingHTTPServer((host, port), MetricsHandler)
+    except OSError as e:
+        logger.warning(f"Could not serve metrics on port {port}: {str(e)}")
+        return None
+    threading.Thread(target=_server.serve_forever, daemon=True).start()
+    logger.info(f"Serving latency metrics on http://{host}:{port}/metrics")
+    return _server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarise the latency metrics log")
+    parser.add_argument("--path", type=Path, default=Config.METRICS_JSONL_PATH)
+    parser.add_argument("--format", choices=["json", "prometheus"], default="json")
+    args = parser.parse_args()
+    
+    offline = LatencyRecorder(window=10 ** 9)
+    if backup_path(args.path).exists():
+        offline.load_jsonl(backup_path(args.path))
+    offline.load_jsonl(args.path)
+    if args.format == "prometheus":
+        print(offline.prometheus_text(), end="")
+    else:
+        print(json.dumps(offline.summary(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+"""
+Shared logging setup: one console handler for the process, one log file per module
+"""
+import logging
+import threading
+from typing import Optional
+from config_openai import Config
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+_lock = threading.Lock()
+
+
+def get_logger(name: str, log_file: Optional[str] = None) -> logging.Logger:
+    """Return a module logger, writing to Config.LOGS_DIR / log_file as well as the console
+    
+    The console handler is installed on the root logger once, however many
+    modules ask for a logger, and each log file gets a single handler.
+    """
+    with _lock:
+        # No-op when the root logger already has handlers (another module or the host app)
+        logging.basicConfig(level=logging.INFO, format=LOG_FORMAT, handlers=[logging.StreamHandler()])
+        
+        logger = logging.getLogger(name)
+        if log_file:
+            Config.LOGS_DIR.mkdir(exist_ok=True)  # Create logs directory if it doesn't exist
+            path = str((Config.LOGS_DIR / log_file).resolve())
+            if not any(isinstance(handler, logging.FileHandler) and handler.baseFilename == path
+                       for handler in logger.handlers):
+                handler = logging.FileHandler(path)
+                handler.setFormatter(logging.Formatter(LOG_FORMAT))
+                logger.addHandler(handler)
+        return logger
@@ -1,45 +1,68 @@
 """
 RAG Engine for query processing and response generation
 """
-import logging
-from typing import List, Dict
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, FrozenSet, Iterator, List, Optional, Tuple
 from openai import OpenAI
 from config_openai import Config
-from vector_store_openai import VectorStore
+from context_builder import assemble_context
+from conversation import ConversationMemory
+from latency_metrics import recorder
+from logging_setup import get_logger
+from reranker import Reranker, load_cross_encoder
+from response_cache import SemanticResponseCache
+from search_filter import SearchFilter
+from vector_store_openai import VectorStore, count_tokens
 
-# Setup logging
-Config.LOGS_DIR.mkdir(exist_ok=True)  # Create logs directory if it doesn't exist
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(Config.LOGS_DIR / 'rag_engine_openai.log'),
-        logging.StreamHandler()
-    ]
-)
-logger = logging.getLogger(__name__)
+logger = get_logger(__name__, 'rag_engine_openai.log')
+
+NO_CONTEXT_ANSWER = "I couldn't find relevant information in the GxP validation guidelines to answer your question. Please try rephrasing your question or ask about topics covered in GAMP 5, FDA Part 11, ISO 27001, or other GxP validation standards."
+
+_SYSTEM_MESSAGE = "You are a GxP Validation Expert Assistant."
+
+# Chat formatting tokens per request (role markers and reply priming)
+_MESSAGE_OVERHEAD_TOKENS = 16
+
+CacheKey = Tuple[List[float], FrozenSet[str], str]
 
 
 class RAGEngine:
     """Retrieval-Augmented Generation Engine"""
     
-    def __init__(self, vector_store: VectorStore):
+    def __init__(self, vector_store: VectorStore, client: OpenAI = None):
         self.vector_store = vector_store
-        self.client = OpenAI(api_key=Config.OPENAI_API_KEY)
+        self.client = client or Config.openai_client()
+        self.answer_cache = SemanticResponseCache(Config.ANSWER_CACHE_SIZE, Config.ANSWER_CACHE_THRESHOLD)
+        self.reranker: Optional[Reranker] = None
+        if Config.RERANK_ENABLED:
+            cross_encoder = load_cross_encoder(Config.RERANK_CROSS_ENCODER) if Config.RERANK_CROSS_ENCODER else None
+            self.reranker = Reranker(vector_store.lexical_index, Config.RERANK_BUDGET_MS, cross_encoder)
+        # Ranks the chunks a chat follow-up reuses from earlier turns
+        self.conversation_ranker = self.reranker or Reranker(vector_store.lexical_index, Config.RERANK_BUDGET_MS)
         logger.info("RAG Engine (OpenAI) initialized successfully")
     
-    def create_context(self, retrieved_docs: List[Dict]) -> str:
+    def search_depth(self, top_k: int = None) -> Optional[int]:
+        """Chunks to fetch from search: extra candidates when they will be reranked"""
+        if self.reranker is None:
+            return top_k
+        return max(Config.RERANK_CANDIDATES, top_k or Config.RERANK_TOP_N)
+    
+    def start_conversation(self) -> ConversationMemory:
+        """Retrieval state for one chat session, passed to generate_response(_stream) on every turn"""
+        return ConversationMemory(self.vector_store.lexical_index)
+    
+    def create_context(self, retrieved_docs: List[Dict], budget: Optional[int] = None) -> str:
         """Create context from retrieved documents"""
-        if not retrieved_docs:
-            return "No relevant context found."
-        
-        context_parts = []
-        for i, doc in enumerate(retrieved_docs, 1):
-            source = doc['metadata'].get('source', 'Unknown')
-            text = doc['text']
-            context_parts.append(f"[Source {i}: {source}]\n{text}\n")
-        
-        return "\n".join(context_parts)
+        context, _ = assemble_context(retrieved_docs, budget)
+        return context
+    
+    def context_budget(self, query: str) -> int:
+        """Tokens left for context once the prompt, question and answer are accounted for"""
+        if Config.CONTEXT_TOKEN_BUDGET > 0:
+            return Config.CONTEXT_TOKEN_BUDGET
+        prompt_tokens = count_tokens(_SYSTEM_MESSAGE + self.create_prompt(query, ""), Config.GENERATION_MODEL)
+        return Config.MODEL_CONTEXT_WINDOW - Config.MAX_TOKENS - prompt_tokens - _MESSAGE_OVERHEAD_TOKENS
     
     def create_prompt(self, query: str, context: str) -> str:
         """Create a prompt for the generation model"""
@@ -61,63 +84,252 @@ class RAGEngine:
 7. If applicable, provide practical implementation guidance or best practices.
 
 **Answer:**"""
-        
+    
         return prompt
     
-    def generate_response(self, query: str, top_k: int = None) -> Dict:
-        """Generate a response using RAG"""
+    def _retrieve(self, query: str, top_k: int = None, retrieved_docs: List[Dict] = None,
+                  query_embedding: List[float] = None,
+                  search_filter: SearchFilter = None) -> Tuple[List[Dict], Optional[Dict], Optional[CacheKey]]:
+        """Retrieve chunks and return (docs, response if no generation is needed, answer cache key or None)"""
+        # Retrieve relevant documents (unless the caller already did, with search_depth(top_k) results)
+        if retrieved_docs is None:
+            retrieved_docs = self.vector_store.search(query, self.search_depth(top_k), search_filter=search_filter)
+        if self.reranker is not None:
+            retrieved_docs = self.reranker.rerank(query, retrieved_docs, top_k or Config.RERANK_TOP_N)
+        
+        if not retrieved_docs:
+            return retrieved_docs, {
+                "answer": NO_CONTEXT_ANSWER,
+                "sources": [],
+                "context_used": False
+            }, None
+        
+        if self.answer_cache.max_size <= 0:
+            # No key to build: it costs a query embedding and a collection count
+            return retrieved_docs, None, None
+        
+        # Reuse the answer to a near-identical question over the same chunks
+        cache_key = (
+            query_embedding if query_embedding is not None else self.vector_store.embed_query(query),
+            frozenset(VectorStore.document_id(doc['metadata']) for doc in retrieved_docs),
+            self.vector_store.collection_version()
+        )
+        cached = self.answer_cache.get(*cache_key)
+        if cached is not None:
+            logger.info("Answer served from semantic cache")
+            cached["cached"] = True
+        return retrieved_docs, cached, cache_key
+    
+    def _retrieve_turn(self, query: str, top_k: int, search_filter: Optional[SearchFilter],
+                       conversation: ConversationMemory) -> Tuple[List[Dict], Optional[Dict], Optional[CacheKey]]:
+        """Retrieve for a chat turn, as _retrieve
+        
+        Follow-ups are searched and ranked in their condensed, standalone
+        form; the answer is still generated for the user's own words. A
+        follow-up the cached chunks cover is answered from them, with no
+        embedding request, index search or answer cache lookup.
+        """
+        scope = (search_filter.key() if search_filter else None, self.vector_store.collection_version())
+        standalone = conversation.condense(query)
+        reused = conversation.reusable(query, scope)
+        if reused is not None:
+            top_n = top_k or (Config.RERANK_TOP_N if self.reranker is not None else Config.TOP_K)
+            return self.conversation_ranker.rerank(standalone, reused, top_n), None, None
+        
+        # The same search fetches a wider pool for the session to answer later follow-ups from
+        depth = self.search_depth(top_k)
+        retrieved_docs = self.vector_store.search(standalone, max(depth or Config.TOP_K, Config.CONVERSATION_POOL),
+                                                  search_filter=search_filter)
+        if retrieved_docs:
+            conversation.record(query, retrieved_docs, scope)
+        return self._retrieve(standalone, top_k, retrieved_docs[:depth or Config.TOP_K])
+    
+    def _build_messages(self, query: str, retrieved_docs: List[Dict]) -> Tuple[List[Dict], Dict]:
+        """Create context and prompt messages for the generation model, plus context stats"""
+        with recorder.span("context_build"):
+            context, context_stats = assemble_context(retrieved_docs, self.context_budget(query))
+        logger.info(f"Context: {context_stats['context_tokens']} tokens in {context_stats['passages']} passages, "
+                    f"{context_stats['tokens_saved']} tokens saved")
+        prompt = self.create_prompt(query, context)
+        return [
+            {"role": "system", "content": _SYSTEM_MESSAGE},
+            {"role": "user", "content": prompt}
+        ], context_stats
+    
+    def _build_response(self, answer: str, retrieved_docs: List[Dict], context_stats: Dict) -> Dict:
+        """Package a generated answer with its de-duplicated sources"""
+        sources = []
+        seen_sources = set()
+        for doc in retrieved_docs:
+            source = doc['metadata'].get('source', 'Unknown')
+            if source not in seen_sources:
+                sources.append(source)
+                seen_sources.add(source)
+        
+        return {
+            "answer": answer,
+            "sources": sources,
+            "context_used": True,
+            "num_chunks_retrieved": len(retrieved_docs),
+            "context_tokens": context_stats["context_tokens"],
+            "context_tokens_saved": context_stats["tokens_saved"]
+        }
+    
+    @staticmethod
+    def _error_response(error: Exception) -> Dict:
+        logger.error(f"Error generating response: {str(error)}")
+        return {
+            "answer": f"An error occurred while generating the response: {str(error)}",
+            "sources": [],
+            "context_used": False
+        }
+    
+    def generate_response(self, query: str, top_k: int = None, search_filter: SearchFilter = None,
+                          conversation: ConversationMemory = None) -> Dict:
+        """Generate a response using RAG, optionally from some sources or pages only
+        
+        With a `conversation` (see start_conversation), follow-ups are read
+        in the context of the session's earlier questions.
+        """
         try:
-            logger.info(f"Processing query: {query[:100]}...")
-            
-            # Retrieve relevant documents
-            retrieved_docs = self.vector_store.search(query, top_k)
-            
-            if not retrieved_docs:
-                return {
-                    "answer": "I couldn't find relevant information in the GxP validation guidelines to answer your question. Please try rephrasing your question or ask about topics covered in GAMP 5, FDA Part 11, ISO 27001, or other GxP validation standards.",
-                    "sources": [],
-                    "context_used": False
-                }
-            
-            # Create context and prompt
-            context = self.create_context(retrieved_docs)
-            prompt = self.create_prompt(query, context)
-            
-            # Generate response using OpenAI
+            with recorder.span("total"):
+                logger.info(f"Processing query: {query[:100]}...")
+                
+                if conversation is not None:
+                    retrieved_docs, early_response, cache_key = self._retrieve_turn(
+                        query, top_k, search_filter, conversation)
+                else:
+                    retrieved_docs, early_response, cache_key = self._retrieve(query, top_k,
+                                                                               search_filter=search_filter)
+                if early_response is not None:
+                    return early_response
+                
+                return self._complete(query, retrieved_docs, cache_key)
+        
+        except Exception as e:
+            return self._error_response(e)
+    
+    def _complete(self, query: str, retrieved_docs: List[Dict], cache_key: Optional[CacheKey]) -> Dict:
+        """Generate an answer from retrieved chunks and cache it (unless there is no cache key)"""
+        messages, context_stats = self._build_messages(query, retrieved_docs)
+        with recorder.span("llm_call"):
             response = self.client.chat.completions.create(
                 model=Config.GENERATION_MODEL,
-                messages=[
-                    {"role": "system", "content": "You are a GxP Validation Expert Assistant."},
-                    {"role": "user", "content": prompt}
-                ],
+                messages=messages,
                 temperature=Config.TEMPERATURE,
                 max_tokens=Config.MAX_TOKENS
             )
+        
+        result = self._build_response(response.choices[0].message.content, retrieved_docs, context_stats)
+        logger.info("Response generated successfully")
+        
+        if cache_key is not None:
+            self.answer_cache.put(*cache_key, result)
+        return result
+    
+    def generate_batch(self, queries: List[str], top_k: int = None, max_workers: int = None,
+                       search_filter: SearchFilter = None) -> List[Dict]:
+        """Answer many questions: one batched retrieval, then concurrent generations
+        
+        Returns one response dict per query, in input order. Each carries an
+        "error" key that is None on success and the error message otherwise.
+        Empty or whitespace-only queries get an error without any OpenAI call.
+        """
+        if max_workers is None:
+            max_workers = Config.GENERATION_CONCURRENCY
+        logger.info(f"Processing batch of {len(queries)} queries")
+        batch_start = time.perf_counter()
+        
+        results: List[Optional[Dict]] = [None] * len(queries)
+        valid = []
+        for i, query in enumerate(queries):
+            if isinstance(query, str) and query.strip():
+                valid.append(i)
+            else:
+                error = ValueError("Query must be a non-empty string")
+                results[i] = self._error_response(error)
+                results[i]["error"] = str(error)
+        
+        searches = dict(zip(valid, self.vector_store.search_batch([queries[i] for i in valid], self.search_depth(top_k),
+                                                                  search_filter=search_filter)))
+        
+        def answer(i: int) -> Dict:
+            if searches[i]["error"]:
+                raise RuntimeError(searches[i]["error"])
+            retrieved_docs, early_response, cache_key = self._retrieve(queries[i], top_k, searches[i]["results"])
+            if early_response is not None:
+                return early_response
+            return self._complete(queries[i], retrieved_docs, cache_key)
+        
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            futures = {executor.submit(answer, i): i for i in valid}
+            for future in as_completed(futures):
+                i = futures[future]
+                try:
+                    results[i] = future.result()
+                    results[i]["error"] = None
+                except Exception as e:
+                    results[i] = self._error_response(e)
+                    results[i]["error"] = str(e)
+        
+        recorder.record("batch_total", time.perf_counter() - batch_start)
+        logger.info(f"Batch finished: {sum(1 for result in results if result['error'])} errors")
+        return results
+    
+    def generate_response_stream(self, query: str, top_k: int = None, search_filter: SearchFilter = None,
+                                 conversation: ConversationMemory = None) -> Iterator[Dict]:
+        """Generate a response using RAG, yielding tokens as they arrive
+        
+        Yields {"type": "token", "content": str} events, then a single
+        {"type": "done", "response": dict} event carrying the same response
+        dict (answer, sources, ...) that generate_response would return.
+        """
+        start = time.perf_counter()
+        try:
+            logger.info(f"Processing streamed query: {query[:100]}...")
             
-            answer = response.choices[0].message.content
+            if conversation is not None:
+                retrieved_docs, early_response, cache_key = self._retrieve_turn(
+                    query, top_k, search_filter, conversation)
+            else:
+                retrieved_docs, early_response, cache_key = self._retrieve(query, top_k, search_filter=search_filter)
+            if early_response is not None:
+                recorder.record("total", time.perf_counter() - start)
+                yield {"type": "token", "content": early_response["answer"]}
+                yield {"type": "done", "response": early_response}
+                return
             
-            # Extract sources
-            sources = []
-            seen_sources = set()
-            for doc in retrieved_docs:
-                source = doc['metadata'].get('source', 'Unknown')
-                if source not in seen_sources:
-                    sources.append(source)
-                    seen_sources.add(source)
+            messages, context_stats = self._build_messages(query, retrieved_docs)
+            llm_start = time.perf_counter()
+            stream = self.client.chat.completions.create(
+                model=Config.GENERATION_MODEL,
+                messages=messages,
+                temperature=Config.TEMPERATURE,
+                max_tokens=Config.MAX_TOKENS,
+                stream=True
+            )
+            
+            answer_parts = []
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                token = chunk.choices[0].delta.content
+                if token:
+                    if not answer_parts:
+                        recorder.record("llm_first_token", time.perf_counter() - llm_start)
+                    answer_parts.append(token)
+                    yield {"type": "token", "content": token}
+            # Time spent waiting on the consumer between tokens is included, as the user sees it
+            recorder.record("llm_call", time.perf_counter() - llm_start)
+            recorder.record("total", time.perf_counter() - start)
             
-            logger.info("Response generated successfully")
+            result = self._build_response("".join(answer_parts), retrieved_docs, context_stats)
+            logger.info("Streamed response generated successfully")
             
-            return {
-                "answer": answer,
-                "sources": sources,
-                "context_used": True,
-                "num_chunks_retrieved": len(retrieved_docs)
-            }
+            if cache_key is not None:
+                self.answer_cache.put(*cache_key, result)
         
         except Exception as e:
-            logger.error(f"Error generating response: {str(e)}")
-            return {
-                "answer": f"An error occurred while generating the response: {str(e)}",
-                "sources": [],
-                "context_used": False
-            }
+            result = self._error_response(e)
+        
+        yield {"type": "done", "response": result}
@@ -0,0 +1,90 @@
+"""
+Background start-up of the RAG components with a readiness state
+
+Importing this module is cheap: the OpenAI client, the vector index and the
+rest of the RAG stack are imported and opened on a warm-up thread, so a UI
+can render immediately and poll `status` until the system is ready.
+"""
+import threading
+import time
+from typing import Optional
+from config_openai import Config
+from latency_metrics import serve_metrics
+from logging_setup import get_logger
+
+logger = get_logger(__name__, 'app_openai.log')
+
+STARTING = "starting"
+READY = "ready"
+EMPTY = "empty"  # started, but the vector database has no documents
+CONFIG_ERROR = "config_error"
+ERROR = "error"
+
+
+class RAGSystem:
+    """Vector store and RAG engine, initialised on a background thread"""
+    
+    def __init__(self):
+        self.status = STARTING
+        self.error: Optional[str] = None
+        self.vector_store = None
+        self.rag_engine = None
+        self.doc_count = 0
+        self.startup_seconds: Optional[float] = None
+        self._done = threading.Event()
+        self._started = time.perf_counter()
+    
+    @classmethod
+    def start(cls) -> "RAGSystem":
+        """Create the system and begin warming it up in the background"""
+        system = cls()
+        threading.Thread(target=system._warm_up, name="rag-warm-up", daemon=True).start()
+        return system
+    
+    @property
+    def ready(self) -> bool:
+        return self.status == READY
+    
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until warm-up has finished (successfully or not); False on timeout"""
+        return self._done.wait(timeout)
+    
+    def _warm_up(self):
+        try:
+            Config.validate()
+            serve_metrics()
+            
+            # Deferred so importing the UI does not pay for openai, chromadb and tiktoken
+            from rag_engine_openai import RAGEngine
+            from vector_store_openai import VectorStore, count_tokens
+            
+            vector_store = VectorStore()
+            doc_count = vector_store.get_collection_count()
+            if doc_count == 0:
+                self.status = EMPTY
+                return
+            rag_engine = RAGEngine(vector_store)
+            
+            # One-off costs paid now rather than on the first question; a missing BM25 index
+            # means a pass over every stored chunk, so it is only built when search or reranking reads it
+            if Config.RETRIEVAL_MODE == "hybrid" or Config.RERANK_ENABLED:
+                vector_store._ensure_lexical_index()
+            count_tokens("warm-up", Config.GENERATION_MODEL)
+            
+            self.vector_store = vector_store
+            self.rag_engine = rag_engine
+            self.doc_count = doc_count
+            self.status = READY
+            logger.info(f"RAG system initialized with {doc_count} documents")
+        
+        except ValueError as e:
+            self.error = str(e)
+            self.status = CONFIG_ERROR
+        except Exception as e:
+            self.error = str(e)
+            self.status = ERROR
+            logger.error(f"Initialization error: {str(e)}")
+        finally:
+            self.startup_seconds = time.perf_counter() - self._started
+            logger.info(f"RAG system warm-up finished in {self.startup_seconds:.2f}s ({self.status})")
+            self._done.set()
@@ -0,0 +1,157 @@
+"""
+Rate limiting and retry helpers for OpenAI requests
+"""
+import asyncio
+import random
+import threading
+import time
+from typing import Awaitable, Callable, Dict, TypeVar
+import openai
+from config_openai import Config
+from logging_setup import get_logger
+
+logger = get_logger(__name__, 'vector_store_openai.log')
+
+T = TypeVar("T")
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at `capacity` units per minute"""
+    
+    def __init__(self, capacity: float):
+        self.capacity = float(capacity)
+        self.rate = self.capacity / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+    
+    def refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+    
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` units are available (0 if available now)"""
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+
+class RateLimiter:
+    """Thread-safe limiter tracking requests/min and tokens/min"""
+    
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.lock = threading.Lock()
+    
+    def try_acquire(self, num_tokens: int = 0) -> float:
+        """Take capacity for one request if available; otherwise return the seconds to wait"""
+        # A single request larger than the whole budget can only wait for a full bucket
+        num_tokens = min(num_tokens, self.tokens.capacity)
+        with self.lock:
+            now = time.monotonic()
+            self.requests.refill(now)
+            self.tokens.refill(now)
+            wait = max(self.requests.wait_time(1), self.tokens.wait_time(num_tokens))
+            if wait == 0:
+                self.requests.level -= 1
+                self.tokens.level -= num_tokens
+            return wait
+    
+    def acquire(self, num_tokens: int = 0):
+        """Block until one request carrying `num_tokens` tokens may be sent"""
+        while True:
+            wait = self.try_acquire(num_tokens)
+            if wait == 0:
+                return
+            time.sleep(wait)
+    
+    async def acquire_async(self, num_tokens: int = 0):
+        """Wait, without blocking the event loop, until one request may be sent"""
+        while True:
+            wait = self.try_acquire(num_tokens)
+            if wait == 0:
+                return
+            await asyncio.sleep(wait)
+    
+    def throttle(self):
+        """Drain both buckets after the provider reports a rate limit"""
+        with self.lock:
+            self.requests.level = 0.0
+            self.tokens.level = 0.0
+            self.requests.updated = self.tokens.updated = time.monotonic()
+
+
+def is_retryable(error: Exception) -> bool:
+    """Rate limits, server errors, timeouts and dropped connections are worth retrying"""
+    if isinstance(error, (openai.RateLimitError, openai.APIConnectionError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    return False
+
+
+def backoff_delay(attempt: int, error: Exception = None, max_delay: float = None) -> float:
+    """Exponential backoff with full jitter, honouring Retry-After when sent (both capped at `max_delay`)"""
+    if max_delay is None:
+        max_delay = Config.RETRY_MAX_DELAY
+    response = getattr(error, "response", None)
+    if response is not None:
+        try:
+            return min(float(response.headers["retry-after"]), max_delay)
+        except (KeyError, TypeError, ValueError):
+            pass
+    ceiling = min(max_delay, Config.RETRY_BASE_DELAY * (2 ** attempt))
+    return random.uniform(0, ceiling)
+
+
+def retry_policy(query: bool) -> Dict:
+    """call_with_retry limits: short for query embeddings a user is waiting on, the defaults otherwise"""
+    if query:
+        return {"max_retries": Config.QUERY_MAX_RETRIES, "max_delay": Config.QUERY_RETRY_MAX_DELAY}
+    return {}
+
+
+def call_with_retry(func: Callable[[], T], rate_limiter: RateLimiter = None,
+                    num_tokens: int = 0, max_retries: int = None, max_delay: float = None) -> T:
+    """Call `func` under the rate limiter, retrying transient OpenAI errors"""
+    if max_retries is None:
+        max_retries = Config.MAX_RETRIES
+    
+    attempt = 0
+    while True:
+        if rate_limiter is not None:
+            rate_limiter.acquire(num_tokens)
+        try:
+            return func()
+        except Exception as e:
+            if attempt >= max_retries or not is_retryable(e):
+                raise
+            if rate_limiter is not None and isinstance(e, openai.RateLimitError):
+                rate_limiter.throttle()
+            delay = backoff_delay(attempt, e, max_delay)
+            attempt += 1
+            logger.warning(f"Retrying OpenAI request in {delay:.2f}s (attempt {attempt}/{max_retries}): {str(e)}")
+            time.sleep(delay)
+
+
+async def async_call_with_retry(func: Callable[[], Awaitable[T]], rate_limiter: RateLimiter = None,
+                                num_tokens: int = 0, max_retries: int = None, max_delay: float = None) -> T:
+    """Await `func()` under the rate limiter, retrying transient OpenAI errors"""
+    if max_retries is None:
+        max_retries = Config.MAX_RETRIES
+    
+    attempt = 0
+    while True:
+        if rate_limiter is not None:
+            await rate_limiter.acquire_async(num_tokens)
+        try:
+            return await func()
+        except Exception as e:
+            if attempt >= max_retries or not is_retryable(e):
+                raise
+            if rate_limiter is not None and isinstance(e, openai.RateLimitError):
+                rate_limiter.throttle()
+            delay = backoff_delay(attempt, e, max_delay)
+            attempt += 1
+            logger.warning(f"Retrying OpenAI request in {delay:.2f}s (attempt {attempt}/{max_retries}): {str(e)}")
+            await asyncio.sleep(delay)
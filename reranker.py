@@ -0,0 +1,126 @@
+"""
+Second-stage reranking of retrieved chunks under a per-query time budget
+"""
+import re
+import time
+from typing import Dict, List, Optional, Set
+from bm25_index import BM25Index, tokenize
+from latency_metrics import recorder
+from logging_setup import get_logger
+
+logger = get_logger(__name__, 'rag_engine_openai.log')
+
+# Short line that names a section: "4. Validation", "4.4 Risk Control", "Project Phase"
+_HEADING = re.compile(r"^(?:\d+(?:\.\d+)*\.?\s+)?[A-Z][^.;:,]{0,70}$")
+_HEADING_MAX_WORDS = 10
+
+# Weights of the lexical features; each feature lies in [0, 1]
+COVERAGE_WEIGHT = 1.0  # IDF-weighted share of query terms found in the chunk
+HEADING_WEIGHT = 0.5  # ... found in the chunk's section headings
+REFERENCE_WEIGHT = 1.0  # share of clause references ("11.10(e)", "4.8") found in the chunk
+PRIOR_WEIGHT = 0.5  # first-stage rank, so search relevance still counts
+PRIOR_DECAY = 0.1  # prior = 1 / (1 + PRIOR_DECAY * rank)
+
+CROSS_ENCODER_BATCH = 4  # pairs per forward pass; the budget is checked between passes
+CROSS_ENCODER_CANDIDATES = 3  # lexical leaders re-scored per result slot
+
+
+def heading_terms(text: str) -> Set[str]:
+    """Terms of the lines in a chunk that look like section headings"""
+    terms = set()
+    for line in text.splitlines():
+        line = " ".join(line.split())
+        if line and len(line.split()) <= _HEADING_MAX_WORDS and _HEADING.match(line):
+            terms.update(tokenize(line))
+    return terms
+
+
+def load_cross_encoder(model_name: str):
+    """A sentence-transformers CrossEncoder on CPU, or None if the package is missing"""
+    try:
+        from sentence_transformers import CrossEncoder
+    except ImportError:
+        logger.warning("RERANK_CROSS_ENCODER is set but sentence-transformers is not installed; "
+                       "reranking with the lexical scorer only")
+        return None
+    logger.info(f"Loading cross-encoder {model_name}")
+    return CrossEncoder(model_name, device="cpu")
+
+
+class Reranker:
+    """Cheap-first reranking: a lexical scorer, then an optional cross-encoder
+    
+    Candidates are scored in first-stage order until `budget_ms` runs out.
+    The lexical score combines query-term coverage, matches in section
+    headings, exact clause references and the first-stage rank; candidates
+    the budget did not reach keep only their rank term, so they still fall
+    in line behind comparable scored ones. With a cross-encoder, the lexical
+    leaders are re-scored in small batches while time remains, and those
+    re-scored move ahead in cross-encoder order.
+    """
+    
+    def __init__(self, lexical_index: Optional[BM25Index] = None, budget_ms: float = 50, cross_encoder=None):
+        self.lexical_index = lexical_index
+        self.budget_ms = budget_ms
+        self.cross_encoder = cross_encoder
+        self.queries = 0
+        self.over_budget = 0  # queries where the budget ran out before every candidate was scored
+    
+    def _idf(self, term: str) -> float:
+        if self.lexical_index is None or not self.lexical_index.count():
+            return 1.0
+        return self.lexical_index.idf(term)
+    
+    def _lexical_score(self, text: str, query_terms: Dict[str, float], references: List[str]) -> float:
+        terms = set(tokenize(text))
+        headings = heading_terms(text)
+        total_weight = sum(query_terms.values()) or 1.0
+        coverage = sum(weight for term, weight in query_terms.items() if term in terms) / total_weight
+        heading = sum(weight for term, weight in query_terms.items() if term in headings) / total_weight
+        reference = sum(term in terms for term in references) / len(references) if references else 0.0
+        return COVERAGE_WEIGHT * coverage + HEADING_WEIGHT * heading + REFERENCE_WEIGHT * reference
+    
+    def rerank(self, query: str, docs: List[Dict], top_n: int) -> List[Dict]:
+        """The `top_n` best of `docs` (ranked by first-stage relevance), each with a 'rerank_score'"""
+        if len(docs) <= 1:
+            return docs[:top_n]
+        with recorder.span("rerank"):
+            deadline = time.perf_counter() + self.budget_ms / 1000
+            query_terms = {term: self._idf(term) for term in set(tokenize(query))}
+            references = [term for term in query_terms if any(char.isdigit() for char in term)]
+            
+            covered = True
+            for rank, doc in enumerate(docs):
+                doc['rerank_score'] = PRIOR_WEIGHT / (1 + PRIOR_DECAY * rank)
+                if time.perf_counter() > deadline:
+                    covered = False
+                    continue
+                doc['rerank_score'] += self._lexical_score(doc['text'], query_terms, references)
+            ranked = sorted(docs, key=lambda doc: doc['rerank_score'], reverse=True)
+            
+            if self.cross_encoder is not None and covered:
+                ranked, covered = self._cross_encode(query, ranked, top_n * CROSS_ENCODER_CANDIDATES, deadline)
+            self.queries += 1
+            if not covered:
+                self.over_budget += 1
+                logger.info(f"Rerank budget of {self.budget_ms} ms ran out before every candidate was scored")
+        return ranked[:top_n]
+    
+    def _cross_encode(self, query: str, ranked: List[Dict], limit: int, deadline: float):
+        """Re-score up to `limit` lexical leaders while time remains; (ranked docs, all of them re-scored)"""
+        limit = min(limit, len(ranked))
+        done = 0
+        batch_seconds = 0.0
+        # Stop when the next batch, judged by the last one, would overrun the deadline
+        while done < limit and time.perf_counter() + batch_seconds <= deadline:
+            start = time.perf_counter()
+            batch = ranked[done:min(done + CROSS_ENCODER_BATCH, limit)]
+            for doc, score in zip(batch, self.cross_encoder.predict([(query, doc['text']) for doc in batch])):
+                doc['rerank_score'] = float(score)
+            done += len(batch)
+            batch_seconds = time.perf_counter() - start
+        leaders = sorted(ranked[:done], key=lambda doc: doc['rerank_score'], reverse=True)
+        return leaders + ranked[done:], done == limit
+    
+    def stats(self) -> Dict[str, int]:
+        return {"queries": self.queries, "over_budget": self.over_budget}
@@ -0,0 +1,83 @@
+"""
+Semantic cache of generated answers
+"""
+import copy
+import threading
+from collections import OrderedDict
+from typing import Dict, FrozenSet, List, Optional
+import numpy as np
+from logging_setup import get_logger
+
+logger = get_logger(__name__, 'rag_engine_openai.log')
+
+
+class SemanticResponseCache:
+    """Reuse an answer when a query is semantically close to a cached one and retrieves the same chunks
+    
+    Entries are evicted least-recently-used beyond `max_size` and dropped
+    wholesale when the collection version changes.
+    """
+    
+    def __init__(self, max_size: int, threshold: float):
+        self.max_size = max_size
+        self.threshold = threshold
+        self.entries: "OrderedDict[int, Dict]" = OrderedDict()
+        self.next_key = 0
+        self.version: Optional[str] = None
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+    
+    def _check_version(self, version: str):
+        if version != self.version:
+            if self.entries:
+                logger.info("Collection changed; clearing answer cache")
+            self.entries.clear()
+            self.version = version
+    
+    def get(self, embedding: List[float], chunk_ids: FrozenSet[str], version: str) -> Optional[Dict]:
+        """Cached response for a similar query over the same chunks, or None"""
+        query = self._normalize(embedding)
+        with self.lock:
+            self._check_version(version)
+            candidates = [key for key, entry in self.entries.items() if entry["chunk_ids"] == chunk_ids]
+            if candidates:
+                similarities = np.stack([self.entries[key]["embedding"] for key in candidates]) @ query
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    key = candidates[best]
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return copy.deepcopy(self.entries[key]["response"])
+            self.misses += 1
+            return None
+    
+    def put(self, embedding: List[float], chunk_ids: FrozenSet[str], version: str, response: Dict):
+        if self.max_size <= 0:
+            return
+        with self.lock:
+            self._check_version(version)
+            self.entries[self.next_key] = {
+                "embedding": self._normalize(embedding),
+                "chunk_ids": chunk_ids,
+                "response": copy.deepcopy(response)
+            }
+            self.next_key += 1
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+    
+    def stats(self) -> Dict[str, float]:
+        """Hit/miss counters and current size"""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "size": len(self.entries)
+        }
@@ -0,0 +1,43 @@
+"""
+Metadata filters that restrict retrieval to some source documents or pages
+"""
+from typing import Dict, FrozenSet, Iterable, Optional, Tuple
+
+
+class SearchFilter:
+    """Chunks from `sources` whose pages overlap [page_start, page_end]
+    
+    No sources means every source; a missing bound leaves that side of the
+    page range open. Chunks without page metadata never match a page range.
+    Index backends translate a filter into their own partition or query.
+    """
+    
+    def __init__(self, sources: Iterable[str] = (), page_start: int = None, page_end: int = None):
+        if page_start is not None and page_end is not None and page_start > page_end:
+            raise ValueError(f"page_start {page_start} is after page_end {page_end}")
+        self.sources: FrozenSet[str] = frozenset(sources)
+        self.page_start = page_start
+        self.page_end = page_end
+    
+    @classmethod
+    def from_dict(cls, spec: Optional[Dict]) -> Optional["SearchFilter"]:
+        """Filter from {"sources"?, "page_start"?, "page_end"?}; None when nothing is restricted"""
+        if not spec:
+            return None
+        search_filter = cls(spec.get("sources") or (), spec.get("page_start"), spec.get("page_end"))
+        return search_filter or None
+    
+    @property
+    def has_page_range(self) -> bool:
+        return self.page_start is not None or self.page_end is not None
+    
+    def __bool__(self) -> bool:
+        return bool(self.sources) or self.has_page_range
+    
+    def key(self) -> Tuple:
+        """Hashable form, for cache and request-coalescing keys"""
+        return tuple(sorted(self.sources)), self.page_start, self.page_end
+    
+    def __repr__(self) -> str:
+        return f"SearchFilter(sources={sorted(self.sources)}, page_start={self.page_start}, page_end={self.page_end})"
+
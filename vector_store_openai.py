@@ -1,69 +1,217 @@
 """
-Vector store with ChromaDB and OpenAI
+Vector store with OpenAI embeddings over a pluggable index (ChromaDB by default)
 """
-import logging
-import time
-from typing import List, Dict
-import chromadb
-from chromadb.config import Settings
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+import httpx
+import openai
+import tiktoken
 from openai import OpenAI
 from config_openai import Config
+from bm25_index import BM25Index, reciprocal_rank_fusion
+from embedding_cache import EmbeddingCache, QueryEmbeddingCache, clean_query, normalize_query
+from index_backends import IndexBackend, create_backend
+from latency_metrics import recorder
+from logging_setup import get_logger
+from rate_limiter import RateLimiter, call_with_retry, retry_policy
+from search_filter import SearchFilter
 
-# Setup logging
-Config.LOGS_DIR.mkdir(exist_ok=True)  # Create logs directory if it doesn't exist
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(Config.LOGS_DIR / 'vector_store_openai.log'),
-        logging.StreamHandler()
-    ]
-)
-logger = logging.getLogger(__name__)
+logger = get_logger(__name__, 'vector_store_openai.log')
+
+_encodings: Dict[str, object] = {}
+
+
+
+def count_tokens(text: str, model: str = None) -> int:
+    """Count tokens with a model's tokenizer (the embedding model by default; approximate if unavailable)"""
+    model = model or Config.EMBEDDING_MODEL
+    encoding = _encodings.get(model)
+    if encoding is None:
+        try:
+            encoding = tiktoken.encoding_for_model(model)
+        except Exception as e:
+            # tiktoken downloads its vocabulary on first use; offline hosts fall back to ~4 chars/token
+            logger.warning(f"tiktoken unavailable for {model}, estimating token counts: {str(e)}")
+            encoding = False
+        _encodings[model] = encoding
+    if encoding is False:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
 
 
 class VectorStore:
     """Vector embeddings and similarity search"""
     
-    def __init__(self):
-        # Initialize OpenAI client
-        self.client = OpenAI(api_key=Config.OPENAI_API_KEY)
-        
-        # Initialize ChromaDB
-        self.chroma_client = chromadb.PersistentClient(
-            path=str(Config.VECTOR_DB_DIR),
-            settings=Settings(anonymized_telemetry=False)
+    def __init__(self, index: IndexBackend = None, client: OpenAI = None):
+        # Shared OpenAI client by default (retries are handled by call_with_retry)
+        self.client = (client or Config.openai_client()).with_options(
+            max_retries=0,
+            timeout=httpx.Timeout(Config.EMBEDDING_TIMEOUT, connect=Config.HTTP_CONNECT_TIMEOUT)
         )
+        self.rate_limiter = RateLimiter(Config.EMBEDDING_RPM, Config.EMBEDDING_TPM)
+        self.embedding_cache: Optional[EmbeddingCache] = None
+        if Config.EMBEDDING_CACHE_ENABLED:
+            self.embedding_cache = EmbeddingCache(Config.EMBEDDING_CACHE_PATH)
+        self.query_cache = QueryEmbeddingCache(Config.QUERY_CACHE_SIZE, Config.QUERY_CACHE_TTL)
+        self.revision = 0  # bumped on every write made through this instance
+        self._sources: Optional[Tuple[str, Dict[str, int]]] = None  # (collection version, chunks per source)
         
-        # Get or create collection
-        self.collection_name = "gxp_documents_openai"
-        try:
-            self.collection = self.chroma_client.get_collection(name=self.collection_name)
-            logger.info(f"Loaded existing collection: {self.collection_name}")
-        except:
-            self.collection = self.chroma_client.create_collection(
-                name=self.collection_name,
-                metadata={"description": "GxP Validation Guidelines (OpenAI)"}
-            )
-            logger.info(f"Created new collection: {self.collection_name}")
+        # Initialize the vector index (Config.INDEX_BACKEND unless one is passed in)
+        self.index = index if index is not None else create_backend()
+        logger.info(f"Using {self.index.name} index backend")
+        
+        # Lexical index kept in step with the vector index (rebuilt from it on first use if missing)
+        self.lexical_index = BM25Index(Config.VECTOR_DB_DIR / f"bm25_{self.index.name}.pkl")
     
-    def generate_embedding(self, text: str) -> List[float]:
-        """Generate embedding using OpenAI"""
+    def _ensure_lexical_index(self):
+        """Build the BM25 index from stored chunks if it is missing or out of step"""
+        if self.lexical_index.loaded and self.lexical_index.count() == self.get_collection_count():
+            return
+        logger.info("Building BM25 index from the vector index...")
+        self.lexical_index.clear()
+        for ids, texts in self.index.iter_documents():
+            self.lexical_index.add(ids, texts)
+        self.lexical_index.save()
+        self.lexical_index.loaded = True
+        logger.info(f"BM25 index built with {self.lexical_index.count()} chunks")
+    
+    def generate_embedding(self, text: str, persist: bool = True, query: bool = False) -> List[float]:
+        """Generate embedding using OpenAI (with the short query retry budget if `query`)"""
+        use_cache = persist and self.embedding_cache is not None
+        if use_cache:
+            cached = self.embedding_cache.get(Config.EMBEDDING_MODEL, text)
+            if cached is not None:
+                return cached
         try:
-            response = self.client.embeddings.create(
-                model=Config.EMBEDDING_MODEL,
-                input=text
+            response = call_with_retry(
+                lambda: self.client.embeddings.create(model=Config.EMBEDDING_MODEL, input=text),
+                self.rate_limiter,
+                count_tokens(text),
+                **retry_policy(query)
             )
-            return response.data[0].embedding
+            embedding = response.data[0].embedding
         except Exception as e:
             logger.error(f"Error generating embedding: {str(e)}")
             raise
+        if use_cache:
+            self.embedding_cache.put_many(Config.EMBEDDING_MODEL, [text], [embedding])
+        return embedding
+    
+    def embed_query(self, query: str) -> List[float]:
+        """Embedding of a search query, served from the query cache when possible"""
+        key = normalize_query(query)
+        embedding = self.query_cache.get(Config.EMBEDDING_MODEL, key)
+        if embedding is None:
+            embedding = self.generate_embedding(clean_query(query), persist=Config.QUERY_CACHE_PERSIST, query=True)
+            self.query_cache.put(Config.EMBEDDING_MODEL, key, embedding)
+        return embedding
+    
+    def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """Embeddings of several search queries, fetching all query cache misses in batched requests"""
+        keys = [normalize_query(query) for query in queries]
+        embeddings = [self.query_cache.get(Config.EMBEDDING_MODEL, key) for key in keys]
+        # One request per cache key, embedding the first spelling seen
+        missing = {}
+        for query, key, embedding in zip(queries, keys, embeddings):
+            if embedding is None:
+                missing.setdefault(key, clean_query(query))
+        missing_keys = list(missing)
+        missing_texts = list(missing.values())
+        
+        fresh = {}
+        for start, end, num_tokens in self.iter_batches(missing_texts):
+            batch = missing_texts[start:end]
+            for key, embedding in zip(missing_keys[start:end],
+                                      self.generate_embeddings(batch, num_tokens, persist=Config.QUERY_CACHE_PERSIST,
+                                                               query=True)):
+                fresh[key] = embedding
+                self.query_cache.put(Config.EMBEDDING_MODEL, key, embedding)
+        return [embedding if embedding is not None else fresh[key]
+                for key, embedding in zip(keys, embeddings)]
+    
+    def generate_embeddings(self, texts: List[str], num_tokens: int = None,
+                            persist: bool = True, query: bool = False) -> List[List[float]]:
+        """Generate embeddings for several texts, requesting only cache misses from OpenAI"""
+        if not persist or self.embedding_cache is None:
+            return self._embed_uncached(texts, num_tokens, persist, query)
+        
+        embeddings = self.embedding_cache.get_many(Config.EMBEDDING_MODEL, texts)
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if missing:
+            fresh = self._embed_uncached([texts[i] for i in missing], query=query)
+            for i, embedding in zip(missing, fresh):
+                embeddings[i] = embedding
+        return embeddings
+    
+    def _embed_uncached(self, texts: List[str], num_tokens: int = None,
+                        persist: bool = True, query: bool = False) -> List[List[float]]:
+        """Embed texts in a single OpenAI request and record them in the cache"""
+        if num_tokens is None:
+            num_tokens = sum(count_tokens(text) for text in texts)
+        try:
+            with recorder.span("embedding_batch"):
+                response = call_with_retry(
+                    lambda: self.client.embeddings.create(model=Config.EMBEDDING_MODEL, input=texts),
+                    self.rate_limiter,
+                    num_tokens,
+                    **retry_policy(query)
+                )
+            # The API reports the input position of each vector; don't rely on ordering
+            embeddings = [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+        except Exception as e:
+            logger.error(f"Error generating embeddings for batch of {len(texts)}: {str(e)}")
+            raise
+        if persist and self.embedding_cache is not None:
+            self.embedding_cache.put_many(Config.EMBEDDING_MODEL, texts, embeddings)
+        return embeddings
+    
+    def _embed_isolating(self, texts: List[str], num_tokens: int = None) -> List[Optional[List[float]]]:
+        """Embed a batch, splitting it in halves on a 400 so one bad input costs only its own embedding
+        
+        Inputs the API rejects on their own come back as None. Other errors
+        (including retryable ones that ran out of retries) fail the batch.
+        """
+        try:
+            return self._embed_uncached(texts, num_tokens)
+        except openai.BadRequestError as e:
+            if len(texts) == 1:
+                logger.error(f"Skipping a document the embeddings API rejected: {str(e)}")
+                return [None]
+        middle = len(texts) // 2
+        logger.warning(f"Embedding batch of {len(texts)} rejected; retrying as two batches of {middle} "
+                       f"and {len(texts) - middle}")
+        return self._embed_isolating(texts[:middle]) + self._embed_isolating(texts[middle:])
     
-    def add_documents(self, documents: List[Dict[str, str]]):
-        """Add documents to the vector store"""
+    def iter_batches(self, texts: List[str]) -> Iterator[Tuple[int, int, int]]:
+        """Yield (start, end, num_tokens) ranges of texts that fit the embedding batch budget"""
+        start = 0
+        batch_tokens = 0
+        for i, text in enumerate(texts):
+            num_tokens = count_tokens(text)
+            batch_full = (i - start >= Config.EMBEDDING_BATCH_SIZE or
+                          batch_tokens + num_tokens > Config.EMBEDDING_BATCH_TOKENS)
+            if i > start and batch_full:
+                yield start, i, batch_tokens
+                start = i
+                batch_tokens = 0
+            batch_tokens += num_tokens
+        if start < len(texts):
+            yield start, len(texts), batch_tokens
+    
+    @staticmethod
+    def document_id(metadata: Dict) -> str:
+        """Unique, stable id of a chunk in the collection"""
+        return f"{metadata['source']}_{metadata['chunk_id']}"
+    
+    def add_documents(self, documents: List[Dict[str, str]], persist: bool = True) -> List[str]:
+        """Add documents to the vector store and return the ids that were added
+        
+        With `persist` off the BM25 index is only updated in memory; callers
+        writing many batches save it once with `save_lexical_index`.
+        """
         if not documents:
             logger.warning("No documents to add")
-            return
+            return []
         
         logger.info(f"Adding {len(documents)} documents to vector store")
         
@@ -73,86 +221,257 @@ class VectorStore:
         texts = []
         metadatas = []
         
-        for i, doc in enumerate(documents):
-            try:
-                # Generate unique ID
-                doc_id = f"{doc['metadata']['source']}_{doc['metadata']['chunk_id']}"
-                ids.append(doc_id)
-                
-                # Generate embedding
-                embedding = self.generate_embedding(doc['text'])
-                embeddings.append(embedding)
-                
-                # Store text and metadata
-                texts.append(doc['text'])
-                metadatas.append(doc['metadata'])
-                
-                # Rate limiting: sleep to avoid rate limits
-                if (i + 1) % 10 == 0:
-                    logger.info(f"Processed {i + 1}/{len(documents)} documents")
-                    time.sleep(0.5)  # Small delay to avoid rate limits
-            
-            except Exception as e:
-                logger.error(f"Error processing document {i}: {str(e)}")
+        all_texts = [doc['text'] for doc in documents]
+        all_embeddings: List[Optional[List[float]]] = [None] * len(documents)
+        if self.embedding_cache is not None:
+            all_embeddings = self.embedding_cache.get_many(Config.EMBEDDING_MODEL, all_texts)
+        missing = [i for i, embedding in enumerate(all_embeddings) if embedding is None]
+        if len(missing) < len(documents):
+            logger.info(f"Reusing {len(documents) - len(missing)} cached embeddings")
+        
+        missing_texts = [all_texts[i] for i in missing]
+        batches = list(self.iter_batches(missing_texts))
+        processed = 0
+        
+        # Several batches in flight at once; the shared rate limiter paces them to the quota
+        with ThreadPoolExecutor(max_workers=Config.EMBEDDING_CONCURRENCY) as executor:
+            futures = {
+                executor.submit(self._embed_isolating, missing_texts[start:end], num_tokens): (start, end)
+                for start, end, num_tokens in batches
+            }
+            for future in as_completed(futures):
+                start, end = futures[future]
+                try:
+                    batch_embeddings = future.result()
+                except Exception as e:
+                    logger.error(f"Error processing documents {missing[start]}-{missing[end - 1]}: {str(e)}")
+                    continue
+                for i, embedding in zip(missing[start:end], batch_embeddings):
+                    all_embeddings[i] = embedding
+                processed += end - start
+                logger.info(f"Embedded {processed}/{len(missing)} uncached documents")
+        
+        # Keep document order; chunks whose embedding failed are skipped
+        for doc, embedding in zip(documents, all_embeddings):
+            if embedding is None:
                 continue
+            # Generate unique ID
+            ids.append(self.document_id(doc['metadata']))
+            embeddings.append(embedding)
+            
+            # Store text and metadata
+            texts.append(doc['text'])
+            metadatas.append(doc['metadata'])
         
-        # Add to collection
+        if self.embedding_cache is not None:
+            stats = self.embedding_cache.stats()
+            logger.info(f"Embedding cache: {stats['hits']} hits, {stats['misses']} misses")
+        
+        # Add to index (upsert keeps re-runs after an interrupted ingestion idempotent)
         if ids:
-            self.collection.add(
-                ids=ids,
-                embeddings=embeddings,
-                documents=texts,
-                metadatas=metadatas
-            )
+            with recorder.span("index_upsert"):
+                self.index.upsert(ids, embeddings, texts, metadatas)
+                self.lexical_index.add(ids, texts)
+            if persist:
+                self.save_lexical_index()
+            self.revision += 1
             logger.info(f"Successfully added {len(ids)} documents to vector store")
+        return ids
     
-    def search(self, query: str, top_k: int = None) -> List[Dict]:
-        """Search for relevant documents"""
+    def add_documents_stream(self, documents: Iterable[Dict[str, str]], batch_size: int = None,
+                             on_source_complete: Callable[[str, List[str]], None] = None) -> int:
+        """Embed and upsert a stream of chunks in bounded batches
+        
+        Chunks are pulled from `documents` only when the previous batch has been
+        written, so memory stays flat for any corpus size. `on_source_complete`
+        is called with (source, chunk_ids) once every chunk of a source file is
+        stored, which lets callers checkpoint progress. The BM25 index is saved
+        once, when the stream ends.
+        """
+        if batch_size is None:
+            batch_size = Config.INGEST_BATCH_SIZE
+        
+        committed: Dict[str, List[str]] = {}
+        total_added = 0
+        
+        def flush(batch: List[Dict[str, str]]):
+            nonlocal total_added
+            with recorder.span("ingest_batch"):
+                added = set(self.add_documents(batch, persist=False))
+            total_added += len(added)
+            for doc in batch:
+                metadata = doc['metadata']
+                doc_id = self.document_id(metadata)
+                if doc_id not in added:
+                    continue
+                source_ids = committed.setdefault(metadata['source'], [])
+                source_ids.append(doc_id)
+                if len(source_ids) == metadata['total_chunks']:
+                    del committed[metadata['source']]
+                    if on_source_complete is not None:
+                        on_source_complete(metadata['source'], source_ids)
+        
+        batch = []
+        try:
+            for doc in documents:
+                batch.append(doc)
+                if len(batch) >= batch_size:
+                    flush(batch)
+                    batch = []
+            if batch:
+                flush(batch)
+        finally:
+            self.save_lexical_index()
+        
+        for source in committed:
+            logger.warning(f"{source} was not fully indexed")
+        return total_added
+    
+    def delete_documents(self, ids: List[str], persist: bool = True):
+        """Delete chunks from the collection by id (see `add_documents` for `persist`)"""
+        if ids:
+            self.index.delete(ids)
+            self.lexical_index.delete(ids)
+            if persist:
+                self.save_lexical_index()
+            self.revision += 1
+            logger.info(f"Deleted {len(ids)} documents from vector store")
+    
+    def delete_source(self, source: str, persist: bool = True):
+        """Delete every chunk that came from the given source file (see `add_documents` for `persist`)"""
+        ids = self.index.delete_source(source)
+        if ids:
+            self.lexical_index.delete(ids)
+            if persist:
+                self.save_lexical_index()
+        self.revision += 1
+        logger.info(f"Deleted documents from source: {source}")
+    
+    def save_lexical_index(self):
+        """Write the BM25 index to disk if it changed since it was last saved"""
+        if self.lexical_index.dirty:
+            self.lexical_index.save()
+    
+    def _fuse(self, query: str, dense_results: List[Dict], top_k: int,
+              search_filter: SearchFilter = None) -> List[Dict]:
+        """Reciprocal rank fusion of dense candidates with BM25 matches (within the filter, if any)"""
+        self._ensure_lexical_index()
+        with recorder.span("lexical_search"):
+            allowed_ids = self.index.ids_matching(search_filter) if search_filter else None
+            lexical_results = self.lexical_index.search(query, max(len(dense_results), top_k), allowed_ids)
+        fused = reciprocal_rank_fusion(
+            [[doc['id'] for doc in dense_results], [doc_id for doc_id, _ in lexical_results]],
+            Config.RRF_K
+        )[:top_k]
+        
+        by_id = {doc['id']: doc for doc in dense_results}
+        missing = [doc_id for doc_id, _ in fused if doc_id not in by_id]
+        by_id.update({doc['id']: doc for doc in self.index.get(missing)})
+        return [dict(by_id[doc_id], score=score) for doc_id, score in fused if doc_id in by_id]
+    
+    def search(self, query: str, top_k: int = None, mode: str = None,
+               search_filter: SearchFilter = None) -> List[Dict]:
+        """Search for relevant documents
+        
+        `mode` is "vector" (embedding similarity only) or "hybrid" (embedding
+        candidates fused with BM25 matches); defaults to Config.RETRIEVAL_MODE.
+        `search_filter` restricts the search to some sources or pages.
+        """
         if top_k is None:
             top_k = Config.TOP_K
+        mode = mode or Config.RETRIEVAL_MODE
         
         try:
             # Generate query embedding
-            query_embedding = self.generate_embedding(query)
+            with recorder.span("query_embedding"):
+                query_embedding = self.embed_query(query)
             
-            # Search in ChromaDB
-            results = self.collection.query(
-                query_embeddings=[query_embedding],
-                n_results=top_k
-            )
-            
-            # Format results
-            formatted_results = []
-            if results['documents'] and results['documents'][0]:
-                for i in range(len(results['documents'][0])):
-                    formatted_results.append({
-                        'text': results['documents'][0][i],
-                        'metadata': results['metadatas'][0][i],
-                        'distance': results['distances'][0][i] if 'distances' in results else None
-                    })
-            
-            logger.info(f"Found {len(formatted_results)} relevant documents for query")
-            return formatted_results
+            return self.search_by_embedding(query, query_embedding, top_k, mode, search_filter)
         
         except Exception as e:
             logger.error(f"Error searching vector store: {str(e)}")
             return []
     
+    def search_by_embedding(self, query: str, query_embedding: List[float], top_k: int = None,
+                            mode: str = None, search_filter: SearchFilter = None) -> List[Dict]:
+        """Search the index with an already computed query embedding (no OpenAI call)"""
+        if top_k is None:
+            top_k = Config.TOP_K
+        mode = mode or Config.RETRIEVAL_MODE
+        search_filter = search_filter or None
+        
+        if mode == "hybrid":
+            with recorder.span("index_query"):
+                candidates = self.index.query(query_embedding, top_k * Config.HYBRID_CANDIDATES, search_filter)
+            formatted_results = self._fuse(query, candidates, top_k, search_filter)
+        else:
+            with recorder.span("index_query"):
+                formatted_results = self.index.query(query_embedding, top_k, search_filter)
+        
+        logger.info(f"Found {len(formatted_results)} relevant documents for query")
+        return formatted_results
+    
+    def search_batch(self, queries: List[str], top_k: int = None, mode: str = None,
+                     search_filter: SearchFilter = None) -> List[Dict]:
+        """Search for several queries with batched embedding and one index query
+        
+        Returns one {"query", "results", "error"} dict per query, in input order.
+        """
+        if top_k is None:
+            top_k = Config.TOP_K
+        mode = mode or Config.RETRIEVAL_MODE
+        search_filter = search_filter or None
+        num_candidates = top_k * Config.HYBRID_CANDIDATES if mode == "hybrid" else top_k
+        
+        try:
+            with recorder.span("query_embedding_batch"):
+                query_embeddings = self.embed_queries(queries)
+            with recorder.span("index_query_batch"):
+                batch_results = (self.index.query_batch(query_embeddings, num_candidates, search_filter)
+                                 if queries else [])
+        except Exception as e:
+            logger.error(f"Error searching vector store for {len(queries)} queries: {str(e)}")
+            return [{"query": query, "results": [], "error": str(e)} for query in queries]
+        
+        items = []
+        for query, results in zip(queries, batch_results):
+            try:
+                if mode == "hybrid":
+                    results = self._fuse(query, results, top_k, search_filter)
+                items.append({"query": query, "results": results, "error": None})
+            except Exception as e:
+                items.append({"query": query, "results": [], "error": str(e)})
+        
+        logger.info(f"Searched {len(queries)} queries in one batch")
+        return items
+    
+    def collection_version(self) -> str:
+        """Changes whenever the collection may have changed, including writes from other processes"""
+        manifest_path = Config.VECTOR_DB_DIR / Config.MANIFEST_FILE
+        manifest_mtime = manifest_path.stat().st_mtime_ns if manifest_path.exists() else 0
+        return f"{self.revision}:{self.get_collection_count()}:{manifest_mtime}"
+    
+    def list_sources(self) -> Dict[str, int]:
+        """Chunk count per indexed source file, for choosing a search filter"""
+        version = self.collection_version()
+        if self._sources is None or self._sources[0] != version:
+            self._sources = (version, dict(sorted(self.index.sources().items())))
+        return self._sources[1]
+    
     def get_collection_count(self) -> int:
         """Get the number of documents in the collection"""
         try:
-            return self.collection.count()
-        except:
+            return self.index.count()
+        except Exception:
             return 0
     
     def clear_collection(self):
         """Clear all documents from the collection"""
         try:
-            self.chroma_client.delete_collection(name=self.collection_name)
-            self.collection = self.chroma_client.create_collection(
-                name=self.collection_name,
-                metadata={"description": "GxP Validation Guidelines (OpenAI)"}
-            )
+            self.index.clear()
+            self.lexical_index.clear()
+            self.lexical_index.save()
+            self.revision += 1
             logger.info("Collection cleared successfully")
         except Exception as e:
             logger.error(f"Error clearing collection: {str(e)}")